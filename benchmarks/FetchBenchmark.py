@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+CODE_DIR = os.path.join(PROJECT_ROOT, "code")
+
+# End-to-end run of the fetch pipeline (CacheAPIValues.create_cache_data)
+# against LocalT212Server: concurrent stages, the documented rate limits and
+# their 429s, retries and the export polling, without a real account.
+
+
+def run_child(workspace):
+    sys.path.insert(0, os.path.join(workspace, "code"))
+    from RunMetrics import METRICS
+    from CacheAPIValues import create_cache_data
+
+    with METRICS.measure("create_cache_data", "total"):
+        create_cache_data(account_start_date="2015-01-01T00:00:00Z")
+    summary = METRICS.summary()
+    cache = os.path.join(workspace, "cache")
+    print(json.dumps({
+        "steps": {step["name"]: {"wall_ms": step["wall_ms"], "calls": step["calls"], **step["counters"]}
+                  for step in summary["steps"]},
+        "counters": summary["counters"],
+        "files": {name: os.path.getsize(os.path.join(cache, name)) for name in sorted(os.listdir(cache))},
+    }))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        run_child(sys.argv[2])
+        return
+
+    parser = argparse.ArgumentParser(description="Time the Trading212 fetches against the local API stand-in")
+    parser.add_argument("--rows", type=int, default=10000, help="history rows of the synthetic account")
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="multiplier for the documented rate limit periods (default 0.1)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every API response")
+    parser.add_argument("--export-delay", type=float, default=3.0, help="seconds until the CSV export is ready")
+    parser.add_argument("--pies", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=None, help="PIPELINE_THREADS for the fetch stages")
+    args = parser.parse_args()
+
+    sys.path.insert(0, CODE_DIR)
+    from SyntheticAccount import generate
+    from LocalT212Server import make_server
+
+    workspace = tempfile.mkdtemp(prefix="t212fetch_")
+    try:
+        data_dir = os.path.join(workspace, "account")
+        generate(data_dir, args.rows, pie_count=args.pies)
+        shutil.copytree(CODE_DIR, os.path.join(workspace, "code"),
+                        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+        server = make_server(data_dir, port=0, latency=args.latency, time_scale=args.time_scale,
+                             export_delay=args.export_delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        env = dict(os.environ,
+                   T212_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/api/v0",
+                   T212_API_KEY="benchmark",
+                   T212_DEMO="false",
+                   T212_EXPORT_POLL_SECONDS=str(max(args.export_delay / 3, 0.2)),
+                   PYTHONDONTWRITEBYTECODE="1")
+        if args.threads:
+            env["PIPELINE_THREADS"] = str(args.threads)
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", workspace],
+                                cwd=workspace, env=env, capture_output=True, text=True)
+        server.shutdown()
+        if result.returncode != 0:
+            sys.exit(f"❌ Fetch run failed:\n{result.stderr[-2000:]}")
+
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        print("\n".join(line for line in result.stdout.splitlines()[:-1] if line.startswith(("✅", "❌", "⚠️", "⏭️", "==="))))
+        print(f"=== Fetch against the stand-in: {args.rows:,} rows, rate limits x{args.time_scale}, "
+              f"{args.latency * 1000:.0f} ms latency ===")
+        print(f"{'Step':<28}{'ms':>10}{'HTTP':>7}{'429s':>7}{'KB':>9}")
+        for name, step in sorted(report["steps"].items(), key=lambda item: item[1]["wall_ms"], reverse=True):
+            print(f"{name:<28}{step['wall_ms']:>10.1f}{step.get('http_calls', 0):>7}"
+                  f"{step.get('http_throttled', 0):>7}{step.get('http_bytes', 0) / 1024:>9.1f}")
+        counters = report["counters"]
+        print(f"📊 {counters.get('http_calls', 0)} requests, {counters.get('http_throttled', 0)} answered 429 "
+              f"(server saw {server.requests} served, {server.throttled} limited)")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+CODE_DIR = os.path.join(PROJECT_ROOT, "code")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+REPORT_PATH = os.path.join(PROJECT_ROOT, "cache", "benchmark_report.json")
+
+DEFAULT_ROWS = [10000, 100000]
+DEFAULT_TOLERANCE = 0.25
+# Differences below this are noise whatever the ratio: the chart workers and
+# the AI request run alongside the sheets and shift small steps by tens of ms
+MIN_REGRESSION_MS = 100.0
+
+# Each size runs in a fresh copy of code/ next to its own synthetic cache, in a
+# separate interpreter: the modules find cache/ and write AccountAnalysis.xlsx
+# relative to themselves, and peak RSS is only meaningful per process. OpenAI
+# requests go to LocalCompletionServer and yfinance is replaced by a stub, so
+# nothing leaves the machine.
+
+
+class _StubTicker:
+    """yfinance.Ticker stand-in: London listings quote in pence, everything else in dollars."""
+
+    def __init__(self, symbol):
+        self.info = {"currency": "GBp" if symbol.endswith(".L") else "USD"}
+
+
+def _instrument_methods(classes):
+    from RunMetrics import measured
+
+    for cls in classes:
+        for name, attr in list(vars(cls).items()):
+            # Private helpers run once per table row; timing them would skew the totals
+            if callable(attr) and not name.startswith("_"):
+                setattr(cls, name, measured("method", f"{cls.__name__}.{name}")(attr))
+
+
+def run_child(workspace):
+    """Build the full workbook inside `workspace` and print the metrics as JSON."""
+    import types
+    import resource
+
+    sys.path.insert(0, os.path.join(workspace, "code"))
+    yfinance = types.ModuleType("yfinance")
+    yfinance.Ticker = _StubTicker
+    sys.modules["yfinance"] = yfinance
+
+    from RunMetrics import METRICS
+    from sheet_generators.AccountSummary import AccountSummary
+    from sheet_generators.AdvancedAccountInfo import AdvancedAccountInfo
+    from sheet_generators.ExcelGenerator import make_xslx
+
+    _instrument_methods([AccountSummary, AdvancedAccountInfo])
+    started = time.perf_counter()
+    with METRICS.measure("make_xslx", "total"):
+        make_xslx(force=True)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    summary = METRICS.summary()
+    print(json.dumps({
+        "total_ms": round(total_ms, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "chart_workers_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+        "steps": {step["name"]: step["wall_ms"] for step in summary["steps"]},
+    }))
+
+
+def start_completion_server():
+    sys.path.insert(0, CODE_DIR)
+    from LocalCompletionServer import make_server
+
+    server = make_server(port=0, latency=0.0, max_concurrency=16)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_size(rows, server, keep=False, seed=1):
+    from SyntheticAccount import generate
+
+    workspace = tempfile.mkdtemp(prefix=f"t212bench_{rows}_")
+    try:
+        shutil.copytree(CODE_DIR, os.path.join(workspace, "code"),
+                        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+        started = time.perf_counter()
+        paths = generate(os.path.join(workspace, "cache"), rows, seed=seed)
+        print(f"🧪 {rows} rows: synthetic account ({os.path.getsize(paths['history']) / 1048576:.1f} MB) "
+              f"generated in {time.perf_counter() - started:.1f}s, building workbook...")
+
+        env = dict(os.environ,
+                   OPENAI_API_KEY="benchmark",
+                   OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                   T212_API_KEY="",
+                   PYTHONDONTWRITEBYTECODE="1")
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", workspace],
+                                cwd=workspace, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Benchmark run for {rows} rows failed:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        if keep:
+            print(f"📁 Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+def best_of(runs):
+    """Fastest time of each step, and the lowest totals, over repeated runs."""
+    best = dict(runs[0], steps=dict(runs[0]["steps"]))
+    for run in runs[1:]:
+        for key in ("total_ms", "peak_rss_mb", "chart_workers_peak_rss_mb"):
+            best[key] = min(best[key], run[key])
+        for name, ms in run["steps"].items():
+            best["steps"][name] = min(best["steps"].get(name, ms), ms)
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`, as (rows, metric, baseline, current) tuples."""
+    regressions = []
+    for rows, current in results.items():
+        base = baseline.get(rows)
+        if not base:
+            continue
+        for name, ms in current["steps"].items():
+            before = base["steps"].get(name)
+            if before is not None and ms > before * (1 + tolerance) and ms - before > MIN_REGRESSION_MS:
+                regressions.append((rows, name, before, ms))
+        for metric in ("total_ms", "peak_rss_mb"):
+            before = base.get(metric)
+            if before and current[metric] > before * (1 + tolerance):
+                regressions.append((rows, metric, before, current[metric]))
+    return regressions
+
+
+def print_results(results, baseline, top=15):
+    for rows, current in results.items():
+        base = baseline.get(rows, {})
+        print(f"=== {int(rows):,} history rows: {current['total_ms'] / 1000:.1f}s, "
+              f"peak RSS {current['peak_rss_mb']:.0f} MB (chart workers {current['chart_workers_peak_rss_mb']:.0f} MB) ===")
+        print(f"{'Step':<44}{'ms':>10}{'baseline':>10}{'change':>9}")
+        steps = sorted(current["steps"].items(), key=lambda item: item[1], reverse=True)[:top]
+        for name, ms in steps:
+            before = base.get("steps", {}).get(name)
+            change = f"{(ms / before - 1) * 100:+.0f}%" if before else ""
+            print(f"{name[:43]:<44}{ms:>10.1f}{before if before is not None else '':>10}{change:>9}")
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        run_child(sys.argv[2])
+        return
+
+    parser = argparse.ArgumentParser(description="Time the workbook build on synthetic Trading212 accounts, offline")
+    parser.add_argument("--rows", default=",".join(str(r) for r in DEFAULT_ROWS),
+                        help="comma-separated history sizes (default 10000,100000; up to a few million)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown over the baseline flagged as a regression (default 0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per size, keeping the fastest time of each step (default 1)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark workspaces for inspection")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sizes = [int(r.replace("_", "")) for r in args.rows.split(",") if r.strip()]
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r") as f:
+            baseline = json.load(f)
+
+    server = start_completion_server()
+    results = {}
+    try:
+        for rows in sizes:
+            runs = [run_size(rows, server, keep=args.keep, seed=args.seed) for _ in range(max(1, args.repeat))]
+            results[str(rows)] = best_of(runs)
+    finally:
+        server.shutdown()
+
+    print_results(results, baseline)
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"✅ Baseline saved to {BASELINE_PATH}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for rows, name, before, current in regressions:
+        print(f"❌ {int(rows):,} rows: {name} regressed from {before} to {current}")
+    if not baseline:
+        print("⚠️ No baseline yet, run with --save-baseline to record one")
+    elif not regressions:
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import os
+import csv
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Realistic synthetic Trading212 accounts for benchmarking: a history export
+# in the same columns and action names as T212's CSV, plus the cash,
+# portfolio, pies and instrument JSON the API calls would have cached. The
+# history is streamed to disk, so multi-million row files need little memory.
+
+HISTORY_COLUMNS = [
+    "Action", "Time", "ISIN", "Ticker", "Name", "Notes", "ID", "No. of shares", "Price / share",
+    "Currency (Price / share)", "Exchange rate", "Result", "Currency (Result)", "Total", "Currency (Total)",
+    "Withholding tax", "Currency (Withholding tax)", "Stamp duty reserve tax", "Currency (Stamp duty reserve tax)",
+    "Currency conversion fee", "Currency (Currency conversion fee)", "Deposit fee", "Currency (Deposit fee)",
+]
+
+ACCOUNT_CURRENCY = "EUR"
+
+# Quote currency -> (ISIN country codes, T212 ticker suffix, price range, units per EUR)
+MARKETS = {
+    "USD": (["US"], "_US_EQ", (5, 900), 1.08),
+    "GBX": (["GB", "JE", "IE"], "l_EQ", (40, 4000), 85.5),
+    "EUR": (["DE", "FR", "NL", "ES", "IT"], "_EQ", (3, 600), 1.0),
+}
+
+# Share of history rows per action; trades dominate a typical export
+ACTION_WEIGHTS = [
+    ("Market buy", 40), ("Market sell", 18), ("Limit buy", 6), ("Limit sell", 4), ("Stop sell", 2),
+    ("Dividend (Dividend)", 12), ("Deposit", 8), ("Withdrawal", 2), ("Interest on cash", 8),
+]
+
+PIE_NAMES = ["Dividend Growth", "Global Tech", "UK Income", "European Value", "Clean Energy", "Healthcare"]
+
+
+def _isin(country, rng):
+    body = "".join(rng.choice("0123456789ABCDEFGHJKLMNPQRSTVWXYZ") for _ in range(9))
+    return f"{country}{body}{rng.randint(0, 9)}"
+
+
+def make_instruments(count, rng):
+    """Instrument universe split across USD, GBX and EUR quotes, with a starting price each."""
+    instruments = []
+    currencies = ["USD", "GBX", "EUR"]
+    for i in range(count):
+        currency = currencies[i % len(currencies)]
+        countries, suffix, (low, high), fx = MARKETS[currency]
+        base = "".join(rng.choice("ABCDEFGHIJKLMNOPRSTUVWZ") for _ in range(rng.randint(2, 4))) + str(i)
+        instruments.append({
+            "ticker": f"{base}{suffix}",
+            "history_ticker": base,
+            "isin": _isin(rng.choice(countries), rng),
+            "name": f"{base} {rng.choice(['Holdings', 'Group', 'plc', 'Inc', 'SE', 'Corp'])}",
+            "currencyCode": currency,
+            "fx": fx,
+            "price": rng.uniform(low, high),
+        })
+    return instruments
+
+
+def _money(value):
+    return f"{value:.2f}"
+
+
+def write_history(path, rows, instruments, rng, start=datetime(2019, 1, 2, 9, 30)):
+    """Stream `rows` history rows to `path`; returns the holdings and cash left at the end."""
+    actions = [a for a, _ in ACTION_WEIGHTS]
+    weights = [w for _, w in ACTION_WEIGHTS]
+    holdings = {}  # ticker -> [shares, average price]
+    cash = 0.0
+    # Spread the history over roughly five years whatever its length
+    step_seconds = max(1, int(5 * 365 * 86400 / max(rows, 1)))
+    now = start
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HISTORY_COLUMNS)
+        for i in range(rows):
+            now += timedelta(seconds=rng.randint(1, 2 * step_seconds))
+            action = rng.choices(actions, weights)[0]
+            instrument = rng.choice(instruments)
+            # Keep the account plausible: only sell what is held, top up
+            # before buying with too little cash, invest idle cash
+            if action.endswith("sell") and instrument["ticker"] not in holdings:
+                action = "Market buy"
+            if action.endswith("buy") and cash < 1500:
+                action = "Deposit"
+            elif action == "Deposit" and cash > 5000:
+                action = "Market buy"
+            row = dict.fromkeys(HISTORY_COLUMNS, "")
+            row.update({"Action": action, "Time": now.strftime("%Y-%m-%d %H:%M:%S"), "ID": f"EOF{i:010d}",
+                        "Currency (Total)": ACCOUNT_CURRENCY})
+
+            if action in ("Deposit", "Withdrawal"):
+                amount = round(rng.uniform(50, 2500), 2)
+                if action == "Withdrawal":
+                    amount = min(amount, max(cash, 0))
+                    cash -= amount
+                    row["Total"] = _money(-amount)
+                else:
+                    cash += amount
+                    row["Total"] = _money(amount)
+                    if rng.random() < 0.05:
+                        row["Deposit fee"] = _money(-amount * 0.007)
+                        row["Currency (Deposit fee)"] = ACCOUNT_CURRENCY
+            elif action == "Interest on cash":
+                row["Total"] = _money(rng.uniform(0.01, 4))
+                cash += float(row["Total"])
+            else:
+                # Prices follow a small random walk per instrument
+                instrument["price"] *= 1 + rng.gauss(0, 0.01)
+                price = instrument["price"]
+                fx = instrument["fx"] * (1 + rng.gauss(0, 0.002))
+                row.update({"ISIN": instrument["isin"], "Ticker": instrument["history_ticker"], "Name": instrument["name"],
+                            "Currency (Price / share)": instrument["currencyCode"], "Exchange rate": f"{fx:.4f}"})
+                held = holdings.get(instrument["ticker"])
+
+                if action.startswith("Dividend"):
+                    shares = held[0] if held else rng.uniform(1, 20)
+                    gross = shares * price * rng.uniform(0.002, 0.01) / fx
+                    tax = gross * 0.15
+                    row.update({"No. of shares": f"{shares:.8f}", "Price / share": f"{price * 0.005:.4f}",
+                                "Total": _money(gross - tax), "Withholding tax": _money(tax),
+                                "Currency (Withholding tax)": instrument["currencyCode"]})
+                    cash += gross - tax
+                    writer.writerow([row[c] for c in HISTORY_COLUMNS])
+                    continue
+
+                if action.endswith("buy"):
+                    shares = round(rng.uniform(100, 1500) * fx / price, 6)
+                    value = shares * price / fx
+                    total_shares = (held[0] if held else 0) + shares
+                    average = ((held[0] * held[1] if held else 0) + shares * price) / total_shares
+                    holdings[instrument["ticker"]] = [total_shares, average]
+                    total = value
+                else:
+                    shares = round(held[0] * rng.choice([0.25, 0.5, 1.0]), 6)
+                    value = shares * price / fx
+                    result = shares * (price - held[1]) / fx
+                    held[0] -= shares
+                    if held[0] <= 1e-6:
+                        del holdings[instrument["ticker"]]
+                    row.update({"Result": _money(result), "Currency (Result)": ACCOUNT_CURRENCY})
+                    total = value
+
+                if instrument["currencyCode"] != ACCOUNT_CURRENCY:
+                    fee = value * 0.0015
+                    row.update({"Currency conversion fee": _money(fee),
+                                "Currency (Currency conversion fee)": ACCOUNT_CURRENCY})
+                    total += fee if action.endswith("buy") else -fee
+                if instrument["currencyCode"] == "GBX" and action.endswith("buy"):
+                    duty = value * 0.005
+                    row.update({"Stamp duty reserve tax": _money(duty),
+                                "Currency (Stamp duty reserve tax)": ACCOUNT_CURRENCY})
+                    total += duty
+                cash += -total if action.endswith("buy") else total
+                row.update({"No. of shares": f"{shares:.8f}", "Price / share": f"{price:.4f}", "Total": _money(total)})
+
+            writer.writerow([row[c] for c in HISTORY_COLUMNS])
+    return holdings, cash
+
+
+def make_positions(holdings, instruments, rng):
+    by_ticker = {i["ticker"]: i for i in instruments}
+    positions = []
+    for ticker, (shares, average) in sorted(holdings.items()):
+        instrument = by_ticker[ticker]
+        current = instrument["price"]
+        ppl = shares * (current - average) / instrument["fx"]
+        positions.append({
+            "ticker": ticker,
+            "quantity": round(shares, 8),
+            "averagePrice": round(average, 4),
+            "currentPrice": round(current, 4),
+            "ppl": round(ppl, 2),
+            "fxPpl": round(rng.uniform(-0.02, 0.02) * abs(ppl), 2) if instrument["currencyCode"] != ACCOUNT_CURRENCY else None,
+            "initialFillDate": "2019-01-02T09:30:00.000+00:00",
+            "frontend": "API",
+            "maxBuy": 10000.0,
+            "maxSell": round(shares, 8),
+            "pieQuantity": 0.0,
+        })
+    return positions
+
+
+def make_pies(positions, pie_count, rng):
+    """Pies built from the open positions; each takes part of its instruments' shares."""
+    pies = []
+    candidates = list(positions)
+    for pie_id in range(1, pie_count + 1):
+        if not candidates:
+            break
+        members = rng.sample(candidates, min(len(candidates), rng.randint(3, 12)))
+        instruments = []
+        for position in members:
+            quantity = position["quantity"] * rng.uniform(0.1, 0.5)
+            position["pieQuantity"] = round(position["pieQuantity"] + quantity, 8)
+            value = quantity * position["currentPrice"]
+            invested = quantity * position["averagePrice"]
+            instruments.append({
+                "ticker": position["ticker"],
+                "ownedQuantity": round(quantity, 8),
+                "expectedShare": round(1 / len(members), 4),
+                "result": {"priceAvgInvestedValue": round(invested, 2), "priceAvgValue": round(value, 2),
+                           "priceAvgResult": round(value - invested, 2),
+                           "priceAvgResultCoef": round(value / invested - 1, 4) if invested else 0},
+                "issues": [],
+            })
+        total_value = sum(i["result"]["priceAvgValue"] for i in instruments) or 1
+        for instrument in instruments:
+            instrument["currentShare"] = round(instrument["result"]["priceAvgValue"] / total_value, 4)
+        invested = sum(i["result"]["priceAvgInvestedValue"] for i in instruments)
+        value = sum(i["result"]["priceAvgValue"] for i in instruments)
+        result = {"priceAvgInvestedValue": round(invested, 2), "priceAvgValue": round(value, 2),
+                  "priceAvgResult": round(value - invested, 2),
+                  "priceAvgResultCoef": round(value / invested - 1, 4) if invested else 0}
+        pies.append({
+            "id": pie_id,
+            "cash": round(rng.uniform(0, 25), 2),
+            "dividendDetails": {"gained": round(rng.uniform(0, 200), 2), "inCash": 0, "reinvested": 0},
+            "progress": round(rng.uniform(0, 1), 4),
+            "result": result,
+            "status": None,
+            "detailed": {
+                "instruments": instruments,
+                "settings": {"id": pie_id, "name": PIE_NAMES[(pie_id - 1) % len(PIE_NAMES)],
+                             "dividendCashAction": "REINVEST", "goal": None, "icon": "Home"},
+            },
+        })
+    return pies
+
+
+def generate(out_dir, rows, seed=1, instrument_count=60, pie_count=4):
+    """Write a synthetic account with `rows` history rows to `out_dir`; returns the file paths."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    instruments = make_instruments(instrument_count, rng)
+
+    paths = {name: os.path.join(out_dir, f"{name}.json")
+             for name in ("open_positions", "cash_info", "pies_info", "instruments")}
+    paths["history"] = os.path.join(out_dir, "trading212_history.csv")
+
+    holdings, cash = write_history(paths["history"], rows, instruments, rng)
+    positions = make_positions(holdings, instruments, rng)
+    pies = make_pies(positions, pie_count, rng)
+    fx = {i["ticker"]: i["fx"] for i in instruments}
+    invested = sum(p["quantity"] * p["averagePrice"] / fx[p["ticker"]] for p in positions)
+    ppl = sum(p["ppl"] for p in positions)
+    free = max(cash, 0)
+    cash_info = {
+        "free": round(free, 2),
+        "total": round(free + invested + ppl, 2),
+        "invested": round(invested, 2),
+        "ppl": round(ppl, 2),
+        "result": round(rng.uniform(-0.1, 0.3) * invested, 2),
+        "blocked": 0.0,
+        "pieCash": round(sum(p["cash"] for p in pies), 2),
+    }
+    instrument_metadata = [
+        {"ticker": i["ticker"], "isin": i["isin"], "currencyCode": i["currencyCode"], "name": i["name"],
+         "shortName": i["history_ticker"], "type": "STOCK", "minTradeQuantity": 0.01,
+         "maxOpenQuantity": 100000, "addedOn": "2018-06-01T00:00:00.000+00:00"}
+        for i in instruments
+    ]
+
+    for name, data in (("open_positions", positions), ("cash_info", cash_info), ("pies_info", pies),
+                       ("instruments", instrument_metadata)):
+        with open(paths[name], "w") as f:
+            json.dump(data, f, indent=2)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Trading212 account for benchmarking")
+    parser.add_argument("--rows", type=int, default=10000, help="history rows (default 10000)")
+    parser.add_argument("--out", default="synthetic_account", help="output folder (default ./synthetic_account)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--instruments", type=int, default=60)
+    parser.add_argument("--pies", type=int, default=4)
+    args = parser.parse_args()
+
+    paths = generate(args.out, args.rows, args.seed, args.instruments, args.pies)
+    size_mb = os.path.getsize(paths["history"]) / (1024 * 1024)
+    print(f"✅ {args.rows} history rows ({size_mb:.1f} MB) and account JSON written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
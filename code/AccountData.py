@@ -3,6 +3,9 @@ import time
 import requests
 import os
 from dotenv import load_dotenv
+from RunMetrics import count
+from Cassette import active_cassette
+from Paths import CACHE_DIR, HISTORY_CSV
 
 # Load .env file from the project root
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -11,48 +14,112 @@ load_dotenv(env_path)
 API_KEY = os.getenv("T212_API_KEY")
 IS_DEMO = os.getenv("T212_DEMO", "false").lower() == "true"
 
-# Use demo or live endpoint based on account type
-BASE_URL = 'https://demo.trading212.com/api/v0' if IS_DEMO else 'https://live.trading212.com/api/v0'
+# Use demo or live endpoint based on account type; T212_BASE_URL points the
+# fetches elsewhere, e.g. at LocalT212Server for load tests
+BASE_URL = os.getenv("T212_BASE_URL") or ('https://demo.trading212.com/api/v0' if IS_DEMO else 'https://live.trading212.com/api/v0')
+# T212 takes about a minute to prepare an export
+EXPORT_POLL_SECONDS = float(os.getenv("T212_EXPORT_POLL_SECONDS", "70"))
 headers = {
     "Authorization": API_KEY
 }
 
-def get_open_positions():
+class FetchError(Exception):
+    """Raised instead of returning an empty result when a fetch is made with strict=True."""
+
+# Set in batch mode, where processes using the same API key share its rate limits
+_shared_rate_limit = None
+
+def share_rate_limit(limit):
+    """Route every request through a SharedRateLimit (None turns it off)."""
+    global _shared_rate_limit
+    _shared_rate_limit = limit
+
+def _request(method, url, **kwargs):
+    """requests.request, counted in the run metrics (calls and bytes transferred).
+    
+    With T212_CASSETTE set the response is recorded, or replayed without a network call.
+    In batch mode calls first wait for the rate limit budget shared with other accounts.
+    """
+    cassette = active_cassette()
+    if cassette and cassette.replaying:
+        r = cassette.replay(method, url, BASE_URL)
+    else:
+        shared = _shared_rate_limit if url.startswith(BASE_URL) else None
+        if shared:
+            shared.acquire(method, url)
+        try:
+            r = requests.request(method, url, **kwargs)
+        except requests.RequestException:
+            if shared:
+                shared.release(method, url)
+            raise
+        if shared:
+            shared.update(method, url, r)
+        if cassette:
+            cassette.record(method, url, BASE_URL, r, kwargs.get("json"))
+    count("http_calls")
+    count("http_bytes", len(r.content) + len(r.request.body or b""))
+    if r.status_code == 429:
+        count("http_throttled")
+    return r
+
+def _sleep(seconds):
+    """time.sleep, skipped when replaying a cassette since nothing is waited on."""
+    cassette = active_cassette()
+    if not (cassette and cassette.replaying):
+        time.sleep(seconds)
+
+def _rate_limit_wait(r, default):
+    """Seconds until a 429'd endpoint accepts calls again, from T212's x-ratelimit-reset header."""
+    try:
+        return min(max(float(r.headers["x-ratelimit-reset"]) - time.time(), 0) + 0.1, 120)
+    except (KeyError, TypeError, ValueError):
+        return default
+
+def _failed(strict, message):
+    if strict:
+        raise FetchError(message)
+    print(f"❌ {message}")
+
+def get_open_positions(strict=False):
     url = f"{BASE_URL}/equity/portfolio"
-    r = requests.get(url, headers=headers)
+    r = _request("GET", url, headers=headers)
     if r.status_code != 200:
-        print("❌ Failed to fetch portfolio:", r.status_code, r.text)
+        _failed(strict, f"Failed to fetch portfolio: {r.status_code} {r.text}")
         return []
     return r.json()
 
-def get_cash_info():
+def get_cash_info(strict=False):
     url = f"{BASE_URL}/equity/account/cash"
-    r = requests.get(url, headers=headers)
+    r = _request("GET", url, headers=headers)
 
     print("NOTE: due to the nature of T212's internal logic APIs (which are still in their beta), account figures can be off")
     print(f"Status code: {r.status_code}")
     
     if r.status_code != 200:
-        print(f"❌ Error fetching cash info: {r.status_code} - {r.text[:200]}")
+        _failed(strict, f"Error fetching cash info: {r.status_code} - {r.text[:200]}")
         return {}  # Return empty dict or handle differently
 
     try:
         return r.json()
     except Exception as e:
-        print("❌ Failed to parse JSON:", e)
+        _failed(strict, f"Failed to parse JSON: {e}")
         print("Raw response text:", r.text[:200])
         return {}
 
-def get_pies(include_detailed=False):
+def get_pies(include_detailed=False, strict=False, reuse_detail=None):
     """Fetch all pies for the account from Trading 212 API.
     
     Args:
         include_detailed (bool): If True, fetches detailed holdings for each pie
+        strict (bool): If True, raise FetchError instead of returning [] on failure
+        reuse_detail (callable): Given a pie from the summary, returns detailed
+            holdings to use instead of fetching them, or None to fetch them
     """
     url = f"{BASE_URL}/equity/pies"
-    r = requests.get(url, headers=headers)
+    r = _request("GET", url, headers=headers)
     if r.status_code != 200:
-        print(f"❌ Failed to fetch pies: {r.status_code} {r.text}")
+        _failed(strict, f"Failed to fetch pies: {r.status_code} {r.text}")
         return []
     
     pies = r.json() if isinstance(r.json(), list) else []
@@ -61,41 +128,68 @@ def get_pies(include_detailed=False):
         for pie in pies:
             pie_id = pie.get("id")
             if pie_id:
-                detailed = get_pie_holdings(pie_id)
+                detailed = reuse_detail(pie) if reuse_detail else None
+                if detailed is None:
+                    detailed = get_pie_holdings(pie_id)
+                    _sleep(1)  # Add delay to avoid rate limiting
                 if detailed:
                     pie["detailed"] = detailed
-                time.sleep(1)  # Add delay to avoid rate limiting
     
     return pies
 
-def get_pie_holdings(pie_id):
+def get_pie_holdings(pie_id, retries=3):
     """Fetch detailed pie info including holdings for a given pie id."""
     url = f"{BASE_URL}/equity/pies/{pie_id}"
-    r = requests.get(url, headers=headers)
+    r = _request("GET", url, headers=headers)
+    # The detail endpoint allows one call per 5s, so pies after the first usually wait
+    while r.status_code == 429 and retries > 0:
+        _sleep(_rate_limit_wait(r, 5))
+        retries -= 1
+        r = _request("GET", url, headers=headers)
     if r.status_code != 200:
         print(f"❌ Failed to fetch pie {pie_id}: {r.status_code} {r.text}")
         return None
     return r.json()
 
-def export_account_history():    
+def get_instruments(strict=False):
+    """Fetch metadata (ticker, ISIN, currency) for every instrument the account can trade."""
+    url = f"{BASE_URL}/equity/metadata/instruments"
+    r = _request("GET", url, headers=headers)
+    if r.status_code != 200:
+        _failed(strict, f"Failed to fetch instruments: {r.status_code} {r.text[:200]}")
+        return []
+    return r.json()
+
+def parse_start_date(date_input):
+    """YYYY-MM-DD as the export's timeFrom; raises ValueError for anything else."""
+    return datetime.strptime(date_input.strip(), "%Y-%m-%d").strftime("%Y-%m-%dT00:00:00Z")
+
+def ask_account_start_date():
     while True:
         date_input = input("Account creation date (YYYY-MM-DD): ").strip()
         try:
-            account_start_date = datetime.strptime(date_input, "%Y-%m-%d").strftime("%Y-%m-%dT00:00:00Z")
-            break
+            return parse_start_date(date_input)
         except ValueError:
             print("Invalid format")
-    
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%dT23:59:59Z")
+
+def export_period_end():
+    """End of the last complete day, where every export stops."""
+    return (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%dT23:59:59Z")
+
+def export_account_history(account_start_date=None, time_to=None, csv_path=HISTORY_CSV):
+    """Request a history export from `account_start_date` (asked for if None) to `time_to`
+    (default: export_period_end()) and save it as CSV at `csv_path`."""
+    if account_start_date is None:
+        account_start_date = ask_account_start_date()
     
     payload = {
         "dataIncluded": {"includeOrders": True, "includeDividends": True, "includeTransactions": True, "includeInterest": True},
         "timeFrom": account_start_date,
-        "timeTo": yesterday
+        "timeTo": time_to or export_period_end()
     }
 
     print("🕐 Requesting export...")
-    r = requests.post(f"{BASE_URL}/history/exports", json=payload, headers=headers)
+    r = _request("POST", f"{BASE_URL}/history/exports", json=payload, headers=headers)
     if r.status_code != 200:
         print(f"❌ Export request failed: {r.status_code}")
         return False
@@ -107,16 +201,16 @@ def export_account_history():
     except Exception:
         return False
 
-    print(f"📊 Export queued (ID: {report_id}). Takes ~70 seconds")
+    print(f"📊 Export queued (ID: {report_id}). Takes ~{EXPORT_POLL_SECONDS:.0f} seconds")
     
     # Poll for completion
     for attempt in range(10):
-        time.sleep(70)  # Wait 70 seconds between checks
+        _sleep(EXPORT_POLL_SECONDS)
         
-        status_r = requests.get(f"{BASE_URL}/history/exports", headers=headers)
+        status_r = _request("GET", f"{BASE_URL}/history/exports", headers=headers)
         if status_r.status_code == 429:
             print("⏳ Rate limited, waiting...")
-            time.sleep(30)
+            _sleep(_rate_limit_wait(status_r, 30))
             continue
         elif status_r.status_code != 200:
             continue
@@ -127,12 +221,10 @@ def export_account_history():
                 download_link = export.get("downloadLink")
                 if download_link:
                     # Download the CSV
-                    csv_response = requests.get(download_link)
+                    csv_response = _request("GET", download_link)
                     if csv_response.status_code == 200:
                         # Use absolute path to save in cache directory
-                        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
-                        os.makedirs(cache_dir, exist_ok=True)
-                        csv_path = os.path.join(cache_dir, "trading212_history.csv")
+                        os.makedirs(CACHE_DIR, exist_ok=True)
                         with open(csv_path, "wb") as f:
                             f.write(csv_response.content)
                         print(f"✅ CSV downloaded to {csv_path}")
@@ -0,0 +1,93 @@
+import os
+import time
+from datetime import datetime
+from Paths import CACHE_DIR
+from CacheStore import locked, read_json, write_json, CacheCorrupt
+from sheet_generators.SheetRegistry import DATASET_FILES
+from sheet_generators.WorkbookState import file_fingerprint
+
+# What is known about each downloaded dataset: when and from where it was
+# fetched, its checksum and, for the history, the period it covers. A refresh
+# only fetches datasets older than their time to live, so each one is
+# refetched about as often as it can actually change. The history never
+# expires as a whole: once a day passes the missing days are exported and
+# appended.
+
+ARTIFACTS_PATH = os.path.join(CACHE_DIR, "artifacts.json")
+
+# Seconds; override with CACHE_TTL_<DATASET>, e.g. CACHE_TTL_POSITIONS=300.
+# pie_detail is how long a pie's holdings are reused while its summary is unchanged.
+DEFAULT_TTLS = {
+    "cash": 60,
+    "positions": 60,
+    "pies": 3600,
+    "instruments": 86400,
+    "pie_detail": 86400,
+}
+
+
+def ttl(dataset):
+    """Time to live of `dataset` in seconds, or None for the incrementally refreshed history."""
+    if dataset not in DEFAULT_TTLS:
+        return None
+    return float(os.getenv(f"CACHE_TTL_{dataset.upper()}", DEFAULT_TTLS[dataset]))
+
+
+def dataset_path(dataset):
+    return os.path.join(CACHE_DIR, DATASET_FILES[dataset])
+
+
+class ArtifactIndex:
+    def __init__(self, path=ARTIFACTS_PATH):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            return read_json(self.path)
+        except (OSError, CacheCorrupt):
+            return {}
+
+    def get(self, dataset):
+        return self.entries.get(dataset)
+
+    def record(self, dataset, source, **details):
+        """Note that `dataset` was just written, hashing the file as it is now.
+
+        Call it while holding the dataset's CacheStore lock, so the checksum is
+        that of the file this run wrote.
+        """
+        path = dataset_path(dataset)
+        now = time.time()
+        entry = {
+            "fetched_at": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+            "fetched_ts": now,
+            "source": source,
+            "checksum": file_fingerprint(path),
+            "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+            **details,
+        }
+        # Other stages and runs record their datasets into the same file
+        with locked("artifacts"):
+            self.entries = self._load()
+            self.entries[dataset] = entry
+            write_json(self.path, self.entries, compress=False)
+        return entry
+
+    def intact(self, dataset):
+        """True if the cached file is still the one recorded (not missing, edited or truncated)."""
+        entry = self.get(dataset)
+        return bool(entry) and entry.get("checksum") is not None and file_fingerprint(dataset_path(dataset)) == entry["checksum"]
+
+    def age(self, dataset, now=None):
+        entry = self.get(dataset)
+        if not entry:
+            return None
+        return (now or time.time()) - entry["fetched_ts"]
+
+    def is_fresh(self, dataset, now=None):
+        """True if `dataset` is intact and younger than its time to live."""
+        max_age = ttl(dataset)
+        if max_age is None or not self.intact(dataset):
+            return False
+        return self.age(dataset, now) < max_age
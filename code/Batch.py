@@ -0,0 +1,214 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Reports for many accounts in one go. Each account is built in a fresh
+# process (the modules read the API key and cache folder when they load) with
+# its own cache and workbook under accounts/<name>/, and its output goes to
+# accounts/<name>/run.log. Accounts that share an API key share its rate
+# limits through SharedRateLimit, and the instrument list, which is the same
+# for every account, is downloaded once per environment before the fan-out.
+
+# Not taken from Paths: workers import this module before their account's
+# cache folder is set, and Paths reads it once
+DEFAULT_OUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "accounts")
+DEFAULT_WORKERS = 4
+# The instrument list changes rarely and its endpoint allows one call a minute
+SHARED_INSTRUMENTS_MAX_AGE = 24 * 3600
+_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+def load_accounts(path):
+    """Accounts from a JSON list of objects with "name", "api_key" (or "api_key_env",
+    the variable holding it), "demo", "start_date" (YYYY-MM-DD) and optionally
+    "rate_limit_group". Raises ValueError describing the first invalid entry."""
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read accounts file {path}: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty list of accounts")
+
+    accounts, names = [], set()
+    for position, entry in enumerate(entries, 1):
+        name = str(entry.get("name", "")).strip()
+        if not _NAME.match(name):
+            raise ValueError(f"Account {position}: name must use only letters, digits, '.', '_' and '-'")
+        if name in names:
+            raise ValueError(f"Account {position}: name '{name}' is used twice")
+        names.add(name)
+        api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env") or "")
+        if not api_key:
+            raise ValueError(f"Account '{name}': no api_key, or api_key_env names an unset variable")
+        try:
+            start_date = datetime.strptime(str(entry.get("start_date")), "%Y-%m-%d").strftime("%Y-%m-%dT00:00:00Z")
+        except ValueError:
+            raise ValueError(f"Account '{name}': start_date must be YYYY-MM-DD")
+        accounts.append({
+            "name": name,
+            "api_key": api_key,
+            "demo": bool(entry.get("demo", False)),
+            "start_date": start_date,
+            # Default group: the key itself, as T212 counts calls per key
+            "rate_limit_group": str(entry.get("rate_limit_group") or hashlib.sha256(api_key.encode()).hexdigest()[:12]),
+        })
+    return accounts
+
+
+def _use_account(account, cache_dir=None, output_path=None, shared_instruments=None):
+    """Point this process at `account`; must run before any fetching module is imported."""
+    os.environ["T212_API_KEY"] = account["api_key"]
+    os.environ["T212_DEMO"] = "true" if account["demo"] else "false"
+    os.environ.pop("T212_CASSETTE", None)
+    if cache_dir:
+        os.environ["T212_CACHE_DIR"] = cache_dir
+    if output_path:
+        os.environ["T212_OUTPUT_PATH"] = output_path
+    if shared_instruments:
+        os.environ["T212_SHARED_INSTRUMENTS"] = shared_instruments
+
+
+def _redirect_output(log_path):
+    # At the descriptor level, so chart worker processes log there too
+    sys.stdout.flush()
+    sys.stderr.flush()
+    log = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    os.close(log)
+
+
+def _share_rate_limit(account, rate_state, rate_lock):
+    from AccountData import share_rate_limit
+    from SharedRateLimit import SharedRateLimit
+    share_rate_limit(SharedRateLimit(rate_state, rate_lock, account["rate_limit_group"]))
+
+
+def fetch_shared_instruments(account, path, rate_state, rate_lock):
+    """Worker: download the instrument list with `account`'s key to `path`."""
+    _use_account(account, cache_dir=os.path.dirname(path))
+    _redirect_output(f"{path}.log")
+    _share_rate_limit(account, rate_state, rate_lock)
+    from AccountData import get_instruments
+    from CacheStore import write_json
+
+    instruments = get_instruments(strict=True)
+    write_json(path, instruments)
+    return len(instruments)
+
+
+def run_account(account, account_dir, shared_instruments, rate_state, rate_lock, sheets=None, metrics_sheet=False):
+    """Worker: build `account`'s workbook in `account_dir`. Returns a status dict."""
+    cache_dir = os.path.join(account_dir, "cache")
+    output_path = os.path.join(account_dir, "AccountAnalysis.xlsx")
+    os.makedirs(account_dir, exist_ok=True)
+    _use_account(account, cache_dir, output_path, shared_instruments)
+    _redirect_output(os.path.join(account_dir, "run.log"))
+    started = time.perf_counter()
+
+    from RunMetrics import METRICS
+    from Pipeline import PipelineError
+    from Report import reset_cache, run_report
+    from sheet_generators.SheetRegistry import resolve_selection, required_datasets
+
+    if metrics_sheet:
+        METRICS.enable_memory_tracking()
+    keys = [key.strip() for key in sheets.split(",") if key.strip()] if sheets else None
+    if not keys:
+        reset_cache(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    _share_rate_limit(account, rate_state, rate_lock)
+    print(f"=== {account['name']} ({'Demo' if account['demo'] else 'Live'}) ===")
+
+    error = None
+    try:
+        run_report(required_datasets(resolve_selection(keys)), account["start_date"], sheets=keys,
+                   metrics_sheet=metrics_sheet)
+    except (PipelineError, ValueError) as e:
+        error = str(e)
+        print(f"❌ Report not built: {e}")
+    finally:
+        METRICS.save()
+    return {
+        "name": account["name"],
+        "ok": error is None,
+        "error": error,
+        "seconds": time.perf_counter() - started,
+        "output": output_path,
+    }
+
+
+def _prefetch_instruments(pool, accounts, shared_dir, rate_state, rate_lock):
+    """Shared instrument list path per environment ("demo"/"live"), fetched if missing or stale."""
+    paths, pending = {}, {}
+    for account in accounts:
+        environment = "demo" if account["demo"] else "live"
+        if environment in paths:
+            continue
+        path = os.path.join(shared_dir, f"instruments_{environment}.json")
+        paths[environment] = path
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < SHARED_INSTRUMENTS_MAX_AGE:
+            print(f"✅ Reusing the {environment} instrument list from {path}")
+            continue
+        pending[pool.submit(fetch_shared_instruments, account, path, rate_state, rate_lock)] = environment
+
+    for future in as_completed(pending):
+        environment = pending[future]
+        try:
+            print(f"✅ {future.result()} {environment} instruments cached for every account")
+        except Exception as e:
+            # Each account then fetches the list itself
+            print(f"⚠️ Could not fetch the shared {environment} instrument list: {e}")
+            paths.pop(environment)
+    return paths
+
+
+def run_batch(accounts_path, out_dir=None, workers=None, sheets=None, metrics_sheet=False):
+    """Build a report per account in `accounts_path` across a process pool. True if all were built."""
+    accounts = load_accounts(accounts_path)
+    if sheets:
+        from sheet_generators.SheetRegistry import resolve_selection
+        resolve_selection([key.strip() for key in sheets.split(",") if key.strip()])
+    out_dir = os.path.abspath(out_dir or DEFAULT_OUT_DIR)
+    shared_dir = os.path.join(out_dir, "shared")
+    os.makedirs(shared_dir, exist_ok=True)
+    workers = max(1, min(workers or int(os.getenv("BATCH_WORKERS", DEFAULT_WORKERS)), len(accounts)))
+    print(f"🗂️ Building {len(accounts)} account reports in {out_dir} with {workers} workers")
+
+    # Spawned, one task per process: a reused worker would keep the previous
+    # account's key and cache folder in its already imported modules
+    context = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    results = []
+    with context.Manager() as manager:
+        rate_state, rate_lock = manager.dict(), manager.Lock()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+            instruments = _prefetch_instruments(pool, accounts, shared_dir, rate_state, rate_lock)
+            futures = {}
+            for account in accounts:
+                shared = instruments.get("demo" if account["demo"] else "live")
+                futures[pool.submit(run_account, account, os.path.join(out_dir, account["name"]), shared,
+                                    rate_state, rate_lock, sheets, metrics_sheet)] = account
+            for future in as_completed(futures):
+                account = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"name": account["name"], "ok": False, "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+                results.append(result)
+                if result["ok"]:
+                    print(f"✅ {result['name']:<20} {result['seconds']:6.1f}s  {result['output']}")
+                else:
+                    print(f"❌ {result['name']:<20} {result['seconds']:6.1f}s  {result['error']} "
+                          f"(see {os.path.join(out_dir, result['name'], 'run.log')})")
+
+    built = sum(result["ok"] for result in results)
+    print(f"📊 {built}/{len(accounts)} reports built in {time.perf_counter() - started:.1f}s")
+    return built == len(accounts)
@@ -1,25 +1,233 @@
 import os
-import json
+import csv
+import time
+import shutil
+from datetime import datetime, timedelta
 from AccountData import (
     get_cash_info,
     get_open_positions,
     get_pies,
+    get_instruments,
     export_account_history,
+    export_period_end,
+    ask_account_start_date,
+    FetchError,
 )
+from ArtifactIndex import ArtifactIndex, ttl, dataset_path
+from CacheStore import locked, read_json, write_json, CacheCorrupt
+from Cassette import active_cassette
+from SnapshotStore import record_snapshot, SNAPSHOT_DATASETS
+from Pipeline import Stage, Pipeline
+from sheet_generators.SheetRegistry import DATASET_FILES
+from Paths import CACHE_DIR, HISTORY_CSV
 
-CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 def save_json(data, filename):
-    with open(os.path.join(CACHE_DIR, filename), "w") as f:
-        json.dump(data, f, indent=2)
+    write_json(os.path.join(CACHE_DIR, filename), data)
 
-def create_cache_data():
+def _source():
+    cassette = active_cassette()
+    return "cassette" if cassette and cassette.replaying else "api"
+
+def _fetch_json(getter, dataset, index, **kwargs):
+    def fetch(inputs):
+        data = getter(strict=True, **kwargs)
+        with locked(dataset):
+            save_json(data, DATASET_FILES[dataset])
+            index.record(dataset, _source())
+    return fetch
+
+def _pie_summary(pie):
+    return {key: value for key, value in pie.items() if key != "detailed"}
+
+def _fetch_pies(index, refresh=False):
+    def fetch(inputs):
+        # /equity/pies already reports each pie's result, so a pie whose summary
+        # is unchanged keeps its cached holdings until they expire. A cassette
+        # must contain every detail call, so it always fetches them all.
+        previous, detail_times = {}, {}
+        if not refresh and active_cassette() is None and index.intact("pies"):
+            try:
+                previous = {pie.get("id"): pie for pie in read_json(dataset_path("pies"))}
+                detail_times = index.get("pies").get("details_fetched", {})
+            except (OSError, CacheCorrupt):
+                pass
+        now, max_age, reused = time.time(), ttl("pie_detail"), set()
+
+        def reuse_detail(pie):
+            cached = previous.get(pie.get("id"))
+            fetched_ts = detail_times.get(str(pie.get("id")))
+            if (cached and cached.get("detailed") and fetched_ts and now - fetched_ts < max_age
+                    and _pie_summary(cached) == _pie_summary(pie)):
+                reused.add(str(pie.get("id")))
+                return cached["detailed"]
+            return None
+
+        pies = get_pies(include_detailed=True, strict=True, reuse_detail=reuse_detail)
+        details_fetched = {
+            str(pie.get("id")): detail_times[str(pie.get("id"))] if str(pie.get("id")) in reused else now
+            for pie in pies if pie.get("detailed")
+        }
+        with locked("pies"):
+            save_json(pies, DATASET_FILES["pies"])
+            index.record("pies", _source(), details_fetched=details_fetched, details_reused=len(reused))
+        if reused:
+            print(f"♻️ {len(reused)} of {len(pies)} pie details unchanged, not refetched")
+    return fetch
+
+def _fetch_instruments(index):
+    def fetch(inputs):
+        # Batch runs fetch the instrument list (tickers, ISINs, quote currencies)
+        # once per environment and every account copies it
+        shared = os.getenv("T212_SHARED_INSTRUMENTS")
+        if shared and os.path.exists(shared) and active_cassette() is None:
+            instruments, source = read_json(shared), "shared"
+        else:
+            instruments, source = get_instruments(strict=True), _source()
+        with locked("instruments"):
+            save_json(instruments, DATASET_FILES["instruments"])
+            index.record("instruments", source)
+    return fetch
+
+def _keep(inputs):
+    pass
+
+def _snapshot(inputs):
+    # A replayed cassette is an old recording, not the account as it is now
+    if _source() == "cassette":
+        return
+    try:
+        record_snapshot()
+    except OSError as e:
+        print(f"⚠️ Snapshot not recorded: {e}")
+
+def append_history(csv_path, new_path):
+    """Append the rows of export `new_path` to `csv_path`; returns the number of rows added.
+
+    T212 only includes the columns an export has values for, so the header is
+    widened when the new rows bring extra columns. The result is written to a
+    copy that replaces `csv_path` once complete.
+    """
+    with open(new_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        new_fields = reader.fieldnames or []
+        rows = list(reader)
+    if not rows:
+        return 0
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        fields = next(csv.reader(f), [])
+    extra = [field for field in new_fields if field not in fields]
+    tmp_path = f"{csv_path}.{os.getpid()}.tmp"
+
+    if not extra:
+        shutil.copyfile(csv_path, tmp_path)
+        with open(tmp_path, "rb") as f:
+            f.seek(max(os.path.getsize(tmp_path) - 1, 0))
+            needs_newline = f.read(1) not in (b"\n", b"")
+        with open(tmp_path, "a", encoding="utf-8", newline="") as f:
+            if needs_newline:
+                f.write("\r\n")
+            csv.DictWriter(f, fields).writerows(rows)
+    else:
+        with open(csv_path, "r", encoding="utf-8", newline="") as old, \
+                open(tmp_path, "w", encoding="utf-8", newline="") as out:
+            writer = csv.DictWriter(out, fields + extra)
+            writer.writeheader()
+            writer.writerows(csv.DictReader(old))
+            writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+    return len(rows)
+
+def _fetch_history(account_start_date, index, refresh=False):
+    def fetch(inputs):
+        time_to = export_period_end()
+        previous = index.get("history")
+        # Downloaded next to the cache and moved in once complete, so readers
+        # and other runs never see a partial export
+        new_path = f"{HISTORY_CSV}.{os.getpid()}.new"
+        # A cached export from the same start date only lacks the days since it was made
+        if (not refresh and previous and previous.get("time_from") == account_start_date
+                and previous.get("time_to") and index.intact("history")):
+            if previous["time_to"] >= time_to:
+                print(f"♻️ history covers up to {previous['time_to'][:10]}, nothing new to export")
+                return
+            time_from = (datetime.strptime(previous["time_to"], "%Y-%m-%dT%H:%M:%SZ")
+                         + timedelta(seconds=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            print(f"🕐 Exporting the history from {time_from[:10]} to add to the cached export...")
+            if not export_account_history(time_from, time_to, csv_path=new_path):
+                raise FetchError("History export failed")
+            try:
+                with locked("history"):
+                    added = append_history(HISTORY_CSV, new_path)
+                    index.record("history", _source(), time_from=account_start_date, time_to=time_to,
+                                 appended_rows=added)
+            finally:
+                os.remove(new_path)
+            print(f"✅ {added} history rows appended")
+            return
+
+        if not export_account_history(account_start_date, time_to, csv_path=new_path):
+            raise FetchError("History export failed")
+        with locked("history"):
+            os.replace(new_path, HISTORY_CSV)
+            index.record("history", _source(), time_from=account_start_date, time_to=time_to)
+    return fetch
+
+def fetch_stages(datasets=None, account_start_date=None, refresh=False):
+    """One pipeline stage per dataset in SheetRegistry.DATASET_FILES (all of them by default).
+
+    The stages are independent, so they download concurrently. Each retries
+    on its own and falls back to the file of an earlier run if it keeps failing.
+    Datasets still within their time to live (see ArtifactIndex) are kept and
+    the history is only extended by the days it lacks, unless `refresh` is set
+    or a cassette is recorded or replayed.
+    A final "snapshot" stage appends cash, positions and pies to the
+    SnapshotStore once they are fetched.
+    """
+    # A cassette holds every response of a full fetch: recording one keeps
+    # nothing from the cache, and replaying one replaces what the cache has
+    if active_cassette() is not None:
+        refresh = True
+    index = ArtifactIndex()
+    fetchers = {
+        "cash": _fetch_json(get_cash_info, "cash", index),
+        "positions": _fetch_json(get_open_positions, "positions", index),
+        "pies": _fetch_pies(index, refresh),
+        "instruments": _fetch_instruments(index),
+        # The export already polls for minutes, so it is not retried
+        "history": _fetch_history(account_start_date, index, refresh),
+    }
+    stages, fresh = [], []
+    for name, fetch in fetchers.items():
+        if datasets is None or name in datasets:
+            if not refresh and index.is_fresh(name):
+                fetch = _keep
+                fresh.append(f"{name} ({index.age(name):.0f}s old, kept for {ttl(name):.0f}s)")
+            stages.append(Stage(
+                f"fetch:{name}", fetch,
+                outputs=[os.path.join(CACHE_DIR, DATASET_FILES[name])],
+                retries=0 if name == "history" else 2,
+                reuse_outputs=True
+            ))
+    snapshot_inputs = [stage.name for stage in stages if stage.name[len("fetch:"):] in SNAPSHOT_DATASETS]
+    if snapshot_inputs:
+        stages.append(Stage("snapshot", _snapshot, inputs=snapshot_inputs))
+    if fresh:
+        print(f"♻️ Still fresh, not refetched: {', '.join(fresh)}")
+    return stages
+
+def create_cache_data(datasets=None, account_start_date=None, refresh=False):
+    """Fetch and cache the given datasets (all of them by default)."""
     print("Fetching and caching Trading212 data...")
 
-    save_json(get_cash_info(), "cash_info.json")
-    save_json(get_open_positions(), "open_positions.json")
-    save_json(get_pies(include_detailed=True), "pies_info.json")
-    export_account_history()
+    # Asked up front so the prompt does not interleave with concurrent fetches
+    if (datasets is None or "history" in datasets) and account_start_date is None:
+        account_start_date = ask_account_start_date()
+
+    pipeline = Pipeline()
+    for stage in fetch_stages(datasets, account_start_date, refresh):
+        pipeline.add(stage)
+    pipeline.run()
 
-    print("✅ All data cached in the 'cache' folder.")
\ No newline at end of file
+    print("✅ All data cached in the 'cache' folder.")
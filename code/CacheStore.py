@@ -0,0 +1,116 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from Paths import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Reading and writing cache files safely. Files are written to a temporary
+# file next to the target and renamed over it, so a crash or a reader never
+# sees half a file. JSON is stored compact, and gzipped with CACHE_COMPRESS=1
+# (readers recognise either form). A lock file per name under cache/.locks
+# serialises the runs sharing a cache folder: a dataset is written together
+# with its ArtifactIndex entry, and read while neither can change, so the
+# checksum recorded for it can be verified on load.
+
+LOCK_DIR = os.path.join(CACHE_DIR, ".locks")
+GZIP_MAGIC = b"\x1f\x8b"
+
+# mkstemp creates files readable by their owner only; give them the usual mode
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+class CacheCorrupt(Exception):
+    pass
+
+
+def compression_enabled():
+    return os.getenv("CACHE_COMPRESS", "").lower() in ("1", "true", "yes", "gzip")
+
+
+def atomic_write(path, payload):
+    """Write bytes to `path` through a temporary file and a rename; returns their sha256."""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, FILE_MODE)
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return hashlib.sha256(payload).hexdigest()
+
+
+def encode_json(data, compress=None):
+    payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    if compress is None:
+        compress = compression_enabled()
+    # mtime=0 keeps the bytes, and so the checksums, the same for the same data
+    return gzip.compress(payload, compresslevel=6, mtime=0) if compress else payload
+
+
+def decode_json(raw):
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
+
+def write_json(path, data, compress=None):
+    """Store `data` at `path` atomically; returns the file's sha256."""
+    return atomic_write(path, encode_json(data, compress))
+
+
+def read_json(path, checksum=None):
+    """Load `path`, plain or gzipped. Raises CacheCorrupt if it does not match `checksum`."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if checksum and hashlib.sha256(raw).hexdigest() != checksum:
+        raise CacheCorrupt(f"{os.path.basename(path)} does not match the checksum recorded when it was written")
+    try:
+        return decode_json(raw)
+    except (OSError, EOFError, ValueError) as e:
+        raise CacheCorrupt(f"{os.path.basename(path)} cannot be read: {e}")
+
+
+@contextmanager
+def locked(name, shared=False):
+    """Hold the cross-process lock `name` of this cache folder (shared locks only exclude writers)."""
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(os.path.join(LOCK_DIR, f"{name}.lock"), "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            # msvcrt has no shared locks and gives up after ~10s, so keep trying
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
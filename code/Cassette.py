@@ -0,0 +1,156 @@
+import os
+import json
+import threading
+from datetime import datetime
+from Paths import CACHE_DIR
+
+# Recorded Trading212 responses, so a report can be rebuilt from real account
+# data with no network and no waiting on the export. Every request AccountData
+# makes goes through _request, which records into or replays from the
+# cassette named by T212_CASSETTE ("record:<dir>" or "replay:<dir>").
+#
+# A cassette is a folder with manifest.json and one file per response body.
+# Requests are matched on method and path below the API base URL, so a
+# cassette recorded against the live API replays under any base URL; request
+# bodies are not matched (the export's end date changes daily). Repeated
+# requests, such as export status polls, replay in recorded order and the last
+# response repeats after that. API keys and request headers are never stored.
+
+CASSETTE_ROOT = os.path.join(CACHE_DIR, "cassettes")
+FORMAT_VERSION = 1
+DOWNLOAD_KEY = "GET <export download>"
+
+_EXTENSIONS = {"application/json": "json", "text/csv": "csv"}
+_KEPT_HEADERS = ("content-type", "x-ratelimit-limit", "x-ratelimit-period", "x-ratelimit-remaining",
+                 "x-ratelimit-reset")
+
+
+class CassetteError(Exception):
+    pass
+
+
+def resolve_cassette(name=None, for_replay=False):
+    """Folder for cassette `name`: an existing path, a name under cache/cassettes, or
+    (without a name) a new timestamped folder to record or the latest one to replay."""
+    if name and (os.path.isabs(name) or os.path.exists(name)):
+        return name
+    if name and name != "latest":
+        return os.path.join(CASSETTE_ROOT, name)
+    if not for_replay:
+        return os.path.join(CASSETTE_ROOT, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    recorded = sorted(entry for entry in os.listdir(CASSETTE_ROOT)
+                      if os.path.exists(os.path.join(CASSETTE_ROOT, entry, "manifest.json"))) \
+        if os.path.isdir(CASSETTE_ROOT) else []
+    if not recorded:
+        raise CassetteError(f"No recorded cassettes in {CASSETTE_ROOT}")
+    return os.path.join(CASSETTE_ROOT, recorded[-1])
+
+
+class Cassette:
+    def __init__(self, path, mode):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.positions = {}
+        manifest_path = os.path.join(path, "manifest.json")
+
+        if mode == "replay":
+            try:
+                with open(manifest_path, "r") as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CassetteError(f"Cannot read cassette {path}: {e}")
+            if self.manifest.get("format_version") != FORMAT_VERSION:
+                raise CassetteError(f"Cassette {path} has format version {self.manifest.get('format_version')}, "
+                                    f"this version reads {FORMAT_VERSION}; record it again")
+        else:
+            if os.path.exists(manifest_path):
+                raise CassetteError(f"Cassette {path} already exists, record into a new one")
+            os.makedirs(os.path.join(path, "responses"), exist_ok=True)
+            self.manifest = {"format_version": FORMAT_VERSION,
+                             "recorded_at": datetime.now().isoformat(timespec="seconds"), "entries": {}}
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def key(self, method, url, base_url):
+        if url.startswith(base_url):
+            return f"{method} {url[len(base_url):]}"
+        # Export download links point at a signed, one-off URL elsewhere
+        return DOWNLOAD_KEY
+
+    def record(self, method, url, base_url, response, json_body=None):
+        key = self.key(method, url, base_url)
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        extension = _EXTENSIONS.get(content_type, "csv" if key == DOWNLOAD_KEY else "txt")
+        with self.lock:
+            entries = self.manifest["entries"].setdefault(key, [])
+            file_name = f"responses/{sum(len(e) for e in self.manifest['entries'].values()):05d}.{extension}"
+            with open(os.path.join(self.path, file_name), "wb") as f:
+                f.write(response.content)
+            entries.append({
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() in _KEPT_HEADERS},
+                "file": file_name,
+                "request_body": json_body,
+            })
+            self._save()
+
+    def _save(self):
+        path = os.path.join(self.path, "manifest.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def replay(self, method, url, base_url):
+        """A requests.Response rebuilt from the next recorded response for this request."""
+        import requests
+        from requests.structures import CaseInsensitiveDict
+
+        key = self.key(method, url, base_url)
+        with self.lock:
+            entries = self.manifest["entries"].get(key)
+            if not entries:
+                raise CassetteError(f"No recorded response for {key} in cassette {self.path}")
+            position = self.positions.get(key, 0)
+            entry = entries[min(position, len(entries) - 1)]
+            self.positions[key] = position + 1
+
+        with open(os.path.join(self.path, entry["file"]), "rb") as f:
+            content = f.read()
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response._content = content
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = "utf-8"
+        response.url = url
+        response.request = requests.Request(method, url).prepare()
+        return response
+
+    def request_body(self, key):
+        """JSON body of the first recorded `key` request, e.g. the export's period."""
+        entries = self.manifest["entries"].get(key) or [{}]
+        return entries[0].get("request_body")
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def active_cassette():
+    """The cassette selected by T212_CASSETTE, opened once per process, or None."""
+    global _active
+    setting = os.getenv("T212_CASSETTE")
+    if not setting:
+        return None
+    with _active_lock:
+        if _active is None:
+            mode, _, path = setting.partition(":")
+            _active = Cassette(path, mode)
+            print(f"📼 {'Replaying' if _active.replaying else 'Recording'} Trading212 responses "
+                  f"{'from' if _active.replaying else 'into'} {path}")
+        return _active
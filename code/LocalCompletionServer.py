@@ -0,0 +1,138 @@
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A stand-in for the OpenAI chat completions endpoint, so the AI sheet (and
+# its history map-reduce) can be exercised offline. Point the client at it with
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=local
+# Replies are deterministic descriptions of the prompt, after a fixed latency.
+
+
+def stand_in_reply(prompt):
+    dates = sorted(re.findall(r"\d{4}-\d{2}-\d{2}", prompt))
+    rows = sum(1 for line in prompt.splitlines() if " | " in line)
+    words = len(prompt.split())
+    span = f"{dates[0]} to {dates[-1]}" if dates else "an unknown period"
+    return (f"Stand-in analysis covering {span}: the prompt had {words} words "
+            f"and {rows} table rows. No model was consulted.")
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    server_version = "LocalCompletionServer/1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{self.address_string()} {format % args}\n")
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        # Past the concurrency limit behave like the real API and ask the client to back off
+        if not self.server.slots.acquire(blocking=False):
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded",
+                                            "code": "rate_limit_exceeded"}}, {"Retry-After": "1"})
+            return
+        try:
+            with self.server.lock:
+                self.server.requests += 1
+            prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+            reply = stand_in_reply(prompt)
+            model = request.get("model", "local")
+            created = int(time.time())
+
+            if request.get("stream"):
+                self._stream(reply, model, created)
+            else:
+                time.sleep(self.server.latency)
+                self._send_json(200, {
+                    "id": f"chatcmpl-local-{self.server.requests}",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(reply.split()),
+                              "total_tokens": len(prompt.split()) + len(reply.split())},
+                })
+        finally:
+            self.server.slots.release()
+
+    def _stream(self, reply, model, created):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        words = reply.split(" ")
+        delay = self.server.latency / max(len(words), 1)
+        for index, word in enumerate(words):
+            time.sleep(delay)
+            chunk = {
+                "id": f"chatcmpl-local-{self.server.requests}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if index == 0 else f" {word}"}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=8765, latency=0.5, max_concurrency=8, verbose=False):
+    """Build (but do not start) a server; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), CompletionHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.slots = threading.BoundedSemaphore(max_concurrency)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per completion")
+    parser.add_argument("--max-concurrency", type=int, default=8,
+                        help="requests served at once before answering 429")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.max_concurrency, args.verbose)
+    print(f"✅ Stand-in completions at http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
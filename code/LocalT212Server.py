@@ -0,0 +1,451 @@
+import os
+import re
+import sys
+import csv
+import io
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from CacheStore import decode_json
+
+# A stand-in for the Trading212 public API, so the fetch layer can be load
+# tested without a real account. Routes and per-endpoint rate limits come from
+# documentation/swagger.json; responses are built from an account folder in
+# the cache layout (the JSON files plus trading212_history.csv), by default a
+# synthetic one from benchmarks/SyntheticAccount.py. Point AccountData at it with
+#   T212_BASE_URL=http://127.0.0.1:8212/api/v0 T212_API_KEY=local
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SWAGGER_PATH = os.path.join(PROJECT_ROOT, "documentation", "swagger.json")
+
+ACCOUNT_CURRENCY = "EUR"
+MAX_PAGE_SIZE = 50
+ORDER_TYPES = {"market": "MARKET", "limit": "LIMIT", "stop": "STOP"}
+TAX_COLUMNS = [("Currency conversion fee", "CURRENCY_CONVERSION_FEE"),
+               ("Stamp duty reserve tax", "STAMP_DUTY_RESERVE_TAX")]
+
+
+def parse_rate_limit(description):
+    """(calls, seconds) from a swagger 429 description such as "Limited: 6 / 1m0s", else None."""
+    match = re.search(r"(\d+)\s*/\s*(?:(\d+)m)?(?:(\d+)s)?", description or "")
+    if not match or not (match.group(2) or match.group(3)):
+        return None
+    return int(match.group(1)), int(match.group(2) or 0) * 60 + int(match.group(3) or 0)
+
+
+def load_routes(swagger_path=SWAGGER_PATH):
+    """[(method, path regex, path template, rate limit, responses)] for every documented operation."""
+    with open(swagger_path, "r") as f:
+        spec = json.load(f)
+    routes = []
+    for template, operations in spec["paths"].items():
+        pattern = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template) + "$")
+        for method, operation in operations.items():
+            responses = operation.get("responses", {})
+            limit = parse_rate_limit(responses.get("429", {}).get("description"))
+            routes.append((method.upper(), pattern, template, limit, responses))
+    return routes
+
+
+class RateLimiter:
+    """Sliding-window limit of `calls` per `period` seconds, per API key."""
+
+    def __init__(self, calls, period):
+        self.calls = calls
+        self.period = period
+        self.lock = threading.Lock()
+        self.history = {}
+
+    def check(self, key):
+        """(allowed, remaining, reset time) for one more call by `key`."""
+        now = time.time()
+        with self.lock:
+            calls = self.history.setdefault(key, deque())
+            while calls and now - calls[0] >= self.period:
+                calls.popleft()
+            if len(calls) >= self.calls:
+                return False, 0, calls[0] + self.period
+            calls.append(now)
+            return True, self.calls - len(calls), calls[0] + self.period
+
+
+def _iso(csv_time):
+    return csv_time.replace(" ", "T") + ".000Z" if csv_time else None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MockAccount:
+    """API responses derived from one account folder.
+
+    History items are (sequence, item) pairs, oldest first; the sequence is
+    the row number in the CSV and doubles as the pagination cursor.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+        def load(name, default):
+            path = os.path.join(data_dir, f"{name}.json")
+            if not os.path.exists(path):
+                return default
+            # A copied cache folder may hold gzipped files (CACHE_COMPRESS)
+            with open(path, "rb") as f:
+                return decode_json(f.read())
+
+        self.positions = load("open_positions", [])
+        self.cash = load("cash_info", {})
+        self.pies = load("pies_info", [])
+        self.instruments = load("instruments", [])
+        history_path = os.path.join(data_dir, "trading212_history.csv")
+        self.history_columns, self.history = [], []
+        if os.path.exists(history_path):
+            with open(history_path, "r", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                self.history = list(reader)
+                self.history_columns = reader.fieldnames or []
+        self.orders, self.dividends, self.transactions = self._history_items()
+
+    def _history_items(self):
+        isin_ticker = {i.get("isin"): i.get("ticker") for i in self.instruments}
+        orders, dividends, transactions = [], [], []
+        for number, row in enumerate(self.history, start=1):
+            action = (row.get("Action") or "").lower()
+            when = _iso(row.get("Time"))
+            ticker = isin_ticker.get(row.get("ISIN")) or row.get("Ticker")
+            if action.split(" ")[0] in ORDER_TYPES and action.split(" ")[-1] in ("buy", "sell"):
+                kind = ORDER_TYPES[action.split(" ")[0]]
+                shares = _float(row.get("No. of shares")) or 0
+                quantity = shares if action.endswith("buy") else -shares
+                price = _float(row.get("Price / share"))
+                orders.append((number, {
+                    "id": number, "fillId": number, "ticker": ticker, "type": kind, "status": "FILLED",
+                    "executor": "WEB", "fillType": "TOTV",
+                    "timeValidity": "DAY" if kind == "MARKET" else "GOOD_TILL_CANCEL",
+                    "orderedQuantity": quantity, "filledQuantity": quantity, "fillPrice": price,
+                    "fillCost": round(shares * (price or 0), 2), "filledValue": _float(row.get("Total")),
+                    "fillResult": _float(row.get("Result")),
+                    "limitPrice": price if kind == "LIMIT" else None, "stopPrice": price if kind == "STOP" else None,
+                    "dateCreated": when, "dateExecuted": when, "dateModified": when,
+                    "taxes": [{"fillId": str(number), "name": name, "quantity": -abs(_float(row.get(column))),
+                               "timeCharged": when}
+                              for column, name in TAX_COLUMNS if _float(row.get(column))],
+                }))
+            elif action.startswith("dividend"):
+                shares = _float(row.get("No. of shares")) or 0
+                amount = _float(row.get("Total")) or 0
+                dividends.append((number, {
+                    "ticker": ticker, "reference": row.get("ID"), "quantity": shares,
+                    "amount": amount, "amountInEuro": amount,
+                    "grossAmountPerShare": _float(row.get("Price / share")), "paidOn": when, "type": "ORDINARY",
+                }))
+            elif action in ("deposit", "withdrawal"):
+                # Doubled so a deposit and its fee get distinct cursors
+                transactions.append((number * 2, {"type": "DEPOSIT" if action == "deposit" else "WITHDRAW",
+                                                  "amount": _float(row.get("Total")), "dateTime": when,
+                                                  "reference": row.get("ID")}))
+                if _float(row.get("Deposit fee")):
+                    transactions.append((number * 2 + 1, {"type": "FEE", "amount": _float(row.get("Deposit fee")),
+                                                          "dateTime": when, "reference": f"{row.get('ID')}-fee"}))
+        return orders, dividends, transactions
+
+    def export_csv(self, request):
+        """History rows within the export's period and included data, as CSV bytes."""
+        included = request.get("dataIncluded") or {}
+        start = (request.get("timeFrom") or "")[:19].replace("T", " ")
+        end = (request.get("timeTo") or "9999")[:19].replace("T", " ")
+
+        def wanted(action):
+            action = action.lower()
+            if action.endswith("buy") or action.endswith("sell"):
+                return included.get("includeOrders", True)
+            if action.startswith("dividend"):
+                return included.get("includeDividends", True)
+            if "interest" in action:
+                return included.get("includeInterest", True)
+            return included.get("includeTransactions", True)
+
+        out = io.StringIO()
+        writer = csv.DictWriter(out, self.history_columns)
+        writer.writeheader()
+        for row in self.history:
+            if start <= row.get("Time", "") <= end and wanted(row.get("Action", "")):
+                writer.writerow(row)
+        return out.getvalue().encode("utf-8")
+
+
+class T212Handler(BaseHTTPRequestHandler):
+    server_version = "LocalT212Server/1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{self.address_string()} {format % args}\n")
+
+    def _send(self, status, body, headers=None, content_type="application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        server = self.server
+
+        # Export download links are pre-signed on the real API, so no key or limit
+        download = re.match(r"^/downloads/(\d+)\.csv$", url.path)
+        if download and method == "GET":
+            report = server.reports.get(int(download.group(1)))
+            if report is None:
+                self._send(404, {"code": "NotFound"})
+            else:
+                self._send(200, server.account.export_csv(report["request"]), content_type="text/csv")
+            return
+
+        for route_method, pattern, template, limit, responses in server.routes:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                break
+        else:
+            self._send(404, {"code": "NotFound", "message": f"No {method} {url.path} in swagger.json"})
+            return
+
+        api_key = self.headers.get("Authorization")
+        if not api_key:
+            self._send(401, {"code": "Unauthorized", "message": responses.get("401", {}).get("description", "")})
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        headers = {}
+        limiter = server.limiters.get((method, template))
+        if limiter:
+            allowed, remaining, reset = limiter.check(api_key)
+            headers = {"x-ratelimit-limit": limiter.calls, "x-ratelimit-period": round(limiter.period, 3),
+                       "x-ratelimit-remaining": remaining, "x-ratelimit-reset": round(reset, 3)}
+            if not allowed:
+                with server.lock:
+                    server.throttled += 1
+                self._send(429, {"code": "TooManyRequests", "message": responses.get("429", {}).get("description")},
+                           headers)
+                return
+
+        with server.lock:
+            server.requests += 1
+        handler = ROUTE_HANDLERS.get((method, template))
+        if handler is None:
+            self._send(501, {"code": "NotImplemented", "message": f"{method} {template} is not emulated"}, headers)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        except ValueError:
+            self._send(400, {"code": "BadRequest", "message": "Invalid JSON body"}, headers)
+            return
+        status, payload = handler(self, match.groupdict(), query, body)
+        self._send(status, payload, headers)
+
+    def page(self, items, query, cursor_type=int, date_key="dateTime"):
+        """Newest-first page of (sequence, item) `items` in T212's cursor format.
+
+        The `time` filter compares each item's `date_key`, which differs per endpoint.
+        """
+        try:
+            limit = int(query.get("limit", 20))
+            cursor = int(query["cursor"]) if query.get("cursor") else None
+        except ValueError:
+            return 400, {"code": "BadRequest", "message": "Bad filtering arguments"}
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            return 400, {"code": "BadRequest", "message": f"limit must be between 1 and {MAX_PAGE_SIZE}"}
+
+        ticker = query.get("ticker")
+        since = query.get("time")
+        selected = []
+        for sequence, item in reversed(items):
+            if cursor is not None and sequence >= cursor:
+                continue
+            if ticker and item.get("ticker") != ticker:
+                continue
+            if since and (item.get(date_key) or "") > since:
+                continue
+            selected.append((sequence, item))
+            if len(selected) > limit:
+                break
+
+        next_path = None
+        if len(selected) > limit:
+            selected = selected[:limit]
+            params = f"limit={limit}&cursor={cursor_type(selected[-1][0])}"
+            params += (f"&ticker={ticker}" if ticker else "") + (f"&time={since}" if since else "")
+            next_path = f"{urlsplit(self.path).path}?{params}"
+        return 200, {"items": [item for _, item in selected], "nextPagePath": next_path}
+
+
+def _report_status(server, report):
+    elapsed = time.time() - report["created"]
+    if elapsed < server.export_delay * 0.3:
+        return "Queued"
+    if elapsed < server.export_delay:
+        return "Processing"
+    return "Finished"
+
+
+def _list_exports(handler, params, query, body):
+    server = handler.server
+    host, port = server.server_address[:2]
+    exports = []
+    for report_id, report in sorted(server.reports.items()):
+        status = _report_status(server, report)
+        exports.append({
+            "reportId": report_id, "status": status,
+            "timeFrom": report["request"].get("timeFrom"), "timeTo": report["request"].get("timeTo"),
+            "dataIncluded": report["request"].get("dataIncluded"),
+            "downloadLink": f"http://{host}:{port}/downloads/{report_id}.csv" if status == "Finished" else None,
+        })
+    return 200, exports
+
+
+def _request_export(handler, params, query, body):
+    if not body.get("timeFrom") or not body.get("timeTo"):
+        return 400, {"code": "BadRequest", "message": "timeFrom and timeTo are required"}
+    server = handler.server
+    with server.lock:
+        report_id = server.next_report_id
+        server.next_report_id += 1
+        server.reports[report_id] = {"request": body, "created": time.time()}
+    return 200, {"reportId": report_id}
+
+
+def _position(handler, params, query, body):
+    for position in handler.server.account.positions:
+        if position.get("ticker") == params["ticker"]:
+            return 200, position
+    return 404, {"code": "NotFound", "message": "No open position with that ticker"}
+
+
+def _pie(handler, params, query, body):
+    for pie in handler.server.account.pies:
+        if str(pie.get("id")) == params["id"]:
+            return 200, pie.get("detailed") or {"instruments": [], "settings": {"id": pie.get("id")}}
+    return 404, {"code": "NotFound", "message": "Pie not found"}
+
+
+def _exchanges(handler, params, query, body):
+    return 200, [{"id": 1, "name": "NASDAQ", "workingSchedules": []},
+                 {"id": 2, "name": "London Stock Exchange", "workingSchedules": []},
+                 {"id": 3, "name": "XETRA", "workingSchedules": []}]
+
+
+API = "/api/v0"
+ROUTE_HANDLERS = {
+    ("GET", f"{API}/equity/account/cash"): lambda h, p, q, b: (200, h.server.account.cash),
+    ("GET", f"{API}/equity/account/info"): lambda h, p, q, b: (200, {"currencyCode": ACCOUNT_CURRENCY, "id": 212212}),
+    ("GET", f"{API}/equity/portfolio"): lambda h, p, q, b: (200, h.server.account.positions),
+    ("GET", f"{API}/equity/portfolio/{{ticker}}"): _position,
+    # The list endpoint leaves out the per-instrument detail
+    ("GET", f"{API}/equity/pies"): lambda h, p, q, b: (
+        200, [{k: v for k, v in pie.items() if k != "detailed"} for pie in h.server.account.pies]),
+    ("GET", f"{API}/equity/pies/{{id}}"): _pie,
+    ("GET", f"{API}/equity/metadata/instruments"): lambda h, p, q, b: (200, h.server.account.instruments),
+    ("GET", f"{API}/equity/metadata/exchanges"): _exchanges,
+    ("GET", f"{API}/equity/history/orders"): lambda h, p, q, b: h.page(h.server.account.orders, q, date_key="dateCreated"),
+    ("GET", f"{API}/history/dividends"): lambda h, p, q, b: h.page(h.server.account.dividends, q, date_key="paidOn"),
+    ("GET", f"{API}/history/transactions"): lambda h, p, q, b: h.page(h.server.account.transactions, q, str),
+    ("GET", f"{API}/history/exports"): _list_exports,
+    ("POST", f"{API}/history/exports"): _request_export,
+}
+
+
+def make_server(data_dir, host="127.0.0.1", port=8212, latency=0.0, time_scale=1.0, rate_limits=True,
+                export_delay=5.0, verbose=False):
+    """Build (but do not start) a server for the account in `data_dir`; port 0 picks a free port.
+
+    `time_scale` shrinks every documented rate limit period (0.1 turns
+    "1 / 30s" into one call per 3 seconds) so load tests finish quickly.
+    """
+    server = ThreadingHTTPServer((host, port), T212Handler)
+    server.daemon_threads = True
+    server.account = MockAccount(data_dir)
+    server.routes = load_routes()
+    server.limiters = {}
+    if rate_limits:
+        for method, _, template, limit, _ in server.routes:
+            if limit:
+                server.limiters[(method, template)] = RateLimiter(limit[0], limit[1] * time_scale)
+    server.latency = latency
+    server.export_delay = export_delay
+    server.reports = {}
+    server.next_report_id = 1
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.throttled = 0
+    server.verbose = verbose
+    return server
+
+
+def synthetic_account(rows, seed=1):
+    """Folder with a synthetic account of `rows` history rows (see benchmarks/SyntheticAccount.py)."""
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, "benchmarks"))
+    from SyntheticAccount import generate
+
+    data_dir = tempfile.mkdtemp(prefix="t212mock_")
+    generate(data_dir, rows, seed=seed)
+    return data_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Trading212 public API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8212)
+    parser.add_argument("--data", default=None,
+                        help="account folder in the cache layout (default: a generated synthetic account)")
+    parser.add_argument("--rows", type=int, default=2000, help="history rows of the synthetic account")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every API response")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplier for the documented rate limit periods (default 1 = as documented)")
+    parser.add_argument("--no-rate-limits", action="store_true")
+    parser.add_argument("--export-delay", type=float, default=5.0, help="seconds until a CSV export is finished")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    data_dir = args.data or synthetic_account(args.rows)
+    server = make_server(data_dir, args.host, args.port, args.latency, args.time_scale,
+                         not args.no_rate_limits, args.export_delay, args.verbose)
+    print(f"✅ Stand-in Trading212 API at http://{args.host}:{server.server_address[1]}{API} "
+          f"({len(server.account.history)} history rows from {data_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"📊 {server.requests} requests served, {server.throttled} rate limited")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where a run keeps its downloads and state, and where it writes the workbook.
+# Batch runs point every account at its own folder through these variables;
+# they are read at import, so each account runs in a fresh process.
+CACHE_DIR = os.path.abspath(os.getenv("T212_CACHE_DIR") or os.path.join(PROJECT_ROOT, "cache"))
+HISTORY_CSV = os.path.join(CACHE_DIR, "trading212_history.csv")
+OUTPUT_PATH = os.getenv("T212_OUTPUT_PATH") or "AccountAnalysis.xlsx"
@@ -0,0 +1,189 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from RunMetrics import measure
+
+# Small DAG runner for the report: each stage names the stages whose results
+# it needs and the files it produces. Stages start as soon as their inputs are
+# done, on a thread pool, a process pool, or the main thread (for work that
+# prompts the user or must not leave it). A failing stage is retried on its
+# own; once out of retries it can fall back to outputs left by an earlier run.
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Stage:
+    def __init__(self, name, func, inputs=(), outputs=(), pool="thread", retries=0, backoff=2.0,
+                 reuse_outputs=False):
+        """`func` takes a dict of input stage name -> result.
+
+        pool is "thread", "process" (func and results must pickle) or "main".
+        With `reuse_outputs` a stage that keeps failing counts as done if all
+        its `outputs` files already exist, so the report is built from them.
+        """
+        if pool not in ("thread", "process", "main"):
+            raise ValueError(f"Unknown pool '{pool}' for stage {name}")
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.pool = pool
+        self.retries = retries
+        self.backoff = backoff
+        self.reuse_outputs = reuse_outputs
+
+
+def _run_stage(name, func, inputs, retries, backoff):
+    """Call `func` with retries; returns (result, attempts). Module level so process pools can pickle it."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with measure(name, "stage"):
+                return func(inputs), attempt
+        except Exception:
+            if attempt > retries:
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+
+class Pipeline:
+    def __init__(self, max_threads=None, max_processes=None):
+        self.stages = {}
+        self.max_threads = max_threads or int(os.getenv("PIPELINE_THREADS", "8"))
+        self.max_processes = max_processes
+        self.report = {}
+
+    def add(self, stage):
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage {stage.name}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def _needed(self, targets):
+        """Targets plus everything they depend on, checking that inputs exist and form no cycle."""
+        needed, visiting = [], set()
+
+        def visit(name, chain):
+            if name not in self.stages:
+                raise PipelineError(f"Stage {chain[-1] if chain else name} needs unknown stage {name}")
+            if name in needed:
+                return
+            if name in visiting:
+                raise PipelineError(f"Stage cycle: {' -> '.join(chain + [name])}")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency, chain + [name])
+            visiting.discard(name)
+            needed.append(name)
+
+        for target in targets:
+            visit(target, [])
+        return needed
+
+    def run(self, targets=None):
+        """Run `targets` (default: every stage) and their dependencies.
+
+        Returns {stage name: result}. Raises PipelineError naming the failed
+        stages if any target could not be produced.
+        """
+        order = self._needed(targets or list(self.stages))
+        results, failed = {}, {}
+        pending = list(order)
+        running = {}
+        started = {}
+        self.report = {}
+
+        threads = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="stage")
+        processes = None
+        try:
+            while pending or running:
+                # Stages whose dependency failed can never run
+                for name in list(pending):
+                    broken = [d for d in self.stages[name].inputs if d in failed]
+                    if broken:
+                        pending.remove(name)
+                        failed[name] = PipelineError(f"skipped, {', '.join(broken)} failed")
+                        self.report[name] = {"status": "skipped", "seconds": 0, "attempts": 0}
+
+                ready = [n for n in pending if all(d in results for d in self.stages[n].inputs)]
+                main_stage = None
+                for name in ready:
+                    stage = self.stages[name]
+                    inputs = {d: results[d] for d in stage.inputs}
+                    if stage.pool == "main":
+                        if main_stage is None:
+                            main_stage = (name, inputs)
+                        continue
+                    pending.remove(name)
+                    if stage.pool == "process":
+                        if processes is None:
+                            from concurrent.futures import ProcessPoolExecutor
+                            processes = ProcessPoolExecutor(max_workers=self.max_processes)
+                        executor = processes
+                    else:
+                        executor = threads
+                    started[name] = time.perf_counter()
+                    running[executor.submit(_run_stage, name, stage.func, inputs, stage.retries, stage.backoff)] = name
+
+                # Main-thread stages run while the pools keep working
+                if main_stage:
+                    name, inputs = main_stage
+                    pending.remove(name)
+                    stage = self.stages[name]
+                    started[name] = time.perf_counter()
+                    try:
+                        outcome = _run_stage(name, stage.func, inputs, stage.retries, stage.backoff)
+                        self._finish(name, outcome, None, started, results, failed)
+                    except Exception as e:
+                        self._finish(name, None, e, started, results, failed)
+                    continue
+
+                if not running:
+                    if pending:
+                        raise PipelineError(f"Stages cannot start: {', '.join(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self._finish(name, future.result(), None, started, results, failed)
+                    except Exception as e:
+                        self._finish(name, None, e, started, results, failed)
+        finally:
+            threads.shutdown(wait=True)
+            if processes is not None:
+                processes.shutdown(wait=True)
+
+        self.print_report(order)
+        missing = [t for t in (targets or order) if t in failed]
+        if missing:
+            raise PipelineError("; ".join(f"{name}: {failed[name]}" for name in missing))
+        return results
+
+    def _finish(self, name, outcome, error, started, results, failed):
+        stage = self.stages[name]
+        seconds = time.perf_counter() - started[name]
+        if error is None:
+            result, attempts = outcome
+            results[name] = result
+            self.report[name] = {"status": "ok", "seconds": seconds, "attempts": attempts}
+        elif stage.reuse_outputs and stage.outputs and all(os.path.exists(p) for p in stage.outputs):
+            print(f"⚠️ {name} failed ({error}), using the outputs of an earlier run")
+            results[name] = None
+            self.report[name] = {"status": "stale", "seconds": seconds, "attempts": stage.retries + 1}
+        else:
+            failed[name] = error
+            self.report[name] = {"status": "failed", "seconds": seconds, "attempts": stage.retries + 1}
+
+    def print_report(self, order):
+        icons = {"ok": "✅", "stale": "⚠️", "failed": "❌", "skipped": "⏭️"}
+        print("=== Pipeline ===")
+        for name in order:
+            entry = self.report.get(name)
+            if entry:
+                retries = f", {entry['attempts']} attempts" if entry["attempts"] > 1 else ""
+                print(f"{icons[entry['status']]} {name:<22}{entry['seconds']:>7.1f}s{retries}")
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ArtifactIndex import ArtifactIndex
+from CacheStore import read_json, CacheCorrupt
+from Paths import CACHE_DIR, HISTORY_CSV
+from SnapshotStore import LATEST_PATH, value_series
+from sheet_generators.FxRates import FX_RATES_PATH, account_currency
+from sheet_generators.SheetRegistry import DATASET_FILES
+from sheet_generators.PortfolioStats import (
+    read_history, fee_totals, win_loss, hold_times, hold_time_summary, pie_summaries,
+    pence_corrected_positions, capital_gains_series, dividends_series,
+)
+
+# The report's numbers as JSON for dashboards, without opening or rebuilding
+# the workbook. Every response is computed once from the cache folder and kept
+# as encoded bytes with an ETag, so a request is a dictionary lookup; clients
+# that send If-None-Match get 304 while the data is unchanged. The cache files
+# are checked for changes at most every RELOAD_SECONDS, in the background, so a
+# running `--watch` or headless run is picked up without restarting the server
+# or holding up requests.
+
+API = "/api"
+DEFAULT_PORT = 8213
+RELOAD_SECONDS = float(os.getenv("QUERY_RELOAD_SECONDS", "1"))
+
+
+def _dataset(name):
+    try:
+        return read_json(os.path.join(CACHE_DIR, DATASET_FILES[name]))
+    except (OSError, CacheCorrupt):
+        return None
+
+
+def compute_responses():
+    """{path: JSON-serialisable body} for every endpoint, from the cached datasets."""
+    rows = read_history(HISTORY_CSV)
+    cash = _dataset("cash") or {}
+    holds = hold_times(rows)
+    average_days, longest = hold_time_summary(holds, top=10)
+    fees = fee_totals(rows)
+    responses = {
+        f"{API}/cash": cash,
+        f"{API}/positions": pence_corrected_positions(_dataset("positions"), _dataset("instruments"), rows),
+        f"{API}/pies": pie_summaries(_dataset("pies")),
+        f"{API}/fees": {"total": sum(fees.values()), "by_type": fees, "currency": account_currency(rows)},
+        f"{API}/win-loss": win_loss(rows),
+        f"{API}/hold-times": {"lots": len(holds), "average_days": average_days, "longest": longest},
+        f"{API}/series/capital-gains": capital_gains_series(rows),
+        f"{API}/series/dividends": dividends_series(rows),
+        f"{API}/series/account-value": value_series(),
+    }
+    responses[API] = {
+        "endpoints": sorted(responses),
+        "computed_at": datetime.now().isoformat(timespec="seconds"),
+        "history_rows": len(rows),
+        "currency": account_currency(rows),
+        "fetched_at": {dataset: entry["fetched_at"] for dataset, entry in ArtifactIndex().entries.items()},
+    }
+    return responses
+
+
+class AnalyticsModel:
+    """Encoded responses, rebuilt when a file they are computed from changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.signature = None
+        self.checked = 0.0
+        self.responses = {}
+        self.refresh()
+
+    def sources(self):
+        return [HISTORY_CSV, LATEST_PATH, FX_RATES_PATH] + [os.path.join(CACHE_DIR, name) for name in DATASET_FILES.values()]
+
+    def _signature(self):
+        signature = []
+        for path in self.sources():
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def refresh(self):
+        """Recompute the responses if the cache changed; returns True if it did."""
+        with self.lock:
+            return self._reload()
+
+    def _reload(self):
+        self.checked = time.monotonic()
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        encoded = {}
+        for path, body in compute_responses().items():
+            payload = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            encoded[path] = (payload, f'"{hashlib.sha256(payload).hexdigest()[:20]}"')
+        self.responses, self.signature = encoded, signature
+        return True
+
+    def _reload_in_background(self):
+        try:
+            self._reload()
+        except Exception as e:
+            print(f"⚠️ Could not reload the cache, serving the previous responses: {e}")
+        finally:
+            self.lock.release()
+
+    def get(self, path):
+        # A due reload runs on its own thread, at most one at a time; requests
+        # meanwhile get the last responses instead of waiting for it
+        if time.monotonic() - self.checked >= RELOAD_SECONDS and self.lock.acquire(blocking=False):
+            self.checked = time.monotonic()
+            threading.Thread(target=self._reload_in_background, name="query-reload", daemon=True).start()
+        return self.responses.get(path.rstrip("/") or "/")
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    server_version = "T212QueryServer/1"
+    # Keep-alive, so a dashboard's requests do not each open a connection; without
+    # Nagle's algorithm the body is not held back waiting for the headers' ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"{self.address_string()} {format % args}\n")
+
+    def _send(self, status, payload=b"", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        response = self.server.model.get(urlsplit(self.path).path)
+        if response is None:
+            self._send(404, json.dumps({"error": f"No such endpoint, see {API}"}).encode("utf-8"))
+            return
+        payload, etag = response
+        # Revalidated on every use, which costs a 304 while nothing changed
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        requested = self.headers.get("If-None-Match", "")
+        if etag in [tag.strip().removeprefix("W/") for tag in requested.split(",")] or requested.strip() == "*":
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            return
+        self._send(200, payload, headers)
+
+    do_HEAD = do_GET
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, verbose=False):
+    """Build (but do not start) a query server over the cache folder; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.model = AnalyticsModel()
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the cached account analytics as JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.verbose)
+    print(f"✅ Account analytics at http://{args.host}:{server.server_address[1]}{API} (from {CACHE_DIR})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
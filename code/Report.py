@@ -0,0 +1,50 @@
+import os
+import shutil
+
+# Rendered charts and AI responses are keyed by their inputs, so they are
+# always safe to keep; the metrics history is what the next run is compared
+# against, cassettes are recordings kept for replay and snapshots the
+# account's history over time. fx holds exchange rates added by hand. Lock
+# files must outlive any run that might still hold them.
+PERSISTENT_CACHE_DIRS = {"charts", "ai_responses", "metrics", "cassettes", "snapshots", "fx", ".locks"}
+
+
+def reset_cache(cache_dir):
+    """Empty `cache_dir` except for PERSISTENT_CACHE_DIRS."""
+    if os.path.exists(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name in PERSISTENT_CACHE_DIRS:
+                continue
+            path = os.path.join(cache_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+
+def run_report(datasets, account_start_date=None, sheets=None, update=False, force=False, metrics_sheet=False):
+    """Download `datasets` and build the workbook. Raises PipelineError if it could not be built.
+
+    Datasets still fresh in the cache are not downloaded again; `force` refetches
+    them all and rebuilds every sheet.
+
+    Downloads run concurrently; the workbook is built on the main thread once
+    they are done (it overlaps chart rendering and the LLM request itself).
+    """
+    # Imported only now: AccountData reads the keys from .env when it loads
+    from CacheAPIValues import fetch_stages
+    from CacheStore import locked
+    from Pipeline import Pipeline, Stage
+    from sheet_generators.ExcelGenerator import make_xslx
+
+    def build(inputs):
+        # Runs sharing the cache folder build one at a time, so the workbook and
+        # its recorded state always match
+        with locked("workbook"):
+            make_xslx(update=update, force=force, sheets=sheets, metrics_sheet=metrics_sheet)
+
+    pipeline = Pipeline()
+    fetches = [pipeline.add(stage).name for stage in fetch_stages(datasets, account_start_date, refresh=force)]
+    pipeline.add(Stage("report", build, inputs=fetches, pool="main"))
+    pipeline.run(["report"])
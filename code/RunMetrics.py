@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from functools import wraps
+from contextlib import contextmanager
+from Paths import CACHE_DIR
+from CacheStore import atomic_write, locked
+
+METRICS_PATH = os.path.join(CACHE_DIR, "run_metrics.json")
+# Kept across the cache reset at the start of a run so runs can be compared
+HISTORY_PATH = os.path.join(CACHE_DIR, "metrics", "history.jsonl")
+# Runs kept in the history, oldest dropped first
+HISTORY_RUNS = int(os.getenv("METRICS_HISTORY_RUNS", "500"))
+
+
+class RunMetrics:
+    """Wall time, CPU time, counters and peak memory per named step of a run.
+
+    Steps of the same name (e.g. one per yfinance lookup) are aggregated.
+    Counters such as http_calls or cache_hit go to every step open on the
+    calling thread, so a fetch stage includes the HTTP calls made inside it.
+    CPU time is the calling thread's own. Peak memory needs tracemalloc
+    (see enable_memory_tracking) and is process-wide while the step runs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.steps = {}
+        self.totals = {}
+        self.track_memory = False
+        self.peak_bytes = 0
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+
+    def enable_memory_tracking(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.track_memory = True
+
+    def _stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def measure(self, name, category="step"):
+        counters = {}
+        stack = self._stack()
+        if self.track_memory:
+            import tracemalloc
+            # tracemalloc has one peak register: hand what it saw so far to the
+            # enclosing steps, then reset it for this one
+            memory_before, peak_so_far = tracemalloc.get_traced_memory()
+            self._note_peak(stack, peak_so_far)
+            tracemalloc.reset_peak()
+        stack.append(counters)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield counters
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            peak = None
+            stack.pop()
+            if self.track_memory:
+                import tracemalloc
+                absolute_peak = max(tracemalloc.get_traced_memory()[1], counters.pop("_peak", 0))
+                self._note_peak(stack, absolute_peak)
+                peak = max(0, absolute_peak - memory_before)
+            with self.lock:
+                step = self.steps.setdefault((category, name), {
+                    "category": category, "name": name, "calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0,
+                    "peak_kb": None, "counters": {},
+                })
+                step["calls"] += 1
+                step["wall_ms"] += wall * 1000
+                step["cpu_ms"] += cpu * 1000
+                if peak is not None:
+                    step["peak_kb"] = max(step["peak_kb"] or 0, peak / 1024)
+                for key, value in counters.items():
+                    step["counters"][key] = step["counters"].get(key, 0) + value
+
+    def _note_peak(self, stack, peak):
+        for counters in stack:
+            counters["_peak"] = max(counters.get("_peak", 0), peak)
+        with self.lock:
+            self.peak_bytes = max(self.peak_bytes, peak)
+
+    def count(self, counter, amount=1):
+        for counters in self._stack():
+            counters[counter] = counters.get(counter, 0) + amount
+        with self.lock:
+            self.totals[counter] = self.totals.get(counter, 0) + amount
+
+    def summary(self):
+        peak_mb = None
+        if self.track_memory:
+            import tracemalloc
+            peak_mb = max(self.peak_bytes, tracemalloc.get_traced_memory()[1]) / (1024 * 1024)
+        with self.lock:
+            steps = sorted(self.steps.values(), key=lambda s: s["wall_ms"], reverse=True)
+            return {
+                "started": self.started_at,
+                "total_seconds": round(time.perf_counter() - self.started, 3),
+                "peak_memory_mb": round(peak_mb, 2) if peak_mb is not None else None,
+                "counters": dict(self.totals),
+                "steps": [
+                    {**step, "wall_ms": round(step["wall_ms"], 1), "cpu_ms": round(step["cpu_ms"], 1),
+                     "peak_kb": round(step["peak_kb"], 1) if step["peak_kb"] is not None else None}
+                    for step in steps
+                ],
+            }
+
+    def previous(self):
+        """Summary of the last saved run, or None."""
+        try:
+            with open(HISTORY_PATH, "r") as f:
+                lines = f.read().splitlines()
+            return json.loads(lines[-1]) if lines else None
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        summary = self.summary()
+        atomic_write(METRICS_PATH, json.dumps(summary, indent=2).encode("utf-8"))
+        # Runs sharing the cache folder append to the same history
+        with locked("metrics"):
+            try:
+                with open(HISTORY_PATH, "r") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                lines = []
+            lines = (lines + [json.dumps(summary, separators=(",", ":"))])[-HISTORY_RUNS:]
+            atomic_write(HISTORY_PATH, ("\n".join(lines) + "\n").encode("utf-8"))
+        return summary
+
+
+METRICS = RunMetrics()
+
+
+def measure(name, category="step"):
+    return METRICS.measure(name, category)
+
+
+def count(counter, amount=1):
+    METRICS.count(counter, amount)
+
+
+def measured(category, name=None):
+    """Decorator form of `measure`, named after the function by default."""
+    def decorator(func):
+        step_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.measure(step_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,67 @@
+import re
+import time
+from urllib.parse import urlsplit
+
+# Trading212 rate limits apply per API key and endpoint. When several batch
+# workers use the same key they share one budget: every response's
+# x-ratelimit-remaining/-reset headers are written to a dict held by a
+# multiprocessing manager, and a worker whose endpoint has no calls left
+# waits for the reset instead of spending a request on a 429. Until a
+# response has reported the budget, one call probes it and the rest wait.
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+# How long the other workers wait on a probing call that never reports back
+PROBE_SECONDS = 30
+
+
+def endpoint(method, url):
+    """Rate limit bucket of a request: the method and path, with numeric ids collapsed."""
+    return f"{method} {_ID_SEGMENT.sub('/{id}', urlsplit(url).path)}"
+
+
+class SharedRateLimit:
+    def __init__(self, state, lock, group):
+        self.state = state
+        self.lock = lock
+        self.group = group
+
+    def _key(self, method, url):
+        return f"{self.group} {endpoint(method, url)}"
+
+    def acquire(self, method, url):
+        """Block until the endpoint has a call left in the shared budget, then take it."""
+        key = self._key(method, url)
+        waited = False
+        while True:
+            with self.lock:
+                remaining, reset = self.state.get(key, (0, 0.0))
+                now = time.time()
+                if now >= reset:
+                    # Budget unknown or renewed: this call probes it
+                    self.state[key] = (0, now + PROBE_SECONDS)
+                    return
+                if remaining > 0:
+                    self.state[key] = (remaining - 1, reset)
+                    return
+            if not waited:
+                print(f"⏳ Waiting for the shared {endpoint(method, url)} rate limit")
+                waited = True
+            time.sleep(min(max(reset - now, 0.05), 5))
+
+    def release(self, method, url):
+        """Forget the endpoint's budget after a call that got no response."""
+        with self.lock:
+            self.state.pop(self._key(method, url), None)
+
+    def update(self, method, url, response):
+        """Store the budget left for the endpoint, as reported by T212's headers."""
+        try:
+            remaining = int(response.headers["x-ratelimit-remaining"])
+            reset = float(response.headers["x-ratelimit-reset"])
+        except (KeyError, TypeError, ValueError):
+            # No budget reported: let the next call probe again
+            remaining, reset = 0, time.time() + (5 if response.status_code == 429 else 0)
+        if response.status_code == 429:
+            remaining = 0
+        with self.lock:
+            self.state[self._key(method, url)] = (remaining, reset)
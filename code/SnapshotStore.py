@@ -0,0 +1,197 @@
+import os
+import json
+import time
+from datetime import datetime
+from ArtifactIndex import ArtifactIndex
+from CacheStore import locked, read_json, write_json, CacheCorrupt
+from Paths import CACHE_DIR
+from sheet_generators.SheetRegistry import DATASET_FILES
+
+# Append-only history of the cash, positions and pies datasets, which the
+# cache overwrites on every fetch. Each month is a segment file with one line
+# per snapshot, "<unix time>\t<K|D>\t<json>": a keyframe (K) holds the whole
+# snapshot and a delta (D) only what changed since the line before. Segments
+# start with a keyframe and repeat one every KEYFRAME_EVERY lines, so reading
+# a range only parses from the last keyframe before it. latest.json keeps the
+# last snapshot and the segment's size after it was appended; when the
+# segment no longer has that size (an interrupted append, a copied folder)
+# the next snapshot is written as a keyframe.
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+LATEST_PATH = os.path.join(SNAPSHOT_DIR, "latest.json")
+SNAPSHOT_DATASETS = ("cash", "positions", "pies")
+KEYFRAME_EVERY = 100
+
+
+def diff(old, new):
+    """Delta turning dict `old` into `new`: {"s": new values, "d": deltas of nested dicts, "r": removed keys}."""
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta.setdefault("s", {})[key] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                delta.setdefault("d", {})[key] = diff(old[key], value)
+            else:
+                delta.setdefault("s", {})[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta["r"] = removed
+    return delta
+
+
+def patch(old, delta):
+    """Apply a `diff` delta; unchanged nested values are shared with `old`, not copied."""
+    new = dict(old)
+    for key in delta.get("r", ()):
+        new.pop(key, None)
+    new.update(delta.get("s", {}))
+    for key, nested in delta.get("d", {}).items():
+        new[key] = patch(old[key], nested)
+    return new
+
+
+def current_snapshot():
+    """The cached cash, positions (by ticker) and pies (by id), or None if none of them is cached."""
+    loaded = {}
+    for dataset in SNAPSHOT_DATASETS:
+        try:
+            loaded[dataset] = read_json(os.path.join(CACHE_DIR, DATASET_FILES[dataset]))
+        except (OSError, CacheCorrupt):
+            loaded[dataset] = None
+    if all(value is None for value in loaded.values()):
+        return None
+    return {
+        "cash": loaded["cash"] or {},
+        "positions": {p.get("ticker", str(i)): p for i, p in enumerate(loaded["positions"] or [])},
+        "pies": {str(p.get("id", i)): p for i, p in enumerate(loaded["pies"] or [])},
+    }
+
+
+def segment_path(ts):
+    return os.path.join(SNAPSHOT_DIR, f"{datetime.fromtimestamp(ts):%Y-%m}.snap")
+
+
+def record_snapshot(ts=None):
+    """Append the cached snapshot unless it equals the last one; returns True if it was appended.
+
+    `ts` defaults to when the newest of the snapshot datasets was fetched.
+    """
+    state = current_snapshot()
+    if state is None:
+        return False
+    if ts is None:
+        entries = [ArtifactIndex().get(dataset) or {} for dataset in SNAPSHOT_DATASETS]
+        ts = max((entry.get("fetched_ts", 0) for entry in entries), default=0) or time.time()
+
+    with locked("snapshots"):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        try:
+            latest = read_json(LATEST_PATH)
+        except (OSError, CacheCorrupt):
+            latest = None
+        if latest and latest["state"] == state:
+            return False
+
+        segment = segment_path(ts)
+        size = os.path.getsize(segment) if os.path.exists(segment) else 0
+        follows = (latest and latest["segment"] == os.path.basename(segment) and latest["size"] == size
+                   and latest["since_keyframe"] < KEYFRAME_EVERY)
+        if follows:
+            kind, body, since_keyframe = "D", diff(latest["state"], state), latest["since_keyframe"] + 1
+        else:
+            kind, body, since_keyframe = "K", state, 0
+
+        line = f"{ts:.3f}\t{kind}\t{json.dumps(body, separators=(',', ':'))}\n".encode("utf-8")
+        with open(segment, "ab+") as f:
+            if size:
+                f.seek(size - 1)
+                # A line cut short by an interrupted append must not swallow this one
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        write_json(LATEST_PATH, {
+            "t": ts, "segment": os.path.basename(segment), "size": os.path.getsize(segment),
+            "since_keyframe": since_keyframe, "state": state,
+        }, compress=False)
+    return True
+
+
+def _segments(start, end):
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    chosen = []
+    for name in sorted(os.listdir(SNAPSHOT_DIR)):
+        if not name.endswith(".snap"):
+            continue
+        month = datetime.strptime(name[:7], "%Y-%m")
+        next_month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        if start is not None and next_month.timestamp() <= start:
+            continue
+        if end is not None and month.timestamp() > end:
+            break
+        chosen.append(os.path.join(SNAPSHOT_DIR, name))
+    return chosen
+
+
+def read_snapshots(start=None, end=None):
+    """Yield (unix time, snapshot) from `start` to `end` (unix times, inclusive), oldest first.
+
+    Only the segments covering the range are opened, and lines before `start`
+    are parsed only back to their last keyframe. Consecutive snapshots share
+    their unchanged parts, so treat them as read-only.
+    """
+    for path in _segments(start, end):
+        state, keyframe, deltas = None, None, []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    stamp, kind, body = line.rstrip("\n").split("\t", 2)
+                    ts = float(stamp)
+                except ValueError:
+                    # A damaged line breaks the delta chain until the next keyframe
+                    state, keyframe, deltas = None, None, []
+                    continue
+                if end is not None and ts > end:
+                    return
+                if start is not None and ts < start:
+                    if kind == "K":
+                        keyframe, deltas = body, []
+                    elif keyframe is not None:
+                        deltas.append(body)
+                    continue
+                try:
+                    if keyframe is not None:
+                        state = json.loads(keyframe)
+                        for delta in deltas:
+                            state = patch(state, json.loads(delta))
+                        keyframe, deltas = None, []
+                    if kind == "K":
+                        state = json.loads(body)
+                    elif state is not None:
+                        state = patch(state, json.loads(body))
+                except (ValueError, KeyError, TypeError):
+                    state = None
+                if state is not None:
+                    yield ts, state
+
+
+def value_series(start=None, end=None, max_points=400):
+    """[ISO time, [account value, open P/L]] points from the snapshots' cash, thinned to about `max_points`.
+
+    Thinning keeps the last snapshot of each equal slice of the time range.
+    """
+    points = [(ts, state["cash"]) for ts, state in read_snapshots(start, end) if state.get("cash")]
+    if len(points) > max_points:
+        step = (points[-1][0] - points[0][0]) / max_points or 1
+        buckets = {}
+        for point in points:
+            buckets[int((point[0] - points[0][0]) / step)] = point
+        points = list(buckets.values())
+    return [
+        [datetime.fromtimestamp(ts).isoformat(timespec="minutes"),
+         [round(cash.get("total") or 0, 2), round(cash.get("ppl") or 0, 2)]]
+        for ts, cash in points
+    ]
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import subprocess
+from Paths import CACHE_DIR
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules main.py imports before any work starts
+STARTUP_MODULES = ["CacheAPIValues", "sheet_generators.ExcelGenerator"]
+
+# Heavy modules that should only be loaded by the code paths that use them
+DEFERRED_MODULES = [
+    "sheet_generators.AccountSummary",
+    "sheet_generators.AdvancedAccountInfo",
+    "sheet_generators.AiAnalyser",
+    "yfinance",
+    "matplotlib.pyplot",
+    "openai",
+    "PIL.Image",
+]
+
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "500"))
+
+
+def _measure_imports(modules):
+    """Import `modules` in a fresh interpreter with -X importtime.
+
+    Returns a list of {"module", "self_ms", "cumulative_ms", "depth"} entries in
+    import order, or raises RuntimeError with the child's error output.
+    """
+    statement = "; ".join(f"import {module}" for module in modules) or "pass"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=CODE_DIR, capture_output=True, text=True
+    )
+
+    entries = []
+    errors = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            errors.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue  # header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append({
+            "module": name.strip(),
+            "self_ms": self_us / 1000,
+            "cumulative_ms": cumulative_us / 1000,
+            "depth": depth,
+        })
+
+    if result.returncode != 0:
+        raise RuntimeError("\n".join(errors[-3:]) or f"exit code {result.returncode}")
+    return entries
+
+
+def profile_startup(budget_ms=DEFAULT_BUDGET_MS, top=15):
+    """Print a per-module import time breakdown and check it against a budget.
+
+    Returns True when startup imports fit in `budget_ms`. The report is also
+    written to cache/startup_profile.json so cold-start time can be tracked.
+    """
+    print("=== Startup Import Profile ===")
+    try:
+        # Modules the bare interpreter loads anyway (site, encodings, ...) are not ours to budget
+        interpreter_modules = {e["module"] for e in _measure_imports([])}
+        entries = [e for e in _measure_imports(STARTUP_MODULES) if e["module"] not in interpreter_modules]
+    except RuntimeError as e:
+        print(f"❌ Startup imports failed: {e}")
+        return False
+
+    top_level = [e for e in entries if e["depth"] == 0]
+    total_ms = sum(e["cumulative_ms"] for e in top_level)
+
+    print(f"{'Module':<45}{'Self ms':>10}{'Cumul. ms':>12}")
+    for entry in sorted(top_level, key=lambda e: e["cumulative_ms"], reverse=True)[:top]:
+        print(f"{entry['module']:<45}{entry['self_ms']:>10.1f}{entry['cumulative_ms']:>12.1f}")
+
+    print("\nSlowest individual modules (self time):")
+    for entry in sorted(entries, key=lambda e: e["self_ms"], reverse=True)[:top]:
+        print(f"  {entry['module']:<43}{entry['self_ms']:>10.1f}")
+
+    # Cost of each deferred dependency on its own, i.e. what lazy loading saves
+    deferred = {}
+    print("\nDeferred (loaded on demand):")
+    for module in DEFERRED_MODULES:
+        try:
+            module_entries = [e for e in _measure_imports([module]) if e["module"] not in interpreter_modules]
+            cost = sum(e["cumulative_ms"] for e in module_entries if e["depth"] == 0)
+            deferred[module] = round(cost, 1)
+            print(f"  {module:<43}{cost:>10.1f} ms")
+        except RuntimeError:
+            deferred[module] = None
+            print(f"  {module:<43}{'not installed':>13}")
+
+    loaded_at_startup = {e["module"] for e in entries}
+    leaked = [m for m in DEFERRED_MODULES if m in loaded_at_startup]
+    if leaked:
+        print(f"\n⚠️ Imported at startup but should be lazy: {', '.join(leaked)}")
+
+    within_budget = total_ms <= budget_ms and not leaked
+    status = "✅" if within_budget else "❌"
+    print(f"\n{status} Startup imports: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, "startup_profile.json"), "w") as f:
+        json.dump({
+            "total_ms": round(total_ms, 1),
+            "budget_ms": budget_ms,
+            "within_budget": within_budget,
+            "modules": [{k: (round(v, 3) if isinstance(v, float) else v) for k, v in e.items()} for e in entries],
+            "deferred_ms": deferred,
+            "leaked": leaked,
+        }, f, indent=2)
+
+    return within_budget
+
+
+if __name__ == "__main__":
+    sys.exit(0 if profile_startup() else 1)
@@ -0,0 +1,102 @@
+import os
+import time
+import hashlib
+import requests
+from AccountData import get_cash_info, get_open_positions, export_period_end, FetchError
+from ArtifactIndex import ArtifactIndex, dataset_path
+from CacheAPIValues import fetch_stages
+from CacheStore import atomic_write, encode_json, locked
+from Pipeline import Pipeline, PipelineError
+from SnapshotStore import record_snapshot
+from Paths import OUTPUT_PATH
+
+# A report process that stays running. Everything a build needs stays loaded
+# between builds: the imported generators, the parsed datasets and history
+# (ExcelGenerator.load_cached, PortfolioStats.read_history) and the workbook
+# itself. Cash and positions are polled every interval, pies and instruments
+# once their time to live has passed and the history once another day can be
+# exported. When a poll brings new data the workbook is updated in place, so
+# only the tables whose inputs changed are rewritten.
+
+DEFAULT_INTERVAL = float(os.getenv("WATCH_INTERVAL", "30"))
+# /equity/portfolio allows one request every 5 seconds
+MIN_INTERVAL = 5
+
+POLLED = {"cash": get_cash_info, "positions": get_open_positions}
+
+
+def poll(dataset, getter, index):
+    """Fetch `dataset` and store it only if it differs from the cached copy; returns True if it did."""
+    payload = encode_json(getter(strict=True))
+    with locked(dataset):
+        changed = not index.intact(dataset) or hashlib.sha256(payload).hexdigest() != index.get(dataset)["checksum"]
+        if changed:
+            atomic_write(dataset_path(dataset), payload)
+        # Recorded either way, the data is confirmed current
+        index.record(dataset, "api")
+    return changed
+
+
+def due(dataset, index):
+    if dataset == "history":
+        return (index.get("history") or {}).get("time_to", "") < export_period_end()
+    return not index.is_fresh(dataset)
+
+
+def sync(datasets, account_start_date):
+    """Bring the cached `datasets` up to date; returns those whose content changed."""
+    index = ArtifactIndex()
+    changed = []
+    for dataset in datasets:
+        if dataset not in POLLED:
+            continue
+        try:
+            if poll(dataset, POLLED[dataset], index):
+                changed.append(dataset)
+        # A dropped connection or a garbled body only costs this poll
+        except (FetchError, requests.RequestException, ValueError) as e:
+            print(f"⚠️ Could not poll {dataset}, keeping the cached copy: {e}")
+    if changed:
+        record_snapshot()
+
+    refresh = [dataset for dataset in datasets if dataset not in POLLED and due(dataset, index)]
+    if refresh:
+        before = {dataset: (index.get(dataset) or {}).get("checksum") for dataset in refresh}
+        pipeline = Pipeline()
+        for stage in fetch_stages(refresh, account_start_date):
+            pipeline.add(stage)
+        try:
+            pipeline.run()
+        except (PipelineError, requests.RequestException, ValueError) as e:
+            print(f"⚠️ Could not refresh {', '.join(refresh)}: {e}")
+        index = ArtifactIndex()
+        changed += [dataset for dataset in refresh if (index.get(dataset) or {}).get("checksum") != before[dataset]]
+    return changed
+
+
+def watch(datasets, account_start_date, sheets=None, interval=None):
+    """Poll the account until interrupted, updating the workbook whenever its data changes."""
+    from sheet_generators.ExcelGenerator import make_xslx
+
+    interval = max(interval or DEFAULT_INTERVAL, MIN_INTERVAL)
+    print(f"👀 Watching the account every {interval:g}s, Ctrl+C to stop")
+    # Changes a failed build did not write yet
+    pending = []
+    try:
+        while True:
+            time.sleep(interval)
+            changed = pending + [dataset for dataset in sync(datasets, account_start_date) if dataset not in pending]
+            if not changed:
+                continue
+            started = time.perf_counter()
+            try:
+                with locked("workbook"):
+                    make_xslx(update=True, sheets=sheets)
+            except Exception as e:
+                print(f"⚠️ Could not update {OUTPUT_PATH}, trying again after the next poll: {e}")
+                pending = changed
+                continue
+            pending = []
+            print(f"🔄 {', '.join(changed)} changed, {OUTPUT_PATH} updated in {time.perf_counter() - started:.1f}s")
+    except KeyboardInterrupt:
+        print("👋 Stopped watching")
@@ -1,60 +1,232 @@
 import os
 import sys
-import shutil
-from dotenv import set_key
+import argparse
+from dotenv import set_key, load_dotenv
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Define paths
 project_root = os.path.dirname(os.path.dirname(__file__))
 env_file = os.path.join(project_root, '.env')
-cache_dir = os.path.join(project_root, 'cache')
 
-# Reset cache
-if os.path.exists(env_file):
-    os.remove(env_file)
-if os.path.exists(cache_dir):
-    shutil.rmtree(cache_dir)
-# Create cache directory
-os.makedirs(cache_dir, exist_ok=True)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export Trading212 account data to an Excel report")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a per-module import time report and exit")
+    parser.add_argument("--startup-budget-ms", type=float, default=None,
+                        help="startup import budget for --profile-startup (default: STARTUP_BUDGET_MS or 500)")
+    parser.add_argument("--update", action="store_true",
+                        help="update the previous AccountAnalysis.xlsx in place, rewriting only tables whose data changed")
+    parser.add_argument("--force", action="store_true",
+                        help="refetch every dataset and rebuild every sheet, even if unchanged since the last run")
+    parser.add_argument("--sheets", default=None,
+                        help="comma-separated sheets or Account Summary tables to build "
+                             "(summary, cash, positions, transactions, pies, advanced, ai); "
+                             "other sheets are kept from the previous workbook")
+    parser.add_argument("--ask", metavar="QUESTION", default=None,
+                        help="answer a question about the account from the last run's cached history and exit")
+    parser.add_argument("--record-cassette", metavar="NAME", nargs="?", const="", default=None,
+                        help="save every Trading212 response to cache/cassettes/NAME (default: a timestamp)")
+    parser.add_argument("--replay-cassette", metavar="NAME", nargs="?", const="latest", default=None,
+                        help="rebuild the report from a recorded cassette (default: the latest) with no network")
+    parser.add_argument("--metrics", action="store_true",
+                        help="track peak memory per step and add a Run Metrics sheet comparing this run with the last")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without prompts (also T212_HEADLESS=1), keeping the cache and .env of earlier runs")
+    parser.add_argument("--api-key", default=None, help="Trading212 API key (default: T212_API_KEY)")
+    account_type = parser.add_mutually_exclusive_group()
+    account_type.add_argument("--demo", dest="demo", action="store_const", const=True, default=None,
+                              help="the key belongs to a demo account (default: T212_DEMO)")
+    account_type.add_argument("--live", dest="demo", action="store_const", const=False,
+                              help="the key belongs to a live account")
+    parser.add_argument("--start-date", metavar="YYYY-MM-DD", default=None,
+                        help="account creation date, where the history export starts (default: T212_START_DATE)")
+    parser.add_argument("--openai-key", default=None, help="OpenAI API key (default: OPENAI_API_KEY)")
+    parser.add_argument("--watch", metavar="SECONDS", type=float, nargs="?", const=0, default=None,
+                        help="keep running after the report, updating it whenever cash, positions or the history "
+                             "change (polls every WATCH_INTERVAL or 30 seconds); implies --headless")
+    parser.add_argument("--accounts", metavar="FILE", default=None,
+                        help="build a report for every account in a JSON accounts file, without prompts")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="accounts processed at once with --accounts (default: BATCH_WORKERS or 4)")
+    parser.add_argument("--out", default=None,
+                        help="folder for the per-account caches and workbooks of --accounts (default: accounts/)")
+    return parser.parse_args()
 
-os.makedirs(os.path.dirname(env_file), exist_ok=True)
+def main():
+    args = parse_args()
+    if args.profile_startup:
+        from StartupProfiler import profile_startup, DEFAULT_BUDGET_MS
+        budget = args.startup_budget_ms if args.startup_budget_ms is not None else DEFAULT_BUDGET_MS
+        sys.exit(0 if profile_startup(budget_ms=budget) else 1)
 
-# Create .env file
-with open(env_file, 'w') as f:
-    f.write("# Environment variables\n")
+    # Q&A reads the previous run's cache and .env, so it must not reset them
+    if args.ask:
+        from sheet_generators.AiAnalyser import make_openai_client
+        from sheet_generators.HistoryQA import ask
+        ask(args.ask, make_openai_client(), os.getenv("OPENAI_MODEL", "gpt-3.5-turbo"))
+        return
 
-print("=== API Key Configuration ===")
+    # Each account runs in its own process with its own cache, so nothing below
+    # (prompts, .env, the shared cache folder) applies
+    if args.accounts:
+        if args.record_cassette is not None or args.replay_cassette is not None:
+            sys.exit("❌ Cassettes record a single account, they cannot be combined with --accounts")
+        from Batch import run_batch
+        try:
+            ok = run_batch(args.accounts, out_dir=args.out, workers=args.workers,
+                           sheets=args.sheets, metrics_sheet=args.metrics)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        sys.exit(0 if ok else 1)
+    if args.watch is not None and (args.record_cassette is not None or args.replay_cassette is not None):
+        sys.exit("❌ --watch polls the live account, it cannot be combined with cassettes")
 
+    from RunMetrics import METRICS
+    if args.metrics:
+        METRICS.enable_memory_tracking()
 
-account_type = input("Are you using a demo account? (y/n): ").strip().lower()
-is_demo = account_type in ['y', 'yes', '1', 'true']
-if is_demo == True:
-    print("NOTE: Due to limited features in the demo account, Advanced Account Info will not be available")
-# Get T212 API key
-t212_key = input("Enter your Trading212 API key: ").strip()
-if t212_key:
+    # Chosen through the environment so every process that fetches sees it
+    replay_cassette = None
+    if args.record_cassette is not None or args.replay_cassette is not None:
+        from Cassette import Cassette, CassetteError, resolve_cassette
+        replay = args.replay_cassette is not None
+        try:
+            path = resolve_cassette(args.replay_cassette if replay else args.record_cassette, for_replay=replay)
+            opened = Cassette(path, "replay" if replay else "record")
+            replay_cassette = opened if replay else None
+        except CassetteError as e:
+            sys.exit(f"❌ {e}")
+        os.environ["T212_CASSETTE"] = f"{'replay' if replay else 'record'}:{path}"
+
+    from sheet_generators.SheetRegistry import resolve_selection, required_datasets, required_enrichments
+    sheets = [key.strip() for key in args.sheets.split(",") if key.strip()] if args.sheets else None
     try:
-        set_key(env_file, "T212_API_KEY", t212_key)
-        set_key(env_file, "T212_DEMO", str(is_demo))
-        print("✓ T212 API key updated")
-        print(f"✓ Account type set to: {'Demo' if is_demo else 'Live'}")
-    except Exception as e:
-        print(f"Error updating T212 API key: {e}")
-
-# Get OpenAI API key
-openai_key = input("Enter your OpenAI API key: ").strip()
-if openai_key:
+        selection = resolve_selection(sheets)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+
+    # Headless runs (cron, containers) never prompt and keep the cache, so an
+    # unchanged account rebuilds nothing and only changed tables are patched
+    headless = args.headless or args.watch is not None or os.getenv("T212_HEADLESS", "").lower() in ("1", "true", "yes")
+    update = args.update or headless
+
+    # Reset cache (an update or partial build needs the previous run's workbook
+    # state and unselected datasets, which live there)
+    from Paths import CACHE_DIR
+    from Report import reset_cache, run_report
+    if headless:
+        # Settings saved by an earlier run; flags and the environment win
+        load_dotenv(env_file)
+    elif os.path.exists(env_file):
+        os.remove(env_file)
+    if not update and not sheets:
+        reset_cache(CACHE_DIR)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Values from flags or the environment are not asked for
+    t212_key = args.api_key or os.getenv("T212_API_KEY")
+    is_demo = args.demo
+    if is_demo is None and os.getenv("T212_DEMO"):
+        is_demo = os.getenv("T212_DEMO").lower() == "true"
+    openai_key = args.openai_key or os.getenv("OPENAI_API_KEY")
+    start_date = args.start_date or os.getenv("T212_START_DATE")
+    needs_history = replay_cassette is None and "history" in required_datasets(selection)
+
+    if headless:
+        missing = []
+        if replay_cassette is None and not t212_key:
+            missing.append("T212_API_KEY or --api-key")
+        if needs_history and not start_date:
+            missing.append("T212_START_DATE or --start-date")
+        if missing:
+            sys.exit(f"❌ Headless runs cannot prompt, set {' and '.join(missing)}")
+        # AccountData reads these when it is imported below
+        if t212_key:
+            os.environ["T212_API_KEY"] = t212_key
+        os.environ["T212_DEMO"] = str(bool(is_demo))
+        if openai_key:
+            os.environ["OPENAI_API_KEY"] = openai_key
+        print(f"🤖 Headless run ({'Demo' if is_demo else 'Live'} account), keeping the cache in {CACHE_DIR}")
+    else:
+        configure_interactively(replay_cassette, t212_key, is_demo, openai_key,
+                                "llm" in required_enrichments(selection))
+
+    # Imported only now: AccountData reads the keys from .env when it loads
+    from AccountData import ask_account_start_date, parse_start_date
+    from Pipeline import PipelineError
+
+    datasets = required_datasets(selection)
+    account_start_date = None
+    if replay_cassette is not None:
+        account_start_date = (replay_cassette.request_body("POST /history/exports") or {}).get("timeFrom")
+    elif needs_history:
+        try:
+            account_start_date = parse_start_date(start_date) if start_date else ask_account_start_date()
+        except ValueError:
+            sys.exit(f"❌ Invalid start date '{start_date}', expected YYYY-MM-DD")
+        if not headless:
+            set_key(env_file, "T212_START_DATE", account_start_date[:10])
+
     try:
-        set_key(env_file, "OPENAI_API_KEY", openai_key)
-        print("✓ OpenAI API key updated")
-    except Exception as e:
-        print(f"Error updating OpenAI API key: {e}")
+        run_report(datasets, account_start_date, sheets=sheets, update=update, force=args.force,
+                   metrics_sheet=args.metrics)
+    except PipelineError as e:
+        sys.exit(f"❌ Report not built: {e}")
+    finally:
+        summary = METRICS.save()
+        print(f"📈 Run took {summary['total_seconds']:.1f}s, metrics saved to cache/run_metrics.json")
+
+    if args.watch is not None:
+        from Watch import watch
+        watch(datasets, account_start_date, sheets=sheets, interval=args.watch or None)
+
+
+def configure_interactively(replay_cassette, t212_key, is_demo, openai_key, needs_openai):
+    """Ask for the keys not given as flags or environment variables and save them to a fresh .env."""
+    os.makedirs(os.path.dirname(env_file), exist_ok=True)
+
+    # Create .env file
+    with open(env_file, 'w') as f:
+        f.write("# Environment variables\n")
+
+    print("=== API Key Configuration ===")
+
+    # A replayed cassette needs no Trading212 account
+    if replay_cassette is not None:
+        t212_key = None
+    else:
+        if is_demo is None:
+            account_type = input("Are you using a demo account? (y/n): ").strip().lower()
+            is_demo = account_type in ['y', 'yes', '1', 'true']
+        if is_demo == True:
+            print("NOTE: Due to limited features in the demo account, Advanced Account Info will not be available")
+        # Get T212 API key
+        if not t212_key:
+            t212_key = input("Enter your Trading212 API key: ").strip()
+    if t212_key:
+        try:
+            set_key(env_file, "T212_API_KEY", t212_key)
+            set_key(env_file, "T212_DEMO", str(is_demo))
+            print("✓ T212 API key updated")
+            print(f"✓ Account type set to: {'Demo' if is_demo else 'Live'}")
+        except Exception as e:
+            print(f"Error updating T212 API key: {e}")
+
+    # Get OpenAI API key, only needed when the AI sheet is built
+    if needs_openai:
+        if not openai_key:
+            openai_key = input("Enter your OpenAI API key: ").strip()
+        if openai_key:
+            try:
+                set_key(env_file, "OPENAI_API_KEY", openai_key)
+                print("✓ OpenAI API key updated")
+            except Exception as e:
+                print(f"Error updating OpenAI API key: {e}")
 
-print(f"Configuration saved to: {env_file}")
+    print(f"Configuration saved to: {env_file}")
 
-from CacheAPIValues import create_cache_data
-from sheet_generators.ExcelGenerator import make_xslx
 
-create_cache_data()
-make_xslx()
\ No newline at end of file
+# Guarded so chart worker processes can re-import this module safely
+if __name__ == "__main__":
+    main()
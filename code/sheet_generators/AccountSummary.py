@@ -1,22 +1,34 @@
 import os
-import csv
-import os
-import csv
-import yfinance as yf
-from openpyxl.styles import Font, PatternFill, Border, Side
-from AccountData import get_cash_info, get_open_positions, get_pies
+from openpyxl.styles import Font, Border, Side
+from AccountData import get_cash_info, get_open_positions, get_pies, get_instruments
+from sheet_generators.WorkbookState import WorkbookState, fingerprint, clear_region
+from sheet_generators.SheetRegistry import SHEET_REGISTRY, DATASET_FILES
+from RunMetrics import measure, measured
+from Paths import HISTORY_CSV
+from sheet_generators.PortfolioStats import read_history
 
 class AccountSummary:
-    def __init__(self, wb, ws, styles, load_cached_func, extract_date_func, apply_border_func):
+    def __init__(self, wb, ws, styles, load_cached_func, extract_date_func, apply_border_func, state=None,
+                 datasets=None, enrichments=None):
         self.wb = wb
         self.ws = ws
         self.styles = styles
         self.load_cached = load_cached_func
         self.extract_date = extract_date_func
         self.apply_table_border = apply_border_func
+        self.state = state if state is not None else WorkbookState()
+        # Datasets fetched and enrichments allowed for this run (None means all)
+        self.datasets = set(DATASET_FILES) if datasets is None else set(datasets)
+        self.enrichments = {"yfinance", "llm"} if enrichments is None else set(enrichments)
         
     def cash_info_table(self):
         cash_info = self.load_cached("cash_info", get_cash_info)
+        section_fp = fingerprint(cash_info)
+        if self.state.is_current("cash_info", section_fp):
+            return
+        if self.state.incremental:
+            clear_region(self.ws, 2, 2, 9, 4)
+        
         title_range = "B2:D2"
         self.ws.merge_cells(title_range)
         title_cell = self.ws['B2']
@@ -59,28 +71,33 @@ class AccountSummary:
             row += 1
         
         self.apply_table_border(self.ws, 2, row - 1, 2, 4)
+        self.state.mark("cash_info", section_fp)
 
     def open_positions_table(self):
         positions = self.load_cached("open_positions", get_open_positions)
         positions = sorted(positions, key=lambda x: x.get("ppl", 0), reverse=True)
         start_col, start_row = 6, 2
         
-        # Create ticker to ISIN mapping from trading history CSV
+        # Quote currency from T212's instrument metadata, which settles GBX vs GBP without a lookup
+        instrument_currency = {}
+        if "instruments" in self.datasets:
+            for instrument in self.load_cached("instruments", get_instruments):
+                instrument_currency[instrument.get("ticker")] = instrument.get("currencyCode")
+        
+        # Fallback for instruments missing from the metadata: ticker to ISIN mapping from trading history CSV
         ticker_to_isin = {}
         ticker_to_currency = {}
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
+        csv_path = HISTORY_CSV
         
-        if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    ticker = row.get("Ticker", "")
-                    isin = row.get("ISIN", "")
-                    currency = row.get("Currency (Price / share)", "")
-                    if ticker and isin:
-                        ticker_to_isin[ticker] = isin
-                        if currency:
-                            ticker_to_currency[ticker] = currency
+        if "history" in self.datasets and os.path.exists(csv_path):
+            for row in read_history(csv_path):
+                ticker = row.get("Ticker", "")
+                isin = row.get("ISIN", "")
+                currency = row.get("Currency (Price / share)", "")
+                if ticker and isin:
+                    ticker_to_isin[ticker] = isin
+                    if currency:
+                        ticker_to_currency[ticker] = currency
         
         def is_uk_security_in_pence(isin, ticker, trading_currency=None):
             """Check if a security is quoted in pence, requiring conversion."""
@@ -92,6 +109,10 @@ class AccountSummary:
             if not isin or not isin.startswith("GB"):
                 return False
             
+            # Without the yfinance enrichment assume the usual LSE quote in pence
+            if "yfinance" not in self.enrichments:
+                return True
+            
             try:
                 # Convert T212 ticker to Yahoo Finance ticker format
                 # Remove the suffix and add .L for London Stock Exchange
@@ -100,6 +121,9 @@ class AccountSummary:
                     base_ticker = base_ticker[:-1]
                 yahoo_ticker = f"{base_ticker}.L"
                 
+                # yfinance pulls in pandas, so only load it once a lookup is needed
+                import yfinance as yf
+                
                 # Suppress yfinance and HTTP library output and errors
                 import warnings, logging, requests
                 warnings.filterwarnings("ignore", message="Unverified HTTPS request")
@@ -108,8 +132,8 @@ class AccountSummary:
                 logging.getLogger("urllib3").setLevel(logging.CRITICAL)
                 logging.getLogger("requests").setLevel(logging.CRITICAL)
                 
-                stock = yf.Ticker(yahoo_ticker)
-                info = stock.info
+                with measure("yfinance", "enrich"):
+                    info = yf.Ticker(yahoo_ticker).info
                 currency = info.get("currency", "")
                 
                 # If currency is GBp (pence), we need to convert to pounds
@@ -117,11 +141,20 @@ class AccountSummary:
             except Exception:
                 return True
         
-        def convert_price_if_needed(price, isin, ticker, trading_currency=None):
+        def convert_price_if_needed(price, isin, ticker, trading_currency=None, quote_currency=None):
+            if quote_currency:
+                return price / 100.0 if quote_currency == "GBX" else price
             if is_uk_security_in_pence(isin, ticker, trading_currency):
                 return price / 100.0
             return price
         
+        position_currencies = {pos.get("ticker"): instrument_currency.get(pos.get("ticker")) for pos in positions}
+        section_fp = fingerprint(positions, position_currencies, ticker_to_isin, ticker_to_currency, sorted(self.enrichments))
+        if self.state.is_current("open_positions", section_fp):
+            return
+        if self.state.incremental:
+            clear_region(self.ws, start_row, start_col, self.ws.max_row, start_col + 5)
+        
         title_range = "F2:K2"
         self.ws.merge_cells(title_range)
         title_cell = self.ws['F2']
@@ -159,10 +192,11 @@ class AccountSummary:
             
             isin = ticker_to_isin.get(clean_ticker, "")
             trading_currency = ticker_to_currency.get(clean_ticker, "")
+            quote_currency = instrument_currency.get(full_ticker)
             
             # Convert prices from pence to pounds
-            avg_price = round(convert_price_if_needed(avg_price, isin, clean_ticker, trading_currency), 2)
-            current_price = round(convert_price_if_needed(current_price, isin, clean_ticker, trading_currency), 2)
+            avg_price = round(convert_price_if_needed(avg_price, isin, clean_ticker, trading_currency, quote_currency), 2)
+            current_price = round(convert_price_if_needed(current_price, isin, clean_ticker, trading_currency, quote_currency), 2)
             
             values = [clean_ticker, quantity, avg_price, current_price, ppl, fx_ppl]
             row_fill = self.styles["green"] if ppl > 0 else self.styles["red"] if ppl < 0 else self.styles["grey"]
@@ -183,32 +217,72 @@ class AccountSummary:
             self.ws.column_dimensions[col_letter].width = 15
         
         self.apply_table_border(self.ws, start_row, row - 1, start_col, start_col + len(headers) - 1)
+        self.state.mark("open_positions", section_fp)
 
-    def historical_transactions(self):
+    @measured("parse")
+    def load_transactions(self):
         transactions_info = []
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
+        csv_path = HISTORY_CSV
         
         if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    action = row.get("Action", "")
-                    if action.lower() in ["deposit", "withdrawal", "withdraw"]:
-                        time_str = row.get("Time", "")
-                        total = row.get("Total", "0")
+            for row in read_history(csv_path):
+                action = row.get("Action", "")
+                if action.lower() in ["deposit", "withdrawal", "withdraw"]:
+                    time_str = row.get("Time", "")
+                    total = row.get("Total", "0")
                         
-                        try:
-                            amount = float(total) if total else 0
-                        except ValueError:
-                            amount = 0
+                    try:
+                        amount = float(total) if total else 0
+                    except ValueError:
+                        amount = 0
                         
-                        transactions_info.append({
-                            "dateTime": time_str,
-                            "type": action,
-                            "amount": amount
-                        })
+                    transactions_info.append({
+                        "dateTime": time_str,
+                        "type": action,
+                        "amount": amount
+                    })
+        return transactions_info
+    
+    def _write_transaction_row(self, row, tx):
+        date = self.extract_date(tx.get("dateTime", ""))
+        tx_type = tx.get("type", "N/A")
+        amount = tx.get("amount", 0)
+        tx_type_lower = str(tx_type).lower()
+        
+        row_fill = self.styles["grey"]
+        value_fill = self.styles["green"] if tx_type_lower == "deposit" else self.styles["red"] if tx_type_lower in ["withdraw", "withdrawal"] else self.styles["grey"]
+        
+        values = [date, tx_type, amount]
+        for col_offset, val in enumerate(values):
+            cell = self.ws.cell(row=row, column=2 + col_offset, value=val)
+            cell.border = self.styles["table_border"]
+            cell.fill = row_fill if col_offset == 0 else value_fill
+
+    def historical_transactions(self):
+        # Fees are not part of this table
+        transactions_info = [tx for tx in self.load_transactions() if str(tx.get("type", "N/A")).lower() != "fee"]
+        section_fp = fingerprint(transactions_info)
+        if self.state.is_current("transactions", section_fp):
+            return
         
         start_col, start_row = 2, 11
+        headers = ["Date", "Transaction Type", "Amount"]
+        
+        # The export is chronological, so a refresh normally only adds rows at the end
+        previous = self.state.section("transactions")
+        written = previous.get("count", 0)
+        if (self.state.incremental and 0 < written <= len(transactions_info)
+                and fingerprint(transactions_info[:written]) == previous.get("fingerprint")):
+            row = previous["next_row"]
+            for tx in transactions_info[written:]:
+                self._write_transaction_row(row, tx)
+                row += 1
+            self.apply_table_border(self.ws, start_row, row - 1, start_col, start_col + len(headers) - 1)
+            self.state.mark("transactions", section_fp, count=len(transactions_info), next_row=row)
+            return
+        
+        if self.state.incremental:
+            clear_region(self.ws, start_row, start_col, self.ws.max_row, start_col + 2)
         
         title_range = "B11:D11"
         self.ws.merge_cells(title_range)
@@ -220,7 +294,6 @@ class AccountSummary:
             for cell in row:
                 cell.border = self.styles["title_border"]
         
-        headers = ["Date", "Transaction Type", "Amount"]
         header_row = start_row + 1
         for col_offset, header in enumerate(headers):
             cell = self.ws.cell(row=header_row, column=start_col + col_offset, value=header)
@@ -230,34 +303,26 @@ class AccountSummary:
         
         row = header_row + 1
         for tx in transactions_info:
-            tx_type = tx.get("type", "N/A")
-            if str(tx_type).lower() == "fee":
-                continue
-                
-            date = self.extract_date(tx.get("dateTime", ""))
-            amount = tx.get("amount", 0)
-            tx_type_lower = str(tx_type).lower()
-            
-            row_fill = self.styles["grey"]
-            value_fill = self.styles["green"] if tx_type_lower == "deposit" else self.styles["red"] if tx_type_lower in ["withdraw", "withdrawal"] else self.styles["grey"]
-            
-            values = [date, tx_type, amount]
-            for col_offset, val in enumerate(values):
-                cell = self.ws.cell(row=row, column=start_col + col_offset, value=val)
-                cell.border = self.styles["table_border"]
-                cell.fill = row_fill if col_offset == 0 else value_fill
+            self._write_transaction_row(row, tx)
             row += 1
         
         for col_letter in ['B', 'C', 'D']:
             self.ws.column_dimensions[col_letter].width = 15
         
         self.apply_table_border(self.ws, start_row, row - 1, start_col, start_col + len(headers) - 1)
+        self.state.mark("transactions", section_fp, count=len(transactions_info), next_row=row)
 
     def pies_tables(self):
         pies_info = self.load_cached("pies_info", lambda: get_pies(include_detailed=True))
         start_col = 13  # Column M (beside open positions)
         start_row = 2
         
+        section_fp = fingerprint(pies_info)
+        if self.state.is_current("pies", section_fp):
+            return
+        if self.state.incremental:
+            clear_region(self.ws, start_row, start_col, self.ws.max_row, start_col + 4)
+        
         for pie in pies_info:
             pie_id = pie.get("id", "")
             name = pie.get("detailed", {}).get("settings", {}).get("name") or pie.get("name", "N/A")
@@ -378,9 +443,17 @@ class AccountSummary:
                 self.ws.column_dimensions[col_letter].width = 15
             
             start_row = last_summary_row + 3  # Add space between pies
-            
-    def generate_sheet(self):
-        self.cash_info_table()
-        self.open_positions_table()
-        self.historical_transactions()
-        self.pies_tables()
+        
+        self.state.mark("pies", section_fp)
+
+    def generate_sheet(self, sections=None):
+        """Write the selected tables (keys of SHEET_REGISTRY["Account Summary"]["sections"]), all by default."""
+        tables = {
+            "cash": self.cash_info_table,
+            "positions": self.open_positions_table,
+            "transactions": self.historical_transactions,
+            "pies": self.pies_tables,
+        }
+        for section in SHEET_REGISTRY["Account Summary"]["sections"]:
+            if sections is None or section in sections:
+                tables[section]()
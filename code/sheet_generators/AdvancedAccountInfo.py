@@ -1,26 +1,42 @@
 import os
-import csv
-import yfinance as yf
-from datetime import datetime
 from openpyxl.styles import Font, PatternFill, Border, Side
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.patches import Rectangle
-import io
-from openpyxl.drawing.image import Image
-from collections import defaultdict
+from sheet_generators.ChartRenderer import ChartRenderer
+from sheet_generators.WorkbookState import WorkbookState, fingerprint, clear_region
+from sheet_generators.SheetRegistry import DATASET_FILES
+from RunMetrics import measure, measured
+from Paths import HISTORY_CSV
+from SnapshotStore import value_series
+from sheet_generators.FxRates import FX_RATES_PATH, account_currency, currency_symbol
+from sheet_generators.PortfolioStats import (
+    read_history, hold_times, hold_time_summary, fee_totals, win_loss, capital_gains_series, dividends_series,
+)
 
 class AdvancedAccountInfo:
-    def __init__(self, wb, ws, styles, extract_date_func, apply_border_func):
+    def __init__(self, wb, ws, styles, extract_date_func, apply_border_func, chart_renderer=None, state=None,
+                 load_cached_func=None, datasets=None, enrichments=None):
         self.wb = wb
         self.ws = ws
         self.styles = styles
         self.extract_date = extract_date_func
         self.apply_table_border = apply_border_func
-        
-    def order_history(self):
+        self.chart_renderer = chart_renderer or ChartRenderer()
+        self.chart_futures = None
+        self.state = state if state is not None else WorkbookState()
+        self.load_cached = load_cached_func
+        # Datasets fetched and enrichments allowed for this run (None means all)
+        self.datasets = set(DATASET_FILES) if datasets is None else set(datasets)
+        self.enrichments = {"yfinance", "llm"} if enrichments is None else set(enrichments)
+        
+    @measured("parse")
+    def load_orders(self):
         transactions_info = []
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
+        csv_path = HISTORY_CSV
+        
+        # Quote currency by ISIN from T212's instrument metadata, which settles GBX vs GBP without a lookup
+        isin_currency = {}
+        if "instruments" in self.datasets and self.load_cached:
+            for instrument in self.load_cached("instruments", lambda: []):
+                isin_currency[instrument.get("isin")] = instrument.get("currencyCode")
         
         # Create ticker to ISIN and currency mapping from trading history CSV
         ticker_to_isin = {}
@@ -32,6 +48,10 @@ class AdvancedAccountInfo:
             if not isin or not isin.startswith("GB"):
                 return False
             
+            # Without the yfinance enrichment assume the usual LSE quote in pence
+            if "yfinance" not in self.enrichments:
+                return True
+            
             try:
                 import yfinance as yf
                 # Convert T212 ticker to Yahoo Finance ticker format
@@ -48,8 +68,8 @@ class AdvancedAccountInfo:
                 logging.getLogger("yfinance").setLevel(logging.CRITICAL)
                 logging.getLogger("urllib3").setLevel(logging.CRITICAL)
                 logging.getLogger("requests").setLevel(logging.CRITICAL)
-                stock = yf.Ticker(yahoo_ticker)
-                info = stock.info
+                with measure("yfinance", "enrich"):
+                    info = yf.Ticker(yahoo_ticker).info
                 currency = info.get("currency", "")
                 
                 return currency == "GBp"
@@ -57,67 +77,126 @@ class AdvancedAccountInfo:
                 print(f"Warning: Could not determine currency for {ticker} ({yahoo_ticker if 'yahoo_ticker' in locals() else 'unknown'}): {e}")
                 return True
         
-        def convert_price_if_needed(price, isin, ticker, trading_currency=None):
+        def convert_price_if_needed(price, isin, ticker, trading_currency=None, quote_currency=None):
+            if quote_currency:
+                return price / 100.0 if quote_currency == "GBX" else price
             if is_uk_security_in_pence(isin, ticker, trading_currency):
                 return price / 100.0
             return price
         
         if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                # First pass: build ticker mappings
-                for row in reader:
-                    ticker = row.get("Ticker", "")
-                    isin = row.get("ISIN", "")
-                    currency = row.get("Currency (Price / share)", "")
-                    if ticker and isin:
-                        ticker_to_isin[ticker] = isin
-                        if currency:
-                            ticker_to_currency[ticker] = currency
-                
-                # Reset file pointer for second pass
-                csvfile.seek(0)
-                reader = csv.DictReader(csvfile)
+            rows = read_history(csv_path)
+            
+            # First pass: build ticker mappings
+            for row in rows:
+                ticker = row.get("Ticker", "")
+                isin = row.get("ISIN", "")
+                currency = row.get("Currency (Price / share)", "")
+                if ticker and isin:
+                    ticker_to_isin[ticker] = isin
+                    if currency:
+                        ticker_to_currency[ticker] = currency
                 
-                # Second pass: process transactions with price conversion
-                for row in reader:
-                    action = row.get("Action", "")
-                    if action.lower() in ["market buy", "market sell", "stop buy", "stop sell", "limit buy", "limit sell"]:
-                        try:
-                            qty = float(row.get("No. of shares", "0") or 0)
-                            price = float(row.get("Price / share", "0") or 0)
-                            total = float(row.get("Total", "0") or 0)
-                        except ValueError:
-                            continue
+            # Second pass: process transactions with price conversion
+            for row in rows:
+                action = row.get("Action", "")
+                if action.lower() in ["market buy", "market sell", "stop buy", "stop sell", "limit buy", "limit sell"]:
+                    try:
+                        qty = float(row.get("No. of shares", "0") or 0)
+                        price = float(row.get("Price / share", "0") or 0)
+                        total = float(row.get("Total", "0") or 0)
+                    except ValueError:
+                        continue
                             
-                        order_type = "Buy" if "buy" in action.lower() else "Sell"
-                        ticker = row.get("Ticker", "")
+                    order_type = "Buy" if "buy" in action.lower() else "Sell"
+                    ticker = row.get("Ticker", "")
                         
-                        clean_ticker = ticker
-                        if ticker.endswith('l') and len(ticker) > 1:
-                            clean_ticker = ticker[:-1]
+                    clean_ticker = ticker
+                    if ticker.endswith('l') and len(ticker) > 1:
+                        clean_ticker = ticker[:-1]
                         
-                        isin = ticker_to_isin.get(clean_ticker, "")
-                        trading_currency = ticker_to_currency.get(clean_ticker, "")
+                    isin = ticker_to_isin.get(clean_ticker, "")
+                    trading_currency = ticker_to_currency.get(clean_ticker, "")
                         
-                        converted_price = convert_price_if_needed(price, isin, clean_ticker, trading_currency)
+                    quote_currency = isin_currency.get(row.get("ISIN", ""))
+                    converted_price = convert_price_if_needed(price, isin, clean_ticker, trading_currency, quote_currency)
                         
-                        transactions_info.append({
-                            "dateTime": row.get("Time", ""),
-                            "ticker": clean_ticker,
-                            "name": row.get("Name", ""),
-                            "orderType": order_type,
-                            "quantity": qty,
-                            "pricePerUnit": converted_price,
-                            "totalValue": total,
-                            "currency": row.get("Currency (Total)", ""),
-                            "result": row.get("Result", "0")
-                        })
+                    transactions_info.append({
+                        "dateTime": row.get("Time", ""),
+                        "ticker": clean_ticker,
+                        "name": row.get("Name", ""),
+                        "orderType": order_type,
+                        "quantity": qty,
+                        "pricePerUnit": converted_price,
+                        "totalValue": total,
+                        "currency": row.get("Currency (Total)", ""),
+                        "result": row.get("Result", "0")
+                    })
         
         transactions_info.sort(key=lambda x: x.get("dateTime", ""), reverse=True)
+        return transactions_info
+    
+    def _write_order_row(self, row, tx):
+        start_col = 2
+        date = self.extract_date(tx.get("dateTime", ""))
+        ticker = tx.get("ticker", "N/A")
+        name = tx.get("name", "N/A")
+        order_type = tx.get("orderType", "N/A")
+        quantity = round(tx.get("quantity", 0), 4)
+        price_per_unit = round(tx.get("pricePerUnit", 0), 4)
+        total_value = round(tx.get("totalValue", 0), 2)
+        
+        row_fill = self.styles["green"] if order_type == "Buy" else self.styles["red"] if order_type == "Sell" else self.styles["grey"]
+        values = [date, ticker, name, order_type, quantity, price_per_unit, total_value]
+        
+        for col_offset, val in enumerate(values):
+            cell = self.ws.cell(row=row, column=start_col + col_offset, value=val)
+            cell.border = self.styles["table_border"]
+            if col_offset <= 2:  # Date, Ticker, Name columns
+                cell.fill = self.styles["grey"]
+            elif col_offset == 3:  # Order Type column
+                cell.fill = row_fill
+                cell.font = Font(bold=True)
+            else:  # Value columns
+                cell.fill = row_fill
+    
+    def _insert_new_orders(self, transactions_info, written, header_row):
+        """Shift the existing order rows down and write the newer orders above them.
+        
+        Only columns B:H move, so the statistics tables beside the history stay put.
+        """
+        new_orders = transactions_info[:len(transactions_info) - written]
+        first_data_row = header_row + 1
+        last_old_row = first_data_row + written - 1
+        self.ws.move_range(f"B{first_data_row}:H{last_old_row}", rows=len(new_orders))
+        
+        for offset, tx in enumerate(new_orders):
+            self._write_order_row(first_data_row + offset, tx)
+        
+        last_data_row = last_old_row + len(new_orders)
+        self.apply_table_border(ws=self.ws, first_row=2, last_row=last_data_row, first_col=2, last_col=8)
+        self.ws.auto_filter.ref = f"B{header_row}:E{last_data_row}"
+    
+    def order_history(self):
+        transactions_info = self.load_orders()
+        section_fp = fingerprint(transactions_info)
+        if self.state.is_current("orders", section_fp):
+            return
+        
         start_col, start_row = 2, 2
         
+        # Orders are listed newest first, so new orders are a prefix and the old table a suffix
+        previous = self.state.section("orders")
+        written = previous.get("count", 0)
+        if (self.state.incremental and 0 < written <= len(transactions_info)
+                and fingerprint(transactions_info[len(transactions_info) - written:]) == previous.get("fingerprint")):
+            self._insert_new_orders(transactions_info, written, header_row=start_row + 2)
+            self.state.mark("orders", section_fp, count=len(transactions_info))
+            return
+        
+        if self.state.incremental:
+            clear_region(self.ws, start_row, start_col, self.ws.max_row, start_col + 6)
+        
         instruction_cell = self.ws.cell(row=start_row, column=start_col)
         instruction_cell.value = "💡 Use Excel's filter buttons in the header row to search and filter transactions"
         instruction_cell.font = Font(italic=True, size=12.5)
@@ -146,27 +225,7 @@ class AdvancedAccountInfo:
         
         row = header_row + 1
         for tx in transactions_info:
-            date = self.extract_date(tx.get("dateTime", ""))
-            ticker = tx.get("ticker", "N/A")
-            name = tx.get("name", "N/A")
-            order_type = tx.get("orderType", "N/A")
-            quantity = round(tx.get("quantity", 0), 4)
-            price_per_unit = round(tx.get("pricePerUnit", 0), 4)
-            total_value = round(tx.get("totalValue", 0), 2)
-            
-            row_fill = self.styles["green"] if order_type == "Buy" else self.styles["red"] if order_type == "Sell" else self.styles["grey"]
-            values = [date, ticker, name, order_type, quantity, price_per_unit, total_value]
-            
-            for col_offset, val in enumerate(values):
-                cell = self.ws.cell(row=row, column=start_col + col_offset, value=val)
-                cell.border = self.styles["table_border"]
-                if col_offset <= 2:  # Date, Ticker, Name columns
-                    cell.fill = self.styles["grey"]
-                elif col_offset == 3:  # Order Type column
-                    cell.fill = row_fill
-                    cell.font = Font(bold=True)
-                else:  # Value columns
-                    cell.fill = row_fill
+            self._write_order_row(row, tx)
             row += 1
         
         column_widths = {'B': 15, 'C': 12, 'D': 35, 'E': 12, 'F': 15, 'G': 15, 'H': 15}
@@ -181,96 +240,13 @@ class AdvancedAccountInfo:
         if transactions_info:
             filter_range = f"B{header_row}:E{last_data_row}"
             self.ws.auto_filter.ref = filter_range
-
-    def wait_times_analysis(self):
-        buy_transactions = {}
-        sell_transactions = []
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
+        else:
+            self.ws.auto_filter.ref = None
         
-        if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row_data in reader:
-                    action = row_data.get("Action", "")
-                    if action.lower() in ["market buy", "market sell", "stop buy", "stop sell", "limit buy", "limit sell"]:
-                        time_str = row_data.get("Time", "")
-                        ticker = row_data.get("Ticker", "")
-                        name = row_data.get("Name", "")
-                        
-                        try:
-                            qty = float(row_data.get("No. of shares", "0") or 0)
-                        except ValueError:
-                            continue
-                            
-                        if qty <= 0:
-                            continue
-                        
-                        transaction = {
-                            "dateTime": time_str, "ticker": ticker, 
-                            "name": name, "quantity": qty, "action": action
-                        }
-                        
-                        if "buy" in action.lower():
-                            if ticker not in buy_transactions:
-                                buy_transactions[ticker] = []
-                            buy_transactions[ticker].append(transaction)
-                        elif "sell" in action.lower():
-                            sell_transactions.append(transaction)
-        
-        all_individual_holds = []
-        
-        for sell_tx in sell_transactions:
-            sell_ticker = sell_tx["ticker"]
-            if sell_ticker not in buy_transactions:
-                continue
-                
-            sell_name = sell_tx["name"]
-            sell_date = sell_tx["dateTime"]
-            remaining_sell_qty = sell_tx["quantity"]
-            
-            sorted_buys = sorted(buy_transactions[sell_ticker], key=lambda x: x["dateTime"])
-            
-            for buy_tx_original in sorted_buys:
-                if remaining_sell_qty <= 0:
-                    break
-                
-                buy_idx = buy_transactions[sell_ticker].index(buy_tx_original)
-                buy_qty_available = buy_transactions[sell_ticker][buy_idx]["quantity"]
-                
-                if buy_qty_available <= 0:
-                    continue
+        self.state.mark("orders", section_fp, count=len(transactions_info))
 
-                matched_qty = min(remaining_sell_qty, buy_qty_available)
-                
-                try:
-                    buy_dt = datetime.strptime(buy_tx_original["dateTime"].split(" ")[0], "%Y-%m-%d")
-                    sell_dt = datetime.strptime(sell_date.split(" ")[0], "%Y-%m-%d")
-                    
-                    hold_days = (sell_dt - buy_dt).days
-                    if hold_days >= 0:
-                        all_individual_holds.append({
-                            'ticker': sell_ticker, 'name': sell_name, 'days': hold_days
-                        })
-                        
-                    buy_transactions[sell_ticker][buy_idx]["quantity"] -= matched_qty
-                    remaining_sell_qty -= matched_qty
-                except ValueError:
-                    continue
-        
-        avg_hold_days = 0
-        top_3_longest_holds = []
-        
-        if all_individual_holds:
-            avg_hold_days = sum(item['days'] for item in all_individual_holds) / len(all_individual_holds)
-            
-            ticker_longest_holds = {}
-            for hold in all_individual_holds:
-                ticker, days = hold['ticker'], hold['days']
-                if ticker not in ticker_longest_holds or days > ticker_longest_holds[ticker]['days']:
-                    ticker_longest_holds[ticker] = hold
-            
-            top_3_longest_holds = sorted(ticker_longest_holds.values(), 
-                                         key=lambda x: x['days'], reverse=True)[:3]
+    def wait_times_analysis(self, rows):
+        avg_hold_days, top_3_longest_holds = hold_time_summary(hold_times(rows))
         
         start_col, start_row = 10, 2
         
@@ -346,35 +322,12 @@ class AdvancedAccountInfo:
                 
         self.last_wait_times_row = last_row
 
-    def fee_analysis(self):
-        fee_breakdown = {}
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
-        
+    def fee_analysis(self, rows):
         start_row = getattr(self, 'last_wait_times_row', 0) + 2
         start_col = 10
         
-        if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                fee_types = [
-                    ("Deposit Fee", "Deposit fee"),
-                    ("Currency Conversion", "Currency conversion fee"),
-                    ("Stamp Duty Tax", "Stamp duty reserve tax"),
-                    ("Withholding Tax", "Withholding tax")
-                ]
-                
-                for row in reader:
-                    for fee_name, fee_column in fee_types:
-                        fee_value = row.get(fee_column, "0")
-                        if fee_value and fee_value != "0":
-                            try:
-                                amount = abs(float(fee_value))
-                                if amount > 0:
-                                    if fee_name not in fee_breakdown:
-                                        fee_breakdown[fee_name] = 0
-                                    fee_breakdown[fee_name] += amount
-                            except ValueError:
-                                continue
+        fee_breakdown = fee_totals(rows)
+        currency = account_currency(rows)
         
         total_fees = sum(fee_breakdown.values()) if fee_breakdown else 0
         
@@ -398,7 +351,7 @@ class AdvancedAccountInfo:
         
         row = header_row + 1
         for fee_type, amount in sorted(fee_breakdown.items()):
-            values = [fee_type, round(amount, 2), "EUR"]
+            values = [fee_type, round(amount, 2), currency]
             for col_offset, val in enumerate(values):
                 cell = self.ws.cell(row=row, column=start_col + col_offset, value=val)
                 cell.border = self.styles["table_border"]
@@ -409,7 +362,7 @@ class AdvancedAccountInfo:
             row += 1
         
         if fee_breakdown:
-            for col_offset, val in enumerate(["TOTAL FEES", round(total_fees, 2), "EUR"]):
+            for col_offset, val in enumerate(["TOTAL FEES", round(total_fees, 2), currency]):
                 cell = self.ws.cell(row=row, column=start_col + col_offset, value=val)
                 cell.border = self.styles["table_border"]
                 cell.font = Font(bold=True)
@@ -439,253 +392,45 @@ class AdvancedAccountInfo:
         
         self.last_fee_row = last_data_row
                 
+    def capital_gains_series(self):
+        return capital_gains_series(read_history(HISTORY_CSV))
+    
+    def dividends_series(self):
+        return dividends_series(read_history(HISTORY_CSV))
+    
+    def submit_charts(self):
+        """Queue chart rendering so it overlaps with writing the table sheets."""
+        if self.chart_futures is None:
+            style = {"currency_symbol": currency_symbol(account_currency(read_history(HISTORY_CSV)))}
+            self.chart_futures = {
+                "capital_gains": self.chart_renderer.submit("capital_gains", self.capital_gains_series(), style),
+                "dividends": self.chart_renderer.submit("dividends", self.dividends_series(), style),
+                "account_value": self.chart_renderer.submit("account_value", value_series(), style),
+            }
+        return self.chart_futures
+    
+    def add_chart_image(self, png_path, anchor):
+        self.state.add_image(self.ws, png_path, anchor, width=720, height=288)
+    
     def capital_gains_graph(self):
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
-        
-        capital_gains_data = defaultdict(float)
-        
-        if os.path.exists(csv_path):
-            try:
-                with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    
-                    for row in reader:
-                        action = row.get("Action", "").strip()
-                        time_str = row.get("Time", "").strip()
-                        result_str = row.get("Result", "0").strip()
-                        
-                        if not time_str:
-                            continue
-                            
-                        try:
-                            date_part = time_str.split(" ")[0]
-                            if not date_part:
-                                continue
-                                
-                            date = datetime.strptime(date_part, "%Y-%m-%d")
-                            
-                            if action.lower() in ["market buy", "market sell", "stop buy", "stop sell", "limit buy", "limit sell"]:
-                                if result_str and result_str not in ["0", ""]:
-                                    try:
-                                        result = float(result_str)
-                                        if abs(result) > 0.01:
-                                            capital_gains_data[date] += result
-                                    except (ValueError, TypeError):
-                                        continue
-                                        
-                        except (ValueError, IndexError):
-                            continue
-                            
-            except Exception:
-                pass
-        
-        # Create capital gains graph
-        plt.style.use('default')
-        fig, ax = plt.subplots(1, 1, figsize=(12, 6))
-        fig.patch.set_facecolor('white')
-        
-        primary_color = '#4472C4'
-        accent_color = '#FFC000'
-        
-        if capital_gains_data:
-            dates = sorted(capital_gains_data.keys())
-            cumulative_gains = []
-            running_total = 0
-            
-            for date in dates:
-                running_total += capital_gains_data[date]
-                cumulative_gains.append(running_total)
-            
-            ax.plot(dates, cumulative_gains, color=primary_color, linewidth=3, 
-                    marker='o', markersize=5, zorder=3)
-            ax.fill_between(dates, cumulative_gains, alpha=0.3, color=primary_color, zorder=2)
-            ax.axhline(y=0, color='gray', linestyle='--', alpha=0.5, zorder=1)
-            
-            ax.set_title('Capital Gains Progress Over Time', fontsize=16, fontweight='bold', 
-                         pad=20, color='#2F4F4F')
-            ax.set_ylabel('Capital Gains (€)', fontsize=13, fontweight='bold')
-            ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-            
-            if cumulative_gains:
-                final_value = cumulative_gains[-1]
-                max_value = max(cumulative_gains)
-                
-                ax.annotate(f'Current: €{final_value:.2f}', 
-                           xy=(dates[-1], final_value), xytext=(20, 20), 
-                           textcoords='offset points',
-                           bbox=dict(boxstyle='round,pad=0.5', facecolor=primary_color, alpha=0.8),
-                           fontsize=11, color='white', fontweight='bold',
-                           arrowprops=dict(arrowstyle='->', color=primary_color, lw=2))
-                
-                if max_value != final_value:
-                    max_idx = cumulative_gains.index(max_value)
-                    ax.annotate(f'Peak: €{max_value:.2f}', 
-                               xy=(dates[max_idx], max_value), xytext=(10, -30), 
-                               textcoords='offset points',
-                               bbox=dict(boxstyle='round,pad=0.3', facecolor=accent_color, alpha=0.7),
-                               fontsize=9, color='black', fontweight='bold')
-        
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('gray')
-        ax.spines['bottom'].set_color('gray')
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-        ax.tick_params(colors='gray', which='both')
-        ax.set_facecolor('#FAFAFA')
-        
-        plt.tight_layout()
-        
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none', pad_inches=0.2)
-        img_buffer.seek(0)
-        plt.close()
-        
-        img = Image(img_buffer)
-        img.width = 720
-        img.height = 288
-        start_row = 2
-        self.ws.add_image(img, f'N{start_row}')
+        png_path = self.submit_charts()["capital_gains"].result()
+        self.add_chart_image(png_path, 'N2')
     
     def dividends_graph(self):
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
-        
-        dividend_data = defaultdict(float)
-        
-        if os.path.exists(csv_path):
-            try:
-                with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    
-                    for row in reader:
-                        action = row.get("Action", "").strip()
-                        time_str = row.get("Time", "").strip()
-                        
-                        if not time_str:
-                            continue
-                            
-                        try:
-                            date_part = time_str.split(" ")[0]
-                            if not date_part:
-                                continue
-                                
-                            date = datetime.strptime(date_part, "%Y-%m-%d")
-                            
-                            if "dividend" in action.lower():
-                                total_str = row.get("Total", "0").strip()
-                                try:
-                                    dividend_amount = float(total_str)
-                                    if dividend_amount > 0:
-                                        dividend_data[date] += dividend_amount
-                                except (ValueError, TypeError):
-                                    continue
-                                    
-                        except (ValueError, IndexError):
-                            continue
-                            
-            except Exception:
-                pass
-        
-        # Create dividends graph
-        plt.style.use('default')
-        fig, ax = plt.subplots(1, 1, figsize=(12, 6))
-        fig.patch.set_facecolor('white')
-        
-        secondary_color = '#70AD47'
+        png_path = self.submit_charts()["dividends"].result()
+        self.add_chart_image(png_path, 'N20')  # Position below capital gains graph
+    
+    def account_value_graph(self):
+        png_path = self.submit_charts()["account_value"].result()
+        self.add_chart_image(png_path, 'N38')
         
-        if dividend_data:
-            dates = sorted(dividend_data.keys())
-            cumulative_dividends = []
-            running_total = 0
-            
-            for date in dates:
-                running_total += dividend_data[date]
-                cumulative_dividends.append(running_total)
-            
-            ax.plot(dates, cumulative_dividends, color=secondary_color, linewidth=3, 
-                    marker='s', markersize=5, zorder=3)
-            ax.fill_between(dates, cumulative_dividends, alpha=0.3, color=secondary_color, zorder=2)
-            
-            ax.set_title('Cumulative Dividend Growth Over Time', fontsize=16, fontweight='bold', 
-                         pad=20, color='#2F4F4F')
-            ax.set_ylabel('Total Dividends (€)', fontsize=13, fontweight='bold')
-            ax.set_xlabel('Date', fontsize=13, fontweight='bold')
-            ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-            
-            if cumulative_dividends:
-                final_value = cumulative_dividends[-1]
-                total_payments = len(dividend_data)
-                
-                ax.annotate(f'Total: €{final_value:.2f}', 
-                           xy=(dates[-1], final_value), xytext=(20, 20), 
-                           textcoords='offset points',
-                           bbox=dict(boxstyle='round,pad=0.5', facecolor=secondary_color, alpha=0.8),
-                           fontsize=11, color='white', fontweight='bold',
-                           arrowprops=dict(arrowstyle='->', color=secondary_color, lw=2))
-                
-                ax.text(0.02, 0.98, f'Total: {total_payments} dividend payments', 
-                        transform=ax.transAxes, ha='left', va='top',
-                        bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.8),
-                        fontsize=10, fontweight='bold')
-        
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('gray')
-        ax.spines['bottom'].set_color('gray')
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-        ax.tick_params(colors='gray', which='both')
-        ax.set_facecolor('#FAFAFA')
-        
-        plt.tight_layout()
-        
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none', pad_inches=0.2)
-        img_buffer.seek(0)
-        plt.close()
-        
-        img = Image(img_buffer)
-        img.width = 720
-        img.height = 288
-        start_row = 20  # Position below capital gains graph
-        self.ws.add_image(img, f'N{start_row}')
-        
-    def win_loss_statistics(self):
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
-        
-        total_trades = winning_trades = 0
-        total_pnl = 0.0
+    def win_loss_statistics(self, rows):
         start_row = getattr(self, 'last_fee_row', 0) + 2
         start_col = 10
         
-        if os.path.exists(csv_path):
-            try:
-                with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for row in reader:
-                        action = row.get("Action", "").strip()
-                        result_str = row.get("Result", "0").strip()
-                        
-                        if action.lower() in ["market buy", "market sell", "stop buy", "stop sell", "limit buy", "limit sell"]:
-                            if result_str and result_str not in ["0", ""]:
-                                try:
-                                    result = float(result_str)
-                                    if abs(result) > 0.01:
-                                        total_trades += 1
-                                        total_pnl += result
-                                        if result > 0:
-                                            winning_trades += 1
-                                except (ValueError, TypeError):
-                                    continue
-            except Exception:
-                pass
-        
-        win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-        avg_pnl = total_pnl / total_trades if total_trades > 0 else 0
+        stats = win_loss(rows)
+        total_trades, winning_trades = stats["total_trades"], stats["winning_trades"]
+        win_rate, avg_pnl = stats["win_rate"], stats["avg_pnl"]
         
         title_range = f"J{start_row}:L{start_row}"
         self.ws.merge_cells(title_range)
@@ -709,7 +454,7 @@ class AdvancedAccountInfo:
             ("Total Trades", total_trades, "trades"),
             ("Winning Trades", winning_trades, "trades"),
             ("Win Rate", round(win_rate, 2), "%"),
-            ("Average P/L per Trade", round(avg_pnl, 2), "EUR")
+            ("Average P/L per Trade", round(avg_pnl, 2), account_currency(rows))
         ]
         
         row = header_row + 1
@@ -753,10 +498,27 @@ class AdvancedAccountInfo:
                 )
                 cell.border = new_border
 
+    def statistics_tables(self):
+        # Hold time, fee and win/loss tables are stacked in J:L and all derive from the history file
+        # (and the exchange rates the fees and results are converted at)
+        csv_path = HISTORY_CSV
+        section_fp = fingerprint(self.state.file_digest(csv_path), self.state.file_digest(FX_RATES_PATH))
+        if self.state.is_current("statistics", section_fp):
+            return
+        if self.state.incremental:
+            clear_region(self.ws, 2, 10, self.ws.max_row, 12)
+        
+        rows = read_history(csv_path)
+        self.wait_times_analysis(rows)
+        self.fee_analysis(rows)
+        self.win_loss_statistics(rows)
+        self.state.mark("statistics", section_fp)
+
     def generate_sheet(self):
+        self.submit_charts()
         self.order_history()
-        self.wait_times_analysis()
-        self.fee_analysis()
-        self.win_loss_statistics()
+        self.statistics_tables()
+        # Re-embedding replaces the loaded chart at the same anchor, and is cheap on a chart cache hit
         self.capital_gains_graph()
         self.dividends_graph()
+        self.account_value_graph()
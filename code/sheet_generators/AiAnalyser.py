@@ -1,239 +1,270 @@
 import os
-import csv
-import json
-import openai
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.drawing.image import Image
-from datetime import datetime
+from openpyxl.styles import Font, Alignment
 import sys
-from PIL import Image as PILImage, ImageDraw, ImageFont
-import textwrap
-import io
+import re
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from AccountData import get_open_positions, get_cash_info
+from sheet_generators.WorkbookState import WorkbookState, fingerprint, clear_region
+from sheet_generators.PromptBuilder import PromptBuilder
+from sheet_generators.ResponseCache import ResponseCache
+from sheet_generators.HistoryMapReduce import HistoryMapReduce
+from RunMetrics import count, measured
+from Paths import HISTORY_CSV
+from sheet_generators.PortfolioStats import read_history
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Written instead of an analysis when none could be made; never kept as current
+UNAVAILABLE = "AI analysis unavailable"
+
+def make_openai_client():
+    """OpenAI client, or None without a key or the SDK.
+    
+    OPENAI_BASE_URL points it at another compatible server, such as
+    LocalCompletionServer for offline runs.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    # Only pay for importing the OpenAI SDK when a request is actually made
+    try:
+        import openai
+    except ImportError:
+        return None
+    return openai.OpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
+
 class AiAnalyser:
-    def __init__(self, wb, styles, load_cached_func, apply_border_func):
+    def __init__(self, wb, styles, load_cached_func, apply_border_func, state=None):
         self.wb = wb
-        self.ws = wb.create_sheet("AI Analysis")
+        self.ws = wb["AI Analysis"] if "AI Analysis" in wb.sheetnames else wb.create_sheet("AI Analysis")
         self.styles = styles
         self.load_cached = load_cached_func
         self.apply_table_border = apply_border_func
+        self.state = state if state is not None else WorkbookState()
+        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        self.prompt_builder = PromptBuilder(model=self.model)
+        self.response_cache = ResponseCache()
+        # "summary" sends aggregates only; "chunked" also map-reduces the full history
+        self.history_mode = os.getenv("AI_HISTORY_MODE", "summary")
         self.client = None
-        self.api_available = False
-        
-        self.test_api_connection()
-    
-    def test_api_connection(self):
-        try:
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                return False
-            
-            self.client = openai.OpenAI(api_key=api_key)
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "Hello"}],
-                max_tokens=5,
-                temperature=0
-            )
-            
-            self.api_available = True
-            return True
-            
-        except Exception as e:
-            self.api_available = False
-            return False
+        self.analysis_future = None
+        self.raw_data = None
+        # (prompt, tokens, level) built from the aggregates alone, without period summaries
+        self.summary_prompt = None
+        self.section_fp = None
+        # Set when the sheet holds an error instead of an analysis, so the next build retries
+        self.failed = False
     
+    @measured("parse")
     def load_raw_data(self):
         positions = self.load_cached("open_positions", get_open_positions)
         cash_info = self.load_cached("cash_info", get_cash_info)
         pies_info = self.load_cached("pies_info", lambda: {})
+        # Quote currencies, so position values can be compared
+        instruments = self.load_cached("instruments", lambda: [])
         
         trading_history = []
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "trading212_history.csv")
+        csv_path = HISTORY_CSV
         
         if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                trading_history = list(reader)
+            trading_history = read_history(csv_path)
         
         return {
             "positions": positions,
             "cash_info": cash_info,
             "pies_info": pies_info,
+            "instruments": instruments,
             "trading_history": trading_history
         }
     
-    def _prepare_comprehensive_data(self, raw_data):
-        data_dump = "=== RAW TRADING212 DATA ===\n\n"
-        
-        data_dump += "=== CASH_INFO.JSON ===\n"
-        data_dump += json.dumps(raw_data["cash_info"], indent=2) + "\n\n"
+    def openai_client(self):
+        if self.client is None:
+            self.client = make_openai_client()
+        return self.client
+    
+    def complete(self, prompt, max_tokens):
+        """Blocking completion for the history map-reduce, cached and retried when rate limited."""
+        import openai
         
-        data_dump += "=== OPEN_POSITIONS.JSON ===\n"
-        data_dump += json.dumps(raw_data["positions"], indent=2) + "\n\n"
+        settings = {"max_tokens": max_tokens, "temperature": 0.2}
+        cache_key = self.response_cache.key(prompt, self.model, **settings)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        if raw_data["pies_info"]:
-            data_dump += "=== PIES_INFO.JSON ===\n"
-            data_dump += json.dumps(raw_data["pies_info"], indent=2) + "\n\n"
+        for attempt in range(4):
+            try:
+                count("llm_requests")
+                response = self.openai_client().chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **settings
+                )
+                break
+            except openai.RateLimitError:
+                if attempt == 3:
+                    raise
+                time.sleep(2 ** attempt)
         
-        data_dump += "=== TRADING212_HISTORY.CSV (Recent 50 entries) ===\n"
-        data_dump += "Action,Time,ISIN,Ticker,Name,No. of shares,Price / share,Currency (Price / share),Exchange rate,Result,Currency (Result),Total,Currency (Total),Withholding tax,Currency (Withholding tax),Charge amount (per transaction),Currency (Charge),Finra fee,Currency (Finra fee),Stamp duty reserve tax,Currency (Stamp duty reserve tax),Notes,ID,Currency conversion fee,Currency (Currency conversion fee)\n"
+        content = response.choices[0].message.content.strip()
+        self.response_cache.put(cache_key, content, model=self.model)
+        return content
+    
+    def period_summaries(self, raw_data):
+        """Map-reduce summaries of the full history in chunked mode, else None."""
+        if self.history_mode != "chunked" or not raw_data["trading_history"] or self.openai_client() is None:
+            return None
         
-        for i, trade in enumerate(raw_data["trading_history"][:50]):
-            row_data = [
-                trade.get("Action", ""),
-                trade.get("Time", ""),
-                trade.get("ISIN", ""),
-                trade.get("Ticker", ""),
-                trade.get("Name", ""),
-                trade.get("No. of shares", ""),
-                trade.get("Price / share", ""),
-                trade.get("Currency (Price / share)", ""),
-                trade.get("Exchange rate", ""),
-                trade.get("Result", ""),
-                trade.get("Currency (Result)", ""),
-                trade.get("Total", ""),
-                trade.get("Currency (Total)", ""),
-                trade.get("Withholding tax", ""),
-                trade.get("Currency (Withholding tax)", ""),
-                trade.get("Charge amount (per transaction)", ""),
-                trade.get("Currency (Charge)", ""),
-                trade.get("Finra fee", ""),
-                trade.get("Currency (Finra fee)", ""),
-                trade.get("Stamp duty reserve tax", ""),
-                trade.get("Currency (Stamp duty reserve tax)", ""),
-                trade.get("Notes", ""),
-                trade.get("ID", ""),
-                trade.get("Currency conversion fee", ""),
-                trade.get("Currency (Currency conversion fee)", "")
-            ]
-            data_dump += ",".join([str(item) for item in row_data]) + "\n"
+        started = time.perf_counter()
+        map_reduce = HistoryMapReduce(self.complete, summary_budget=self.prompt_builder.budget // 2, model=self.model)
+        try:
+            summaries = map_reduce.summarise(raw_data["trading_history"])
+        except Exception as e:
+            print(f"⚠️ History summaries failed, analysing aggregates only: {e}")
+            return None
+        print(f"🤖 Summarised {len(raw_data['trading_history'])} history rows into {len(summaries)} periods "
+              f"({map_reduce.calls} requests, {time.perf_counter() - started:.1f}s)")
+        return summaries
+    
+    @measured("llm", "ai_analysis")
+    def get_ai_insights(self, raw_data):
+        period_summaries = self.period_summaries(raw_data)
+        if period_summaries is None and self.summary_prompt is not None and raw_data is self.raw_data:
+            prompt, tokens, level = self.summary_prompt
+        else:
+            prompt, tokens, level = self.prompt_builder.build(raw_data, period_summaries)
+        settings = {"max_tokens": 1200, "temperature": 0.3}
+        cache_key = self.response_cache.key(prompt, self.model, **settings)
         
-        data_dump += f"\n=== TOTAL TRADING HISTORY ENTRIES: {len(raw_data['trading_history'])} ===\n"
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            print("♻️ Portfolio unchanged, reusing the cached AI analysis")
+            return {"AI Portfolio Analysis": cached}
         
-        return data_dump
-
-    def get_ai_insights(self, raw_data):
-        if not self.api_available:
-            return {"AI Portfolio Analysis": "AI analysis unavailable - OpenAI API connection failed"}
+        client = self.openai_client()
+        if client is None:
+            return {"AI Portfolio Analysis": f"{UNAVAILABLE} - OpenAI API connection failed"}
+        import openai
         
+        # No probe request: a bad key or unreachable API surfaces as the first error of the real request
         try:
-            comprehensive_data = self._prepare_comprehensive_data(raw_data)
-            
-            prompt = f"""
-            You are a professional portfolio analyst with 20+ years of experience. Analyze this complete Trading212 portfolio data and provide comprehensive, detailed feedback.
-
-            COMPLETE PORTFOLIO DATA:
-            {comprehensive_data}
-
-            Please provide a DETAILED analysis covering these areas with specific insights and actionable recommendations:
-
-            1. CASH ALLOCATION & LIQUIDITY MANAGEMENT:
-            - Analyze the current cash position and liquidity levels
-            - Evaluate cash-to-investment ratio efficiency
-            - Identify opportunities for better cash deployment
-            - Assess emergency fund adequacy
-
-            2. PORTFOLIO CONCENTRATION & DIVERSIFICATION RISKS:
-            - Calculate and evaluate position concentration levels
-            - Identify potential single-stock risk exposures
-            - Analyze sector/geographic diversification
-            - Recommend specific diversification improvements
-
-            3. TRADING PATTERNS & PERFORMANCE METRICS:
-            - Evaluate trading frequency and timing patterns
-            - Analyze win/loss ratios and trade profitability
-            - Assess fee impact on overall returns
-            - Identify behavioral trading patterns (good and problematic)
-
-            4. PORTFOLIO HEALTH & STRATEGIC RECOMMENDATIONS:
-            - Overall portfolio performance assessment
-            - Risk-adjusted return analysis
-            - Strategic asset allocation recommendations
-            - Specific action items for portfolio improvement
-
-            5. DETAILED OBSERVATIONS:
-            - Notable holdings analysis
-            - Market timing insights from trading history
-            - Potential tax implications
-            - Long-term wealth building recommendations
-
-            Please be SPECIFIC with numbers, percentages, and concrete recommendations. Reference actual positions, amounts, and dates from the data. Provide actionable insights that the investor can implement immediately.
-
-            Make your analysis comprehensive and detailed - aim for 600-800 words covering all aspects thoroughly.
-            """
+            print(f"🤖 AI prompt: {tokens} tokens (budget {self.prompt_builder.budget}, detail level {level})")
+            started = time.perf_counter()
+            first_token = None
+            parts = []
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            count("llm_requests")
+            stream = client.chat.completions.create(
+                model=self.model,
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=1200,
-                temperature=0.3
+                stream=True,
+                **settings
             )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    parts.append(delta)
             
-            return {"AI Portfolio Analysis": response.choices[0].message.content.strip()}
+            content = "".join(parts).strip()
+            if not content:
+                return {"AI Portfolio Analysis": f"{UNAVAILABLE} - Error occurred during analysis"}
             
+            print(f"🤖 AI analysis streamed in {time.perf_counter() - started:.1f}s (first token after {first_token:.1f}s)")
+            self.response_cache.put(cache_key, content, model=self.model, prompt_tokens=tokens)
+            return {"AI Portfolio Analysis": content}
+            
+        except (openai.AuthenticationError, openai.PermissionDeniedError, openai.APIConnectionError):
+            return {"AI Portfolio Analysis": f"{UNAVAILABLE} - OpenAI API connection failed"}
         except Exception as e:
-            return {"AI Portfolio Analysis": "AI analysis unavailable - Error occurred during analysis"}
+            return {"AI Portfolio Analysis": f"{UNAVAILABLE} - Error occurred during analysis"}
     
-    def create_text_image(self, text, width=1000, font_size=14):
-        # Set up basic parameters for better quality
-        line_height = int(font_size * 1.5)
-        padding = 30
-        background_color = (255, 255, 255) 
-        text_color = (33, 37, 41)
-        
-        try:
-            font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", font_size)
-        except (OSError, IOError):
-            try:
-                font = ImageFont.truetype("/System/Library/Fonts/Arial.ttf", font_size)
-            except (OSError, IOError):
-                try:
-                    font = ImageFont.truetype("/Library/Fonts/Arial.ttf", font_size)
-                except (OSError, IOError):
-                    font = ImageFont.load_default()
+    def submit_analysis(self):
+        """Start the AI request in the background so it overlaps with writing the other sheets."""
+        if self.analysis_future is not None:
+            return self.analysis_future
         
-        # Wrap text to fit the width with better character estimation
-        chars_per_line = int(width / (font_size * 0.55))
-        wrapper = textwrap.TextWrapper(width=chars_per_line, break_long_words=False, break_on_hyphens=False)
-        wrapped_lines = []
+        self.raw_data = self.load_raw_data()
+        # Keyed on the prompt rather than the data behind it, so history rows it
+        # leaves out do not redo the analysis; chunked mode summarises them all
+        self.summary_prompt = self.prompt_builder.build(self.raw_data)
+        history = self.state.file_digest(HISTORY_CSV) if self.history_mode == "chunked" else None
+        self.section_fp = fingerprint(self.summary_prompt[0], history, self.model, self.prompt_builder.budget,
+                                      self.history_mode, bool(os.getenv("OPENAI_API_KEY")))
         
-        paragraphs = text.split('\n\n')
-        for i, paragraph in enumerate(paragraphs):
-            if paragraph.strip():
-                para_lines = paragraph.split('\n')
-                for line in para_lines:
-                    if line.strip():
-                        wrapped = wrapper.wrap(line.strip())
-                        wrapped_lines.extend(wrapped)
-                
-                if i < len(paragraphs) - 1:
-                    wrapped_lines.append('')
-        
-        height = (len(wrapped_lines) * line_height) + (2 * padding) + 50 
-        
-        img = PILImage.new('RGB', (width, height), background_color)
-        draw = ImageDraw.Draw(img)
-        
-        y_position = padding
-        for line in wrapped_lines:
-            if line: 
-                draw.text((padding, y_position), line, font=font, fill=text_color)
-            y_position += line_height
+        if self.state.section("ai_analysis").get("fingerprint") == self.section_fp:
+            # The previous analysis is most likely kept as is; if the sheet is
+            # rebuilt anyway generate_sheet fetches it, from the response cache
+            self.analysis_future = Future()
+            self.analysis_future.set_result(None)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-analysis")
+            self.analysis_future = executor.submit(self.get_ai_insights, self.raw_data)
+            executor.shutdown(wait=False)
+        return self.analysis_future
+    
+    def parse_analysis(self, text):
+        """Split the model's markdown-ish reply into ("heading" | "bullet" | "paragraph", text) blocks."""
+        blocks = []
+        paragraph = []
         
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG', optimize=False, quality=100)
-        img_buffer.seek(0)
+        def flush():
+            if paragraph:
+                blocks.append(("paragraph", " ".join(paragraph)))
+                paragraph.clear()
         
-        return img_buffer
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                flush()
+                continue
+            
+            heading = re.match(r"^(#{1,6}\s+|\d+[.)]\s+)(.*)$", line)
+            plain = line.strip("*#: ").strip()
+            if line.startswith("#") or (heading and plain.upper() == plain and any(c.isalpha() for c in plain)) \
+                    or (line.startswith("**") and line.rstrip(":").endswith("**")):
+                flush()
+                blocks.append(("heading", (heading.group(2) if heading else line).strip("*#: ").strip()))
+            elif re.match(r"^([-*•]|\d+[.)])\s+", line):
+                flush()
+                blocks.append(("bullet", re.sub(r"^([-*•]|\d+[.)])\s+", "", line)))
+            else:
+                paragraph.append(line)
+        flush()
+        return blocks
+    
+    def rich_text(self, text, size=11, bold=False):
+        """Cell value for `text`, with **bold** spans as rich text when openpyxl supports it."""
+        parts = re.split(r"\*\*(.+?)\*\*", text)
+        if len(parts) == 1:
+            return text
+        try:
+            from openpyxl.cell.rich_text import CellRichText, TextBlock
+            from openpyxl.cell.text import InlineFont
+        except ImportError:
+            return "".join(parts)
         
+        value = CellRichText()
+        for index, part in enumerate(parts):
+            if part:
+                value.append(TextBlock(InlineFont(sz=size, b=bold or index % 2 == 1), part))
+        return value
+    
     def create_insights_table(self, insights, start_row=2):
         start_col = 2
+        column_widths = {
+            'B': 12, 'C': 15, 'D': 15, 'E': 15, 'F': 15, 
+            'G': 15, 'H': 15, 'I': 15
+        }
+        for col, width in column_widths.items():
+            self.ws.column_dimensions[col].width = width
         
         title_range = f"B{start_row}:I{start_row}"
         self.ws.merge_cells(title_range)
@@ -248,25 +279,43 @@ class AiAnalyser:
         
         analysis_content = insights.get("AI Portfolio Analysis", "No analysis available")
         
-        img_buffer = self.create_text_image(analysis_content, width=900, font_size=13)
-        
-        img = Image(img_buffer)
-        
-        img.anchor = f"B{start_row + 2}"
-        
-        self.ws.add_image(img)
-        
-        column_widths = {
-            'B': 12, 'C': 15, 'D': 15, 'E': 15, 'F': 15, 
-            'G': 15, 'H': 15, 'I': 15
-        }
-        for col, width in column_widths.items():
-            self.ws.column_dimensions[col].width = width
+        # Merged cells never auto-fit, so row heights are estimated from the
+        # merged width: about one character per width unit at 11pt
+        chars_per_line = sum(column_widths.values())
+        row = start_row + 2
+        for kind, text in self.parse_analysis(analysis_content):
+            size = 12 if kind == "heading" else 11
+            if kind == "bullet":
+                text = f"• {text}"
+            elif kind == "heading" and row > start_row + 2:
+                row += 1
+            
+            self.ws.merge_cells(f"B{row}:I{row}")
+            cell = self.ws.cell(row=row, column=start_col, value=self.rich_text(text, size, kind == "heading"))
+            cell.font = Font(bold=kind == "heading", size=size)
+            cell.alignment = Alignment(wrap_text=True, vertical="top", indent=2 if kind == "bullet" else 0)
+            if kind == "heading":
+                cell.fill = self.styles["grey"]
+            
+            lines = max(1, math.ceil(len(text) * (size / 11) / (chars_per_line - (6 if kind == "bullet" else 0))))
+            self.ws.row_dimensions[row].height = lines * size * 1.35 + 4
+            row += 1
         
-        estimated_image_rows = 30
-        return start_row + 2 + estimated_image_rows
+        return row
     
     def generate_sheet(self):
-        raw_data = self.load_raw_data()
-        insights = self.get_ai_insights(raw_data)
-        self.create_insights_table(insights, start_row=2)
\ No newline at end of file
+        future = self.submit_analysis()
+        if self.state.is_current("ai_analysis", self.section_fp):
+            return
+        if self.state.incremental:
+            clear_region(self.ws, 2, 2, max(self.ws.max_row, 2), 9)
+            for row in range(2, self.ws.max_row + 1):
+                self.ws.row_dimensions[row].height = None
+        
+        insights = future.result() or self.get_ai_insights(self.raw_data)
+        self.create_insights_table(insights, start_row=2)
+        if insights.get("AI Portfolio Analysis", "").startswith(UNAVAILABLE):
+            self.failed = True
+            self.state.forget("ai_analysis")
+        else:
+            self.state.mark("ai_analysis", self.section_fp)
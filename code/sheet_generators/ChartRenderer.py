@@ -0,0 +1,230 @@
+import os
+import io
+import json
+import hashlib
+from concurrent.futures import Future
+from RunMetrics import count
+from Paths import CACHE_DIR
+
+CHART_CACHE_DIR = os.path.join(CACHE_DIR, "charts")
+DEFAULT_DPI = int(os.getenv("CHART_DPI", "300"))
+
+# Bump when the drawing code below changes so stale PNGs are not reused
+RENDERER_VERSION = 2
+
+
+def chart_key(kind, series, style, dpi):
+    """Content hash of everything that affects the rendered PNG."""
+    payload = json.dumps({
+        "version": RENDERER_VERSION,
+        "kind": kind,
+        "series": series,
+        "style": style,
+        "dpi": dpi,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _style_axes(plt, ax):
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['left'].set_color('gray')
+    ax.spines['bottom'].set_color('gray')
+    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+    ax.tick_params(colors='gray', which='both')
+    ax.set_facecolor('#FAFAFA')
+
+
+def _draw_capital_gains(ax, dates, values, style):
+    primary_color = style.get("primary_color", '#4472C4')
+    accent_color = style.get("accent_color", '#FFC000')
+    currency_symbol = style.get("currency_symbol", '€')
+
+    ax.plot(dates, values, color=primary_color, linewidth=3,
+            marker='o', markersize=5, zorder=3)
+    ax.fill_between(dates, values, alpha=0.3, color=primary_color, zorder=2)
+    ax.axhline(y=0, color='gray', linestyle='--', alpha=0.5, zorder=1)
+
+    ax.set_title('Capital Gains Progress Over Time', fontsize=16, fontweight='bold',
+                 pad=20, color='#2F4F4F')
+    ax.set_ylabel(f'Capital Gains ({currency_symbol})', fontsize=13, fontweight='bold')
+
+    final_value = values[-1]
+    max_value = max(values)
+
+    ax.annotate(f'Current: {currency_symbol}{final_value:.2f}',
+               xy=(dates[-1], final_value), xytext=(20, 20),
+               textcoords='offset points',
+               bbox=dict(boxstyle='round,pad=0.5', facecolor=primary_color, alpha=0.8),
+               fontsize=11, color='white', fontweight='bold',
+               arrowprops=dict(arrowstyle='->', color=primary_color, lw=2))
+
+    if max_value != final_value:
+        max_idx = values.index(max_value)
+        ax.annotate(f'Peak: {currency_symbol}{max_value:.2f}',
+                   xy=(dates[max_idx], max_value), xytext=(10, -30),
+                   textcoords='offset points',
+                   bbox=dict(boxstyle='round,pad=0.3', facecolor=accent_color, alpha=0.7),
+                   fontsize=9, color='black', fontweight='bold')
+
+
+def _draw_dividends(ax, dates, values, style):
+    secondary_color = style.get("secondary_color", '#70AD47')
+    currency_symbol = style.get("currency_symbol", '€')
+
+    ax.plot(dates, values, color=secondary_color, linewidth=3,
+            marker='s', markersize=5, zorder=3)
+    ax.fill_between(dates, values, alpha=0.3, color=secondary_color, zorder=2)
+
+    ax.set_title('Cumulative Dividend Growth Over Time', fontsize=16, fontweight='bold',
+                 pad=20, color='#2F4F4F')
+    ax.set_ylabel(f'Total Dividends ({currency_symbol})', fontsize=13, fontweight='bold')
+    ax.set_xlabel('Date', fontsize=13, fontweight='bold')
+
+    ax.annotate(f'Total: {currency_symbol}{values[-1]:.2f}',
+               xy=(dates[-1], values[-1]), xytext=(20, 20),
+               textcoords='offset points',
+               bbox=dict(boxstyle='round,pad=0.5', facecolor=secondary_color, alpha=0.8),
+               fontsize=11, color='white', fontweight='bold',
+               arrowprops=dict(arrowstyle='->', color=secondary_color, lw=2))
+
+    ax.text(0.02, 0.98, f'Total: {len(dates)} dividend payments',
+            transform=ax.transAxes, ha='left', va='top',
+            bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.8),
+            fontsize=10, fontweight='bold')
+
+
+def _draw_account_value(ax, dates, values, style):
+    import matplotlib.dates as mdates
+
+    primary_color = style.get("primary_color", '#4472C4')
+    secondary_color = style.get("secondary_color", '#70AD47')
+    currency_symbol = style.get("currency_symbol", '€')
+    totals = [total for total, _ in values]
+    ppl = [open_ppl for _, open_ppl in values]
+
+    ax.plot(dates, totals, color=primary_color, linewidth=2.5, zorder=3, label='Account value')
+    ax.set_title('Account Value and Open P/L Over Time', fontsize=16, fontweight='bold',
+                 pad=20, color='#2F4F4F')
+    ax.set_ylabel(f'Account Value ({currency_symbol})', fontsize=13, fontweight='bold', color=primary_color)
+
+    # Open P/L is a fraction of the account value, so it gets its own scale
+    ppl_ax = ax.twinx()
+    ppl_ax.plot(dates, ppl, color=secondary_color, linewidth=2, linestyle='--', zorder=2, label='Open P/L')
+    ppl_ax.axhline(y=0, color='gray', linestyle=':', alpha=0.5)
+    ppl_ax.set_ylabel(f'Open P/L ({currency_symbol})', fontsize=13, fontweight='bold', color=secondary_color)
+    ppl_ax.spines['top'].set_visible(False)
+
+    ax.annotate(f'Current: {currency_symbol}{totals[-1]:.2f}',
+               xy=(dates[-1], totals[-1]), xytext=(-120, 20),
+               textcoords='offset points',
+               bbox=dict(boxstyle='round,pad=0.5', facecolor=primary_color, alpha=0.8),
+               fontsize=11, color='white', fontweight='bold')
+
+    # Snapshots can be minutes apart, monthly ticks would hide them
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+
+CHART_DRAWERS = {
+    "capital_gains": _draw_capital_gains,
+    "dividends": _draw_dividends,
+    "account_value": _draw_account_value,
+}
+
+
+def render_chart(kind, series, style, dpi):
+    """Render one chart to PNG bytes.
+
+    `series` is a list of [ISO date, value] pairs (already cumulative) so it
+    can be hashed and sent to a worker process; account_value values are
+    [account value, open P/L] pairs. Runs with the Agg backend.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    from datetime import datetime
+
+    plt.style.use('default')
+    fig, ax = plt.subplots(1, 1, figsize=(12, 6))
+    fig.patch.set_facecolor('white')
+
+    if series:
+        dates = [datetime.fromisoformat(date_str) for date_str, _ in series]
+        values = [value for _, value in series]
+        ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+        # Drawn after the monthly axis so a drawer can replace it
+        CHART_DRAWERS[kind](ax, dates, values, style)
+
+    _style_axes(plt, ax)
+    plt.tight_layout()
+
+    img_buffer = io.BytesIO()
+    plt.savefig(img_buffer, format='png', dpi=dpi, bbox_inches='tight',
+               facecolor='white', edgecolor='none', pad_inches=0.2)
+    plt.close(fig)
+    return img_buffer.getvalue()
+
+
+def _render_to_file(kind, series, style, dpi, path):
+    png = render_chart(kind, series, style, dpi)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ChartRenderer:
+    """Content-addressed PNG cache with cache misses rendered in a process pool.
+
+    `submit` returns a future resolving to the PNG path, so callers can queue
+    charts early and keep writing table sheets while they render.
+    """
+
+    def __init__(self, dpi=None, cache_dir=CHART_CACHE_DIR, max_workers=None):
+        self.dpi = dpi or DEFAULT_DPI
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.executor = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_executor(self):
+        if self.executor is None:
+            # Imported on first miss, a fully cached run never starts multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def submit(self, kind, series, style=None):
+        style = style or {}
+        key = chart_key(kind, series, style, self.dpi)
+        path = os.path.join(self.cache_dir, f"{kind}_{key[:16]}.png")
+
+        if os.path.exists(path):
+            self.hits += 1
+            count("chart_cache_hit")
+            future = Future()
+            future.set_result(path)
+            return future
+
+        self.misses += 1
+        count("chart_cache_miss")
+        try:
+            return self._get_executor().submit(_render_to_file, kind, series, style, self.dpi, path)
+        except (OSError, RuntimeError, NotImplementedError):
+            # No usable process pool (e.g. restricted sandbox), render inline
+            future = Future()
+            future.set_result(_render_to_file(kind, series, style, self.dpi, path))
+            return future
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from openpyxl.styles import Font
+
+SHEET_NAME = "Data Freshness"
+
+HEADERS = ["Dataset", "Fetched at", "Source", "Refetched after", "Covers", "Size KB", "Checksum"]
+
+
+class DataFreshnessSheet:
+    def __init__(self, wb, styles, apply_border_func):
+        self.wb = wb
+        self.styles = styles
+        self.apply_table_border = apply_border_func
+
+    def _refetched_after(self, entry, max_age):
+        if max_age is None:
+            # The history is extended once the next day is complete
+            return "new day" if entry.get("time_to") else ""
+        if max_age >= 3600:
+            return f"{max_age / 3600:g} h"
+        return f"{max_age / 60:g} min" if max_age >= 60 else f"{max_age:g} s"
+
+    def generate_sheet(self, entries, ttls):
+        """Table of when each cached dataset was fetched, from where, and when it is refetched.
+
+        `entries` is ArtifactIndex.entries and `ttls` maps datasets to their
+        time to live in seconds (None for the incrementally exported history).
+        """
+        if SHEET_NAME in self.wb.sheetnames:
+            self.wb.remove(self.wb[SHEET_NAME])
+        ws = self.wb.create_sheet(SHEET_NAME)
+        last_col = 1 + len(HEADERS)
+
+        ws.merge_cells(start_row=2, start_column=2, end_row=2, end_column=last_col)
+        title = ws.cell(row=2, column=2, value="Data Freshness")
+        title.font = Font(bold=True, size=12)
+        title.fill = self.styles["dark_grey"]
+        for col in range(2, last_col + 1):
+            ws.cell(row=2, column=col).border = self.styles["title_border"]
+        for col_offset, header in enumerate(HEADERS):
+            cell = ws.cell(row=3, column=2 + col_offset, value=header)
+            cell.fill = self.styles["grey"]
+            cell.border = self.styles["table_border"]
+            cell.font = Font(bold=True)
+
+        now = datetime.now()
+        row = 4
+        for dataset, entry in sorted(entries.items()):
+            max_age = ttls.get(dataset)
+            covers = ""
+            if entry.get("time_to"):
+                covers = f"{entry['time_from'][:10]} to {entry['time_to'][:10]}"
+            values = [
+                dataset, entry["fetched_at"].replace("T", " "), entry["source"],
+                self._refetched_after(entry, max_age), covers,
+                round(entry["bytes"] / 1024, 1), (entry.get("checksum") or "")[:12],
+            ]
+            for col_offset, value in enumerate(values):
+                cell = ws.cell(row=row, column=2 + col_offset, value=value)
+                cell.border = self.styles["table_border"]
+                if col_offset == 0:
+                    cell.fill = self.styles["grey"]
+            # Data older than its time to live when the workbook was built, i.e. kept from
+            # an earlier run because its refetch failed
+            fetched = datetime.fromtimestamp(entry["fetched_ts"])
+            if max_age is not None and now - fetched > timedelta(seconds=max_age):
+                ws.cell(row=row, column=3).fill = self.styles["red"]
+            row += 1
+
+        self.apply_table_border(ws, 2, row - 1, 2, last_col)
+        ws.column_dimensions["A"].width = 3
+        ws.column_dimensions["B"].width = 14
+        ws.column_dimensions["C"].width = 20
+        for col in "DEFGH":
+            ws.column_dimensions[col].width = 16
+        ws.column_dimensions["F"].width = 26
@@ -1,26 +1,67 @@
 import os
-import json
 import csv
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side
 import sys
+from io import BytesIO
+from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from sheet_generators.AccountSummary import AccountSummary
-from sheet_generators.AdvancedAccountInfo import AdvancedAccountInfo
-from sheet_generators.AiAnalyser import AiAnalyser
+from sheet_generators.WorkbookState import WorkbookState, fingerprint
+from RunMetrics import METRICS, measure
+from Paths import PROJECT_ROOT, CACHE_DIR, OUTPUT_PATH
+from ArtifactIndex import ArtifactIndex, ttl
+from CacheStore import locked, read_json, CacheCorrupt
+from sheet_generators.FxRates import FX_RATES_PATH
+from sheet_generators.ChartRenderer import RENDERER_VERSION
+from sheet_generators.SheetRegistry import (
+    SHEET_REGISTRY, SHEET_NAMES, DATASET_FILES,
+    resolve_selection, required_datasets, required_enrichments,
+)
+
+# openpyxl is imported inside the functions below so an unchanged build can be
+# recognised and skipped without loading it
+
+
+# Same .env AccountData reads, so the AI options below see the configured key
+load_dotenv(os.path.join(PROJECT_ROOT, ".env"))
+
+
+# Datasets already loaded and verified by this process, keyed by path, with the
+# checksum they were verified against. A watch keeps them between rebuilds.
+_loaded = {}
+
+# The workbook this process last saved and the output file it became, so the
+# next build of a long-running watch edits it in memory instead of reloading it
+_last_build = {}
 
-CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache")
 
 def load_cached(name, fallback_func):
+    """Cached dataset `name`, checked against the checksum recorded when it was fetched.
+
+    Falls back to `fallback_func()` when the file is missing or damaged.
+    """
     path = os.path.join(CACHE_DIR, f"{name}.json")
+    dataset = next((key for key, file_name in DATASET_FILES.items() if file_name == f"{name}.json"), name)
     if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
+        # Shared lock: no run can be between writing the file and recording its checksum
+        with locked(dataset, shared=True):
+            checksum = (ArtifactIndex().get(dataset) or {}).get("checksum")
+            stat = os.stat(path)
+            key = (checksum, stat.st_size, stat.st_mtime_ns)
+            if checksum and _loaded.get(path, (None,))[0] == key:
+                return _loaded[path][1]
+            try:
+                data = read_json(path, checksum=checksum)
+            except CacheCorrupt as e:
+                print(f"⚠️ {e}, fetching {name} again")
+            else:
+                _loaded[path] = (key, data)
+                return data
     return fallback_func()
 
 # Excel operations helper functions
 
 def create_title(ws, title_text, title_range, fill_color=None, font_bold=True, font_size=None):
+    from openpyxl.styles import Font, Border, Side
+    
     ws.merge_cells(title_range)
     
     # Extract first cell reference from the range
@@ -46,6 +87,8 @@ def create_title(ws, title_text, title_range, fill_color=None, font_bold=True, f
     return title_cell
 
 def create_headers(ws, headers, start_row, start_col, fill_color=None, border=None, font_bold=True):
+    from openpyxl.styles import Font
+    
     for col_offset, header in enumerate(headers):
         col = start_col + col_offset
         cell = ws.cell(row=start_row, column=col, value=header)
@@ -63,6 +106,8 @@ def set_column_widths(ws, width_map):
         ws.column_dimensions[col_letter].width = width
 
 def apply_table_border(ws, first_row, last_row, first_col, last_col):
+    from openpyxl.styles import Border, Side
+    
     thin_side = Side(style='thin')
     
     for r in range(first_row, last_row + 1):
@@ -89,7 +134,7 @@ def read_csv_data(csv_path):
     data = []
     # Make path absolute
     if not os.path.isabs(csv_path):
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), csv_path)
+        csv_path = os.path.join(PROJECT_ROOT, csv_path)
     if os.path.exists(csv_path):
         with open(csv_path, 'r', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
@@ -97,12 +142,149 @@ def read_csv_data(csv_path):
                 data.append(row)
     return data
 
-def make_xslx():
+def sheet_options(chart_dpi=None, enrichments=()):
+    """Options that change a sheet's output without changing its input files."""
+    return {
+        # Pence detection for positions depends on whether yfinance lookups are allowed
+        "Account Summary": {"enrichments": sorted(enrichments)},
+        # Charts kept in the workbook are redrawn when the renderer changes
+        "Advanced Account Info": {"chart_dpi": chart_dpi or int(os.getenv("CHART_DPI", "300")),
+                                  "renderer": RENDERER_VERSION},
+        "AI Analysis": {
+            "openai_key": bool(os.getenv("OPENAI_API_KEY")),
+            "model": os.getenv("OPENAI_MODEL"),
+        },
+    }
+
+def sheet_fingerprints(state, selection, chart_dpi=None):
+    options = sheet_options(chart_dpi, required_enrichments(selection))
+    fingerprints = {}
+    for name, sections in selection.items():
+        version = SHEET_REGISTRY[name]["version"]
+        datasets = sorted(required_datasets({name: sections}))
+        inputs = {dataset: state.file_digest(os.path.join(CACHE_DIR, DATASET_FILES[dataset])) for dataset in datasets}
+        if "history" in inputs:
+            # History amounts are converted at these rates as well as the export's own
+            inputs["fx_rates"] = state.file_digest(FX_RATES_PATH)
+        fingerprints[name] = {
+            "version": version,
+            "fingerprint": fingerprint(version, inputs, options[name], sections),
+        }
+    return fingerprints
+
+def freshness_fingerprint(entries):
+    """What the Data Freshness sheet shows apart from fetch times, so an unchanged refetch keeps the workbook."""
+    shown = ("source", "checksum", "bytes", "time_from", "time_to")
+    return fingerprint({dataset: {key: entry.get(key) for key in shown} for dataset, entry in entries.items()},
+                       {dataset: ttl(dataset) for dataset in entries})
+
+def ensure_sheet(wb, name):
+    """Return sheet `name`, creating it in registry order if the workbook lacks it."""
+    if name in wb.sheetnames:
+        return wb[name]
+    order = SHEET_NAMES.index(name)
+    index = sum(1 for existing in wb.sheetnames if existing in SHEET_NAMES and SHEET_NAMES.index(existing) < order)
+    return wb.create_sheet(name, index)
+
+def open_workbook(state, selection):
+    """Load the previously built workbook if it is still the one on disk, else start an empty one.
+    
+    Returns (workbook, reused).
+    """
+    from openpyxl import Workbook, load_workbook
+    
+    if state.output_matches(OUTPUT_PATH):
+        # Taken out of _last_build: a build that fails half way leaves it modified
+        last = _last_build.pop(OUTPUT_PATH, None)
+        if last and last["output"] == state.data["output"]:
+            return last["wb"], True
+        try:
+            return load_workbook(OUTPUT_PATH), True
+        except Exception as e:
+            print(f"⚠️ Could not reuse {OUTPUT_PATH}, rebuilding: {e}")
+    
+    state.reset()
     wb = Workbook()
-    ws = wb.active
-    ws.title = "Account Summary"
+    wb.active.title = next(iter(selection))
+    for name in selection:
+        ensure_sheet(wb, name)
+    return wb, False
+
+class _ImageBuffer(BytesIO):
+    """Image bytes that stay readable after a save; openpyxl closes the buffer it reads an image from."""
+
+    def close(self):
+        pass
+
+def pin_images(wb):
+    """Move images read from the previous workbook onto buffers that survive saving, so `wb` can be saved more than once.
+
+    Images added from a file are read from it again on each save.
+    """
+    from openpyxl.drawing.image import Image
+    
+    for ws in wb.worksheets:
+        for index, image in enumerate(ws._images):
+            if isinstance(image.ref, BytesIO) and not isinstance(image.ref, _ImageBuffer):
+                pinned = Image(_ImageBuffer(image.ref.getvalue()))
+                pinned.anchor, pinned.width, pinned.height = image.anchor, image.width, image.height
+                ws._images[index] = pinned
+
+def keep_workbook(wb, state):
+    _last_build[OUTPUT_PATH] = {"wb": wb, "output": dict(state.data["output"])}
+
+def make_xslx(chart_dpi=None, update=False, force=False, sheets=None, metrics_sheet=False):
+    """Build AccountAnalysis.xlsx, reusing whatever the previous build already produced.
+    
+    `sheets` selects registry keys or Account Summary sections (see
+    SheetRegistry); other sheets are left as they are in the existing workbook.
+    A "Data Freshness" sheet lists when each cached dataset was fetched.
+    If no input file, generator version or option of a selected sheet changed
+    the existing workbook is reused as is. Otherwise only sheets whose
+    fingerprint changed are regenerated; with `update` (or when only some
+    sections are selected) those sheets are patched table by table instead of
+    rebuilt. `force` ignores the previous build entirely. `metrics_sheet`
+    adds a "Run Metrics" sheet with the timings of this run so far.
+    """
+    selection = resolve_selection(sheets)
+    datasets = required_datasets(selection)
+    enrichments = required_enrichments(selection)
+    
+    state = WorkbookState()
+    if force:
+        state.reset()
+    
+    fingerprints = sheet_fingerprints(state, selection, chart_dpi)
+    artifacts = ArtifactIndex()
+    freshness = freshness_fingerprint(artifacts.entries)
+    previous = state.data.get("sheets", {})
+    if (all(previous.get(name) == fingerprints[name] for name in selection) and state.output_matches(OUTPUT_PATH)
+            and state.data.get("freshness") == freshness and not metrics_sheet):
+        print(f"✅ Inputs unchanged since the last build, reusing {OUTPUT_PATH}.")
+        return
+    
+    # Generators are imported here rather than at module load so their heavy
+    # dependencies (yfinance, matplotlib, openai, PIL) are only paid for on use
+    from openpyxl.styles import PatternFill, Border, Side
+    
+    with measure("open_workbook", "workbook"):
+        wb, reused = open_workbook(state, selection)
+    previous = state.data.get("sheets", {}) if reused else {}
     
-    wb.create_sheet("Advanced Account Info")
+    kept, patched = [], []
+    for name, sections in selection.items():
+        if previous.get(name) == fingerprints[name]:
+            kept.append(name)
+        elif (reused and name in wb.sheetnames and (update or sections is not None)
+                and previous.get(name, {}).get("version") == fingerprints[name]["version"]):
+            patched.append(name)
+        else:
+            if reused and name in wb.sheetnames:
+                index = wb.sheetnames.index(name)
+                wb.remove(wb[name])
+                wb.create_sheet(name, index)
+            ensure_sheet(wb, name)
+            state.dirty = True
 
     styles = {
         "table_border": Border(
@@ -121,35 +303,104 @@ def make_xslx():
         "green": PatternFill(start_color="c3e8cb", end_color="c3e8cb", fill_type="solid")
     }
 
-    account_summary = AccountSummary(
-        wb=wb, 
-        ws=ws, 
-        styles=styles, 
-        load_cached_func=load_cached, 
-        extract_date_func=extract_date, 
-        apply_border_func=apply_table_border
-    )
-    
-    advanced_account_info = AdvancedAccountInfo(
-        wb=wb, 
-        ws=wb["Advanced Account Info"], 
-        styles=styles, 
-        extract_date_func=extract_date, 
-        apply_border_func=apply_table_border
-    )
-    
-    ai_analyser = AiAnalyser(
-        wb=wb,
-        styles=styles,
-        load_cached_func=load_cached,
-        apply_border_func=apply_table_border
-    )
-
-    account_summary.generate_sheet()
-    advanced_account_info.generate_sheet()
-    ai_analyser.generate_sheet()
-
-    wb.save("AccountAnalysis.xlsx")
-    print("✅ ExcelGenerator call completed.")
+    generators = {}
+    chart_renderer = None
+    
+    if "Account Summary" in selection and "Account Summary" not in kept:
+        from sheet_generators.AccountSummary import AccountSummary
+        generators["Account Summary"] = AccountSummary(
+            wb=wb, 
+            ws=wb["Account Summary"], 
+            styles=styles, 
+            load_cached_func=load_cached, 
+            extract_date_func=extract_date, 
+            apply_border_func=apply_table_border,
+            state=state,
+            datasets=datasets,
+            enrichments=enrichments
+        )
+    
+    if "Advanced Account Info" in selection and "Advanced Account Info" not in kept:
+        from sheet_generators.AdvancedAccountInfo import AdvancedAccountInfo
+        from sheet_generators.ChartRenderer import ChartRenderer
+        chart_renderer = ChartRenderer(dpi=chart_dpi)
+        generators["Advanced Account Info"] = AdvancedAccountInfo(
+            wb=wb, 
+            ws=wb["Advanced Account Info"], 
+            styles=styles, 
+            extract_date_func=extract_date, 
+            apply_border_func=apply_table_border,
+            chart_renderer=chart_renderer,
+            state=state,
+            load_cached_func=load_cached,
+            datasets=datasets,
+            enrichments=enrichments
+        )
+        # Charts render in worker processes while the table sheets are written
+        generators["Advanced Account Info"].submit_charts()
+    
+    if "AI Analysis" in selection and "AI Analysis" not in kept:
+        from sheet_generators.AiAnalyser import AiAnalyser
+        generators["AI Analysis"] = AiAnalyser(
+            wb=wb,
+            styles=styles,
+            load_cached_func=load_cached,
+            apply_border_func=apply_table_border,
+            state=state
+        )
+        # The LLM request streams in the background while the other sheets are written
+        generators["AI Analysis"].submit_analysis()
+
+    for name, generator in generators.items():
+        state.incremental = name in patched
+        with measure(f"sheet:{name}", "sheet"):
+            if name == "Account Summary":
+                generator.generate_sheet(sections=selection[name])
+            else:
+                generator.generate_sheet()
+    
+    if chart_renderer:
+        chart_renderer.shutdown()
+    
+    from sheet_generators.DataFreshnessSheet import DataFreshnessSheet, SHEET_NAME as FRESHNESS_SHEET
+    freshness_changed = False
+    if artifacts.entries and (state.data.get("freshness") != freshness or FRESHNESS_SHEET not in wb.sheetnames):
+        DataFreshnessSheet(wb, styles, apply_table_border).generate_sheet(
+            artifacts.entries, {dataset: ttl(dataset) for dataset in artifacts.entries})
+        freshness_changed = True
+    # Stored even without artifacts (no sheet then), as the reuse check above compares it
+    if state.data.get("freshness") != freshness:
+        state.data["freshness"] = freshness
+        state.dirty = True
+
+    from sheet_generators.RunMetricsSheet import RunMetricsSheet, SHEET_NAME as METRICS_SHEET
+    if metrics_sheet:
+        RunMetricsSheet(wb, styles, apply_table_border).generate_sheet(METRICS.summary(), METRICS.previous())
+        state.dirty = True
+    elif METRICS_SHEET in wb.sheetnames:
+        # A metrics sheet from an earlier --metrics run would be stale now
+        wb.remove(wb[METRICS_SHEET])
+        state.dirty = True
+
+    # A sheet holding an error instead of its content (a failed AI analysis) is not recorded, so it is retried
+    incomplete = [name for name, generator in generators.items() if getattr(generator, "failed", False)]
+    state.data.setdefault("sheets", {}).update(
+        {name: value for name, value in fingerprints.items() if name not in incomplete})
+    for name in incomplete:
+        state.data["sheets"].pop(name, None)
+    if reused and not state.dirty:
+        state.save(OUTPUT_PATH)
+        keep_workbook(wb, state)
+        print(f"✅ No tables changed, {OUTPUT_PATH} left untouched.")
+        return
+    
+    with measure("save_workbook", "workbook"):
+        pin_images(wb)
+        wb.save(OUTPUT_PATH)
+    state.save(OUTPUT_PATH)
+    keep_workbook(wb, state)
+    rebuilt = [name for name in selection if name not in kept] + ([FRESHNESS_SHEET] if freshness_changed else []) \
+        + (["Run Metrics"] if metrics_sheet else [])
+    print(f"✅ ExcelGenerator call completed ({', '.join(rebuilt)} regenerated).")
 if __name__ == "__main__":
-    make_xslx()
\ No newline at end of file
+    make_xslx()
@@ -0,0 +1,244 @@
+import os
+from collections import Counter
+from itertools import compress
+from operator import itemgetter
+from CacheStore import read_json, CacheCorrupt
+from Paths import CACHE_DIR
+from RunMetrics import measured
+
+# Converts history amounts into the account currency. Every trade and dividend
+# row of the export has the rate between its instrument's currency and the
+# account currency ("Exchange rate", units of that currency per unit of the
+# account currency), so the history itself is a table of rates by day. Rates
+# for currencies or days it lacks can be added to FX_RATES_PATH:
+#
+#   {"base": "EUR", "rates": {"USD": {"2024-01-02": 1.0953, ...}, ...}}
+#
+# where "base" must be the account currency. Rows of the export win on days
+# both have. An amount is converted at the last rate known on its day, or the
+# first rate known for days before it. Conversion runs per currency over whole
+# columns with numpy, which is imported on first use like in HistoryQA.
+
+FX_DIR = os.path.join(CACHE_DIR, "fx")
+FX_RATES_PATH = os.path.join(FX_DIR, "rates.json")
+DEFAULT_ACCOUNT_CURRENCY = "EUR"
+CURRENCY_SYMBOLS = {"EUR": "€", "GBP": "£", "USD": "$", "CHF": "CHF ", "CZK": "Kč ", "PLN": "zł ", "RON": "lei "}
+
+
+def _day(time_str):
+    return (time_str or "")[:10]
+
+
+def _column(rows, name):
+    try:
+        return list(map(itemgetter(name), rows))
+    except KeyError:
+        # Older exports lack some of the currency columns
+        return [row.get(name) for row in rows]
+
+
+def _floats(values):
+    import numpy as np
+
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(float(value))
+            except ValueError:
+                parsed.append(0.0)
+        return np.array(parsed, dtype=np.float64)
+
+
+def _days(rows):
+    """YYYY-MM-DD of each row as a numpy string array; ISO dates sort by time, so they index the table as they are."""
+    import numpy as np
+
+    return np.array([_day(row.get("Time")) for row in rows], dtype="U10")
+
+
+class RateTable:
+    """Rates of each currency against the account currency, by day."""
+
+    def __init__(self, account_currency, observations):
+        """`observations` is {currency: [(days, rates), ...]}, rates in units per account currency unit.
+
+        A day given more than once keeps its last rate.
+        """
+        import numpy as np
+
+        self.account_currency = account_currency
+        self.missing = set()
+        self.series = {}
+        for currency, parts in observations.items():
+            days = np.concatenate([part_days for part_days, _ in parts])
+            rates = np.concatenate([part_rates for _, part_rates in parts])
+            if not len(days):
+                continue
+            order = np.argsort(days, kind="stable")
+            days, rates = days[order], rates[order]
+            last = np.append(days[1:] != days[:-1], True)
+            self.series[currency] = (days[last], rates[last])
+
+    def rates(self, currency, days):
+        """Rates of `currency` on `days` (YYYY-MM-DD), or None if it has no rates at all."""
+        import numpy as np
+
+        if currency == self.account_currency:
+            return np.ones(len(days))
+        # Pence are a hundredth of a pound, so either rate gives the other
+        if currency not in self.series and currency in ("GBX", "GBP"):
+            other = "GBP" if currency == "GBX" else "GBX"
+            other_rates = self.rates(other, days) if other in self.series or other == self.account_currency else None
+            if other_rates is None:
+                return None
+            return other_rates * 100 if currency == "GBX" else other_rates / 100
+        if currency not in self.series:
+            return None
+        known_days, known_rates = self.series[currency]
+        index = np.searchsorted(known_days, days, side="right") - 1
+        return known_rates[np.clip(index, 0, len(known_rates) - 1)]
+
+    def convert(self, amounts, currencies, days):
+        """`amounts` in the account currency. Amounts in currencies without rates are kept as they are."""
+        import numpy as np
+
+        converted = np.array(amounts, dtype=np.float64)
+        for currency in np.unique(currencies):
+            if currency in ("", self.account_currency):
+                continue
+            mask = currencies == currency
+            rates = self.rates(currency, days[mask])
+            if rates is None:
+                if currency not in self.missing:
+                    self.missing.add(str(currency))
+                    print(f"⚠️ No exchange rates for {currency}, its amounts are not converted")
+                continue
+            converted[mask] = converted[mask] / rates
+        return converted
+
+
+def _external_rates(account_currency):
+    import numpy as np
+
+    try:
+        data = read_json(FX_RATES_PATH)
+        if data.get("base") != account_currency:
+            print(f"⚠️ {FX_RATES_PATH} is based on {data.get('base')}, not the account currency {account_currency}; ignoring it")
+            return {}
+        observations = {}
+        for currency, by_day in (data.get("rates") or {}).items():
+            by_day = {day: float(rate) for day, rate in by_day.items() if rate}
+            observations[currency] = [(
+                np.array([str(np.datetime64(day, "D")) for day in by_day], dtype="U10"),
+                np.array(list(by_day.values()), dtype=np.float64),
+            )]
+        return observations
+    except FileNotFoundError:
+        return {}
+    except (OSError, CacheCorrupt, ValueError, TypeError, AttributeError) as e:
+        print(f"⚠️ Could not read {FX_RATES_PATH}, using the history's rates only: {e}")
+        return {}
+
+
+@measured("analytics")
+def build_rate_table(rows):
+    """RateTable from the history's exchange rates and FX_RATES_PATH."""
+    import numpy as np
+
+    totals = Counter(_column(rows, "Currency (Total)"))
+    totals.pop(None, None)
+    totals.pop("", None)
+    account_currency = totals.most_common(1)[0][0] if totals else DEFAULT_ACCOUNT_CURRENCY
+
+    # Listed after the external rates, so the export's own rate wins on days both have
+    observations = _external_rates(account_currency)
+    quoted_in, exchange_rates = _column(rows, "Currency (Price / share)"), _column(rows, "Exchange rate")
+    positions = [i for i, (currency, rate) in enumerate(zip(quoted_in, exchange_rates))
+                 if currency and rate and currency != account_currency]
+    if positions:
+        currencies = np.array([quoted_in[i] for i in positions], dtype=str)
+        rates = _floats([exchange_rates[i] for i in positions])
+        days = _days([rows[i] for i in positions])
+        # Some exports give the pound's rate for prices quoted in pence
+        rates[(currencies == "GBX") & (rates < 10)] *= 100
+        valid = (rates > 0) & (days != "")
+        for currency in np.unique(currencies):
+            mask = valid & (currencies == currency)
+            observations.setdefault(str(currency), []).append((days[mask], rates[mask]))
+    return RateTable(account_currency, observations)
+
+
+# Rate table and converted columns of the history file read_history last
+# parsed, keyed by the file's path, size and mtime and the rates file's
+_memo = {"key": None, "table": None, "columns": {}}
+
+
+def _rates_signature():
+    try:
+        stat = os.stat(FX_RATES_PATH)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+def _memoised(rows):
+    """Memo entry for `rows`; rows not read from the history file get a fresh one."""
+    # Imported here, PortfolioStats imports this module
+    from sheet_generators.PortfolioStats import parsed_history_key
+
+    history = parsed_history_key(rows)
+    if history is None:
+        return {"table": build_rate_table(rows), "columns": {}}
+    key = (history, _rates_signature())
+    if _memo["key"] != key:
+        _memo.update(key=key, table=build_rate_table(rows), columns={})
+    return _memo
+
+
+def rate_table(rows):
+    return _memoised(rows)["table"]
+
+
+def account_currency(rows):
+    return rate_table(rows).account_currency
+
+
+def latest_amounts(rows, amounts, currencies):
+    """numpy array of `amounts`, each in the matching currency, in the account currency at the latest rates known."""
+    import numpy as np
+    from datetime import date
+
+    currencies = np.array([currency or "" for currency in currencies], dtype=str)
+    days = np.full(len(currencies), date.today().isoformat(), dtype="U10")
+    return rate_table(rows).convert(_floats(list(amounts)), currencies, days)
+
+
+def currency_symbol(currency):
+    return CURRENCY_SYMBOLS.get(currency, f"{currency} ")
+
+
+@measured("analytics")
+def account_amounts(rows, column, currency_column):
+    """numpy array of `column` in the account currency, 0 where it is empty or not a number."""
+    import numpy as np
+
+    memo = _memoised(rows)
+    table, converted = memo["table"], memo["columns"]
+    if (column, currency_column) not in converted:
+        # Most columns are empty on most rows, only the filled ones are parsed
+        values = _column(rows, column)
+        positions = list(compress(range(len(rows)), values))
+        amounts = np.zeros(len(rows))
+        if positions:
+            currencies = np.array([rows[i].get(currency_column) or "" for i in positions], dtype=str)
+            # Dates are only needed where there is something to convert
+            foreign = (currencies != "") & (currencies != table.account_currency)
+            days = np.zeros(len(positions), dtype="U10")
+            if foreign.any():
+                days[foreign] = _days([rows[positions[k]] for k in np.flatnonzero(foreign)])
+            amounts[positions] = table.convert(_floats(list(compress(values, values))), currencies, days)
+        converted[(column, currency_column)] = amounts
+    return converted[(column, currency_column)]
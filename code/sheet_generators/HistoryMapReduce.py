@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sheet_generators.PromptBuilder import count_tokens
+
+DEFAULT_CHUNK_ROWS = int(os.getenv("AI_CHUNK_ROWS", "200"))
+DEFAULT_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("AI_REQUESTS_PER_MINUTE", "60"))
+
+# Columns a period summary needs; the rest of the export is ids and currency labels
+CHUNK_COLUMNS = [
+    ("Time", "date"), ("Action", "action"), ("Ticker", "ticker"), ("No. of shares", "shares"),
+    ("Price / share", "price"), ("Currency (Price / share)", "ccy"), ("Total", "total"),
+    ("Result", "result"), ("Currency conversion fee", "fx fee"), ("Withholding tax", "wht"),
+]
+
+MAP_INSTRUCTIONS = """Summarise this slice of a Trading212 account history for a portfolio analyst in at most {words} words. Start with the date range. Cover: what was bought and sold, realised results, deposits and withdrawals, dividends, fees, and any notable behaviour (concentration, frequent trading, panic selling, averaging down). Use exact numbers from the rows. Plain sentences, no headings.
+
+{rows}"""
+
+REDUCE_INSTRUCTIONS = """Merge these consecutive period summaries of a Trading212 account history into one summary of at most {words} words, keeping the date range, key numbers and behavioural patterns.
+
+{summaries}"""
+
+
+class RateBudget:
+    """Caps requests in flight and spaces request starts to a per-minute rate."""
+
+    def __init__(self, max_concurrency=DEFAULT_CONCURRENCY, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def __enter__(self):
+        self.slots.acquire()
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self.slots.release()
+
+
+def chunk_history(rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Split the history into time-ordered chunks, oldest first.
+
+    Boundaries are counted from the oldest row, so when new rows arrive only
+    the last chunk changes and earlier summaries stay cacheable.
+    """
+    ordered = sorted(rows, key=lambda row: row.get("Time", ""))
+    return [ordered[i:i + chunk_rows] for i in range(0, len(ordered), chunk_rows)]
+
+
+def render_chunk(rows):
+    lines = [" | ".join(label for _, label in CHUNK_COLUMNS)]
+    for row in rows:
+        values = [(row.get(column) or "") for column, _ in CHUNK_COLUMNS]
+        values[0] = values[0][:10]
+        lines.append(" | ".join(values))
+    return "\n".join(lines)
+
+
+class HistoryMapReduce:
+    """Summarise the full trading history with concurrent LLM calls.
+
+    `complete(prompt, max_tokens)` returns the model's text. Chunks are
+    summarised in parallel within `budget` (map), then summaries are merged
+    in groups, also in parallel, until they fit `summary_budget` tokens
+    (reduce). Wall time grows with the number of rounds, not the number of
+    chunks, as long as the budget allows the calls to overlap.
+    """
+
+    def __init__(self, complete, budget=None, chunk_rows=DEFAULT_CHUNK_ROWS, summary_budget=1200,
+                 summary_words=120, group_size=4, model=None):
+        self.complete = complete
+        self.budget = budget or RateBudget()
+        self.chunk_rows = chunk_rows
+        self.summary_budget = summary_budget
+        self.summary_words = summary_words
+        self.group_size = max(2, group_size)
+        self.model = model
+        self.calls = 0
+
+    def _call(self, prompt, max_tokens):
+        with self.budget:
+            return self.complete(prompt, max_tokens).strip()
+
+    def _run_all(self, prompts, max_tokens):
+        workers = min(len(prompts), self.budget.max_concurrency)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-map") as executor:
+            results = list(executor.map(lambda prompt: self._call(prompt, max_tokens), prompts))
+        # Counted here rather than in the pool threads, which would race on it
+        self.calls += len(results)
+        return results
+
+    def summarise(self, rows):
+        """Return the list of period summaries, oldest first."""
+        chunks = chunk_history(rows, self.chunk_rows)
+        if not chunks:
+            return []
+
+        # Roughly 1.5 tokens per word leaves headroom for the model to finish its sentence
+        max_tokens = int(self.summary_words * 1.5) + 20
+        summaries = self._run_all(
+            [MAP_INSTRUCTIONS.format(words=self.summary_words, rows=render_chunk(chunk)) for chunk in chunks],
+            max_tokens
+        )
+
+        while len(summaries) > 1 and count_tokens("\n".join(summaries), self.model) > self.summary_budget:
+            groups = [summaries[i:i + self.group_size] for i in range(0, len(summaries), self.group_size)]
+            summaries = self._run_all(
+                [REDUCE_INSTRUCTIONS.format(words=self.summary_words, summaries="\n\n".join(group)) for group in groups],
+                max_tokens
+            )
+        return summaries
@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import zlib
+from sheet_generators.PortfolioStats import TRADE_ACTIONS, FEE_TYPES, read_history, hold_times
+from sheet_generators.PromptBuilder import count_tokens
+from sheet_generators.WorkbookState import WorkbookState, fingerprint
+from sheet_generators.FxRates import FX_RATES_PATH, account_amounts, account_currency
+from Paths import CACHE_DIR, HISTORY_CSV as HISTORY_PATH
+
+INDEX_PATH = os.path.join(CACHE_DIR, "qa_index.npz")
+DEFAULT_TOP_K = int(os.getenv("AI_QA_TOP_K", "6"))
+
+QA_INSTRUCTIONS = """You answer questions about one investor's Trading212 account. Use only the account notes below, quote their numbers and months, and say so if they do not contain the answer. Keep it under 150 words.
+
+Account notes (amounts in {currency}):
+{context}
+
+Question: {question}"""
+
+# Questions say "March" or "fees"; notes say "2024-03" and "Currency conversion fee"
+_MONTH_NAMES = ["january", "february", "march", "april", "may", "june", "july",
+                "august", "september", "october", "november", "december"]
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def _amounts(rows):
+    """Per-row Total, Result and fees in the account currency, keyed by column."""
+    columns = ["Total", "Result"] + [column for _, column in FEE_TYPES]
+    return {column: account_amounts(rows, column, f"Currency ({column})") for column in columns}
+
+
+def month_documents(rows):
+    """One note per calendar month: trades, cash movements, results and fees."""
+    months = {}
+    amounts = _amounts(rows)
+    for i, row in enumerate(rows):
+        month = (row.get("Time") or "")[:7]
+        if not re.match(r"^\d{4}-\d{2}$", month):
+            continue
+        m = months.setdefault(month, {"buys": 0, "sells": 0, "tickers": {}, "deposits": 0.0, "withdrawals": 0.0,
+                                      "dividends": 0.0, "result": 0.0, "fees": {}})
+        action = (row.get("Action") or "").lower()
+        total = float(amounts["Total"][i])
+        if action in TRADE_ACTIONS:
+            m["buys" if "buy" in action else "sells"] += 1
+            ticker = row.get("Ticker", "")
+            m["tickers"][ticker] = m["tickers"].get(ticker, 0) + 1
+            m["result"] += float(amounts["Result"][i])
+        elif "deposit" in action:
+            m["deposits"] += total
+        elif "withdrawal" in action:
+            m["withdrawals"] += abs(total)
+        elif "dividend" in action:
+            m["dividends"] += total
+        for fee_name, fee_column in FEE_TYPES:
+            amount = abs(float(amounts[fee_column][i]))
+            if amount:
+                m["fees"][fee_name] = m["fees"].get(fee_name, 0) + amount
+
+    documents = []
+    for month, m in sorted(months.items()):
+        name = f"{_MONTH_NAMES[int(month[5:]) - 1].title()} {month[:4]}"
+        busiest = sorted(m["tickers"].items(), key=lambda item: item[1], reverse=True)[:5]
+        fees = sum(m["fees"].values())
+        text = (f"{name} ({month}): {m['buys']} buys and {m['sells']} sells"
+                + (f" mostly in {', '.join(f'{t} ({n})' for t, n in busiest)}" if busiest else "")
+                + f"; realised result {_money(m['result'])}; deposits {_money(m['deposits'])}, "
+                f"withdrawals {_money(m['withdrawals'])}, dividends {_money(m['dividends'])}; fees {_money(fees)}")
+        if m["fees"]:
+            text += " (" + ", ".join(f"{k} {_money(v)}" for k, v in sorted(m["fees"].items())) + ")"
+        documents.append({"id": f"month:{month}", "text": text + "."})
+    return documents
+
+
+def ticker_documents(rows):
+    """One note per ticker: activity span, quantities, results, dividends, fees and hold times."""
+    tickers = {}
+    amounts = _amounts(rows)
+    for i, row in enumerate(rows):
+        ticker = row.get("Ticker") or ""
+        if not ticker:
+            continue
+        t = tickers.setdefault(ticker, {"name": row.get("Name", ""), "dates": [], "bought": 0.0, "sold": 0.0,
+                                        "buys": 0, "sells": 0, "result": 0.0, "dividends": 0.0, "fees": 0.0})
+        action = (row.get("Action") or "").lower()
+        if action in TRADE_ACTIONS:
+            t["dates"].append((row.get("Time") or "")[:10])
+            shares = _float(row.get("No. of shares"))
+            if "buy" in action:
+                t["buys"] += 1
+                t["bought"] += shares
+            else:
+                t["sells"] += 1
+                t["sold"] += shares
+            t["result"] += float(amounts["Result"][i])
+        elif "dividend" in action:
+            t["dividends"] += float(amounts["Total"][i])
+        t["fees"] += sum(abs(float(amounts[column][i])) for _, column in FEE_TYPES)
+
+    holds = {}
+    for hold in hold_times(rows):
+        holds.setdefault(hold["ticker"], []).append(hold["days"])
+
+    documents = []
+    for ticker, t in sorted(tickers.items()):
+        dates = sorted(d for d in t["dates"] if d)
+        text = (f"{ticker} ({t['name']}): {t['buys']} buys ({t['bought']:.4g} shares) and {t['sells']} sells "
+                f"({t['sold']:.4g} shares)" + (f" between {dates[0]} and {dates[-1]}" if dates else "")
+                + f"; realised result {_money(t['result'])}; dividends {_money(t['dividends'])}; fees {_money(t['fees'])}")
+        if ticker in holds:
+            days = holds[ticker]
+            text += f"; average hold {sum(days) / len(days):.0f} days, longest {max(days)} days"
+        documents.append({"id": f"ticker:{ticker}", "text": text + "."})
+    return documents
+
+
+def build_documents(rows):
+    return month_documents(rows) + ticker_documents(rows)
+
+
+_STOPWORDS = {"a", "an", "and", "are", "at", "be", "between", "by", "did", "do", "for", "from", "how", "i", "in",
+              "is", "it", "me", "my", "of", "on", "or", "the", "to", "was", "were", "what", "when", "which",
+              "why", "with"}
+
+
+def _tokens(text):
+    """Lower-cased words without stopwords or amounts; months also yield their name."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+(?:[.-][a-z0-9]+)*", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if re.match(r"^\d{4}-\d{2}$", word):
+            tokens.extend([word, _MONTH_NAMES[int(word[5:]) - 1]])
+        elif re.match(r"^\d{4}$", word) or not re.match(r"^[\d.,-]+$", word):
+            tokens.append(word)
+            if len(word) > 3 and word.endswith("s"):
+                tokens.append(word[:-1])
+    return tokens
+
+
+class HashingEmbedder:
+    """Local stand-in embedder: hashed bag of words and bigrams, no model or network needed."""
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.name = f"hashing-v2-{dim}"
+
+    def embed(self, texts):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = _tokens(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                vectors[i, zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        # Sublinear term frequency so one repeated word does not dominate a note
+        return np.log1p(vectors)
+
+
+class OpenAIEmbedder:
+    """Embeddings from the OpenAI (or OPENAI_BASE_URL-compatible) embeddings endpoint."""
+
+    def __init__(self, client, model=None):
+        self.client = client
+        self.model = model or os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        self.name = f"openai-{self.model}"
+
+    def embed(self, texts):
+        import numpy as np
+
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+def make_embedder(client=None):
+    """AI_EMBEDDER=openai uses the API (and needs a client); anything else the local stand-in."""
+    if os.getenv("AI_EMBEDDER", "local") == "openai" and client is not None:
+        return OpenAIEmbedder(client)
+    return HashingEmbedder()
+
+
+class VectorIndex:
+    """Unit-normalised document vectors; cosine similarity is a single matrix-vector product."""
+
+    def __init__(self, documents, vectors):
+        import numpy as np
+
+        self.documents = documents
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1, norms)
+
+    def search(self, query_vector, k=DEFAULT_TOP_K):
+        import numpy as np
+
+        if not self.documents:
+            return []
+        norm = np.linalg.norm(query_vector)
+        scores = self.vectors @ (query_vector / (norm or 1))
+        k = min(k, len(self.documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.documents[i], float(scores[i])) for i in top]
+
+    def save(self, path, key):
+        import numpy as np
+
+        np.savez_compressed(path, vectors=self.vectors, documents=json.dumps(self.documents), key=key)
+
+    @classmethod
+    def load(cls, path, key):
+        """The saved index if it was built for `key`, else None."""
+        import numpy as np
+
+        try:
+            with np.load(path) as data:
+                if str(data["key"]) != key:
+                    return None
+                return cls(json.loads(str(data["documents"])), data["vectors"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def load_index(embedder, history_path=HISTORY_PATH, index_path=INDEX_PATH, state=None):
+    """Index of the history notes, rebuilt only when the history file, the exchange rates or the embedder change."""
+    state = state or WorkbookState()
+    key = fingerprint(state.file_digest(history_path), state.file_digest(FX_RATES_PATH), embedder.name)
+    index = VectorIndex.load(index_path, key)
+    if index is not None:
+        return index
+
+    documents = build_documents(read_history(history_path))
+    index = VectorIndex(documents, embedder.embed([doc["text"] for doc in documents]))
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    index.save(index_path, key)
+    return index
+
+
+def ask(question, client, model, k=DEFAULT_TOP_K):
+    """Answer `question` from the top-k history notes, streaming the reply to the console.
+
+    `client` is the OpenAI client the AI sheet uses (None when unavailable).
+    Returns the answer text, or None if the API is unavailable.
+    """
+    if not os.path.exists(HISTORY_PATH):
+        print("❌ No cached history yet, run the report once first.")
+        return None
+
+    embedder = make_embedder(client)
+    index = load_index(embedder)
+    hits = index.search(embedder.embed([question])[0], k)
+    context = "\n".join(f"- {doc['text']}" for doc, _ in hits)
+    currency = account_currency(read_history(HISTORY_PATH))
+    prompt = QA_INSTRUCTIONS.format(context=context, question=question, currency=currency)
+    print(f"🔎 {len(hits)} of {len(index.documents)} notes retrieved, prompt {count_tokens(prompt, model)} tokens")
+
+    if client is None:
+        print("⚠️ OpenAI API unavailable, showing the retrieved notes instead:")
+        print(context)
+        return None
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=300,
+        temperature=0.2,
+        stream=True
+    )
+    parts = []
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            print(chunk.choices[0].delta.content, end="", flush=True)
+    print()
+    return "".join(parts)
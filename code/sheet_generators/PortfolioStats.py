@@ -0,0 +1,342 @@
+import os
+import csv
+from datetime import datetime
+from collections import defaultdict
+from RunMetrics import measured
+from sheet_generators.FxRates import account_amounts, latest_amounts
+
+# Pure aggregates over the cached account data, shared by the sheets that
+# tabulate them and the AI prompt that summarises them. Amounts from the
+# history are in the account currency (see FxRates).
+
+TRADE_ACTIONS = ["market buy", "market sell", "stop buy", "stop sell", "limit buy", "limit sell"]
+
+FEE_TYPES = [
+    ("Deposit Fee", "Deposit fee"),
+    ("Currency Conversion", "Currency conversion fee"),
+    ("Stamp Duty Tax", "Stamp duty reserve tax"),
+    ("Withholding Tax", "Withholding tax")
+]
+
+
+# Rows of the last history file parsed, keyed by its path, size and mtime. Every
+# table reads the history, and a long-running watch rebuilds after each sync,
+# so it is only parsed again once the file changes.
+_parsed_history = (None, [])
+
+
+@measured("parse")
+def read_history(csv_path):
+    """Rows of the history CSV as dicts; treat them as read-only, they are shared between callers."""
+    global _parsed_history
+    if not os.path.exists(csv_path):
+        return []
+    stat = os.stat(csv_path)
+    key = (csv_path, stat.st_size, stat.st_mtime_ns)
+    if _parsed_history[0] != key:
+        with open(csv_path, 'r', encoding='utf-8') as csvfile:
+            _parsed_history = (key, list(csv.DictReader(csvfile)))
+    return list(_parsed_history[1])
+
+
+def parsed_history_key(rows):
+    """(path, size, mtime) of the history file `rows` came from through read_history, else None."""
+    key, parsed = _parsed_history
+    # The parsed rows are kept alive here, so identity cannot match a since freed row
+    if rows and len(rows) == len(parsed) and rows[0] is parsed[0] and rows[-1] is parsed[-1]:
+        return key
+    return None
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@measured("analytics")
+def fee_totals(rows):
+    """Total of each fee type over the history, in account currency."""
+    breakdown = {}
+    for fee_name, fee_column in FEE_TYPES:
+        amount = float(abs(account_amounts(rows, fee_column, f"Currency ({fee_column})")).sum())
+        if amount > 0:
+            breakdown[fee_name] = amount
+    return breakdown
+
+
+@measured("analytics")
+def win_loss(rows):
+    """Closed trades with a non-zero result: count, winners, total and average P&L."""
+    total_trades = winning_trades = 0
+    total_pnl = 0.0
+    for row, result in zip(rows, account_amounts(rows, "Result", "Currency (Result)")):
+        if row.get("Action", "").strip().lower() not in TRADE_ACTIONS:
+            continue
+        result = float(result)
+        if abs(result) > 0.01:
+            total_trades += 1
+            total_pnl += result
+            if result > 0:
+                winning_trades += 1
+
+    return {
+        "total_trades": total_trades,
+        "winning_trades": winning_trades,
+        "losing_trades": total_trades - winning_trades,
+        "win_rate": (winning_trades / total_trades * 100) if total_trades > 0 else 0,
+        "total_pnl": total_pnl,
+        "avg_pnl": total_pnl / total_trades if total_trades > 0 else 0,
+    }
+
+
+def _daily_date(row):
+    time_str = (row.get("Time") or "").strip()
+    try:
+        return datetime.strptime(time_str.split(" ")[0], "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def cumulative_series(daily_totals):
+    """[YYYY-MM-DD, running total] pairs in date order, hashable and picklable for the chart renderer."""
+    series = []
+    running_total = 0
+    for date in sorted(daily_totals.keys()):
+        running_total += daily_totals[date]
+        series.append([date.strftime("%Y-%m-%d"), round(running_total, 6)])
+    return series
+
+
+@measured("analytics")
+def capital_gains_series(rows):
+    """Cumulative realised result of closed trades by day."""
+    daily = defaultdict(float)
+    for row, result in zip(rows, account_amounts(rows, "Result", "Currency (Result)")):
+        if row.get("Action", "").strip().lower() not in TRADE_ACTIONS:
+            continue
+        date = _daily_date(row)
+        if date and abs(result) > 0.01:
+            daily[date] += float(result)
+    return cumulative_series(daily)
+
+
+@measured("analytics")
+def dividends_series(rows):
+    """Cumulative dividends received by day."""
+    daily = defaultdict(float)
+    for row, amount in zip(rows, account_amounts(rows, "Total", "Currency (Total)")):
+        if "dividend" not in row.get("Action", "").lower():
+            continue
+        date = _daily_date(row)
+        if date and amount > 0:
+            daily[date] += float(amount)
+    return cumulative_series(daily)
+
+
+@measured("analytics")
+def hold_times(rows):
+    """Match sells to the earliest open buys of the same ticker (FIFO).
+
+    Returns a list of {"ticker", "name", "days"} for every matched lot.
+    """
+    buy_transactions = {}
+    sell_transactions = []
+    for row in rows:
+        action = row.get("Action", "")
+        if action.lower() not in TRADE_ACTIONS:
+            continue
+        try:
+            qty = float(row.get("No. of shares", "0") or 0)
+        except ValueError:
+            continue
+        if qty <= 0:
+            continue
+
+        transaction = {
+            "dateTime": row.get("Time", ""), "ticker": row.get("Ticker", ""),
+            "name": row.get("Name", ""), "quantity": qty, "action": action
+        }
+        if "buy" in action.lower():
+            buy_transactions.setdefault(transaction["ticker"], []).append(transaction)
+        elif "sell" in action.lower():
+            sell_transactions.append(transaction)
+
+    holds = []
+    for sell_tx in sell_transactions:
+        sell_ticker = sell_tx["ticker"]
+        if sell_ticker not in buy_transactions:
+            continue
+        remaining_sell_qty = sell_tx["quantity"]
+
+        for buy_tx in sorted(buy_transactions[sell_ticker], key=lambda x: x["dateTime"]):
+            if remaining_sell_qty <= 0:
+                break
+            if buy_tx["quantity"] <= 0:
+                continue
+
+            matched_qty = min(remaining_sell_qty, buy_tx["quantity"])
+            try:
+                buy_dt = datetime.strptime(buy_tx["dateTime"].split(" ")[0], "%Y-%m-%d")
+                sell_dt = datetime.strptime(sell_tx["dateTime"].split(" ")[0], "%Y-%m-%d")
+            except ValueError:
+                continue
+
+            hold_days = (sell_dt - buy_dt).days
+            if hold_days >= 0:
+                holds.append({"ticker": sell_ticker, "name": sell_tx["name"], "days": hold_days})
+            buy_tx["quantity"] -= matched_qty
+            remaining_sell_qty -= matched_qty
+
+    return holds
+
+
+def hold_time_summary(holds, top=3):
+    """Average hold in days and the longest hold of the `top` longest-held tickers."""
+    if not holds:
+        return 0, []
+    avg_hold_days = sum(item["days"] for item in holds) / len(holds)
+    longest = {}
+    for hold in holds:
+        if hold["ticker"] not in longest or hold["days"] > longest[hold["ticker"]]["days"]:
+            longest[hold["ticker"]] = hold
+    return avg_hold_days, sorted(longest.values(), key=lambda x: x["days"], reverse=True)[:top]
+
+
+def history_ticker(ticker):
+    """T212 ticker as the history names it, without the exchange suffix and London's trailing 'l'."""
+    ticker = (ticker or "").split("_")[0]
+    return ticker[:-1] if ticker.endswith("l") and len(ticker) > 1 else ticker
+
+
+@measured("analytics")
+def pence_corrected_positions(positions, instruments=None, rows=None):
+    """Open positions with prices quoted in pence converted to pounds, highest P/L first.
+
+    The quote currency comes from the instrument metadata. For instruments
+    missing from it, a price in GBX in the history or a British ISIN means
+    pence, as the Account Summary assumes without the yfinance enrichment.
+    "currency" is the currency of the corrected prices ("" if unknown).
+    """
+    instrument_currency = {instrument.get("ticker"): instrument.get("currencyCode") for instrument in instruments or []}
+    ticker_to_isin, ticker_to_currency = {}, {}
+    for row in rows or []:
+        ticker, isin = row.get("Ticker", ""), row.get("ISIN", "")
+        if ticker and isin:
+            ticker_to_isin[ticker] = isin
+            if row.get("Currency (Price / share)"):
+                ticker_to_currency[ticker] = row["Currency (Price / share)"]
+
+    corrected = []
+    for position in sorted(positions or [], key=lambda p: p.get("ppl") or 0, reverse=True):
+        ticker = history_ticker(position.get("ticker"))
+        quote_currency = instrument_currency.get(position.get("ticker"))
+        if quote_currency:
+            in_pence = quote_currency == "GBX"
+        else:
+            in_pence = ticker_to_currency.get(ticker) == "GBX" or ticker_to_isin.get(ticker, "").startswith("GB")
+        divisor = 100.0 if in_pence else 1.0
+        currency = "GBP" if in_pence else quote_currency or ticker_to_currency.get(ticker) or ""
+        corrected.append({
+            "ticker": ticker,
+            "t212_ticker": position.get("ticker"),
+            "quantity": _float(position.get("quantity")),
+            "average_price": _float(position.get("averagePrice")) / divisor,
+            "current_price": _float(position.get("currentPrice")) / divisor,
+            "ppl": _float(position.get("ppl")),
+            "fx_ppl": _float(position.get("fxPpl")),
+            "quoted_in_pence": in_pence,
+            "currency": currency,
+        })
+    return corrected
+
+
+@measured("analytics")
+def allocation(positions, cash_info=None, instruments=None, rows=None):
+    """Value weights of open positions, largest first, plus concentration measures.
+
+    Weights are of invested value (quantity * current price), with pence
+    prices in pounds and every value converted into the account currency at
+    the latest rate the history or cache/fx/rates.json knows.
+    """
+    corrected = pence_corrected_positions(positions, instruments, rows)
+    values = latest_amounts(rows or [], [p["quantity"] * p["current_price"] for p in corrected],
+                            [p["currency"] for p in corrected])
+    holdings = []
+    for position, value in zip(corrected, values):
+        cost = position["quantity"] * position["average_price"]
+        holdings.append({
+            "ticker": position["t212_ticker"] or "",
+            "value": float(value),
+            "return_pct": (position["quantity"] * position["current_price"] / cost - 1) * 100 if cost else 0,
+            "ppl": position["ppl"],
+        })
+
+    total_value = sum(h["value"] for h in holdings)
+    for holding in holdings:
+        holding["weight"] = holding["value"] / total_value * 100 if total_value else 0
+    holdings.sort(key=lambda h: h["weight"], reverse=True)
+
+    weights = [h["weight"] / 100 for h in holdings]
+    cash_info = cash_info or {}
+    account_total = _float(cash_info.get("total"))
+    return {
+        "holdings": holdings,
+        "count": len(holdings),
+        "top1_pct": holdings[0]["weight"] if holdings else 0,
+        "top5_pct": sum(h["weight"] for h in holdings[:5]),
+        # Herfindahl index: 1/n for an equal-weight portfolio, 1 for a single holding
+        "hhi": sum(w * w for w in weights),
+        "cash_pct": _float(cash_info.get("free")) / account_total * 100 if account_total else 0,
+    }
+
+
+@measured("analytics")
+def trade_activity(rows):
+    """Counts by action and the span and pace of trading."""
+    actions = {}
+    trade_dates = []
+    dividends = 0.0
+    for row, total in zip(rows, account_amounts(rows, "Total", "Currency (Total)")):
+        action = row.get("Action", "")
+        actions[action] = actions.get(action, 0) + 1
+        if action.lower() in TRADE_ACTIONS:
+            trade_dates.append(row.get("Time", "")[:10])
+        elif "dividend" in action.lower():
+            dividends += float(total)
+
+    trade_dates = sorted(d for d in trade_dates if d)
+    months = 0
+    if trade_dates:
+        first, last = trade_dates[0], trade_dates[-1]
+        months = (int(last[:4]) - int(first[:4])) * 12 + int(last[5:7]) - int(first[5:7]) + 1
+    return {
+        "actions": actions,
+        "trades": len(trade_dates),
+        "first_trade": trade_dates[0] if trade_dates else None,
+        "last_trade": trade_dates[-1] if trade_dates else None,
+        "trades_per_month": len(trade_dates) / months if months else 0,
+        "dividends": dividends,
+    }
+
+
+@measured("analytics")
+def pie_summaries(pies_info):
+    """Name, value, return and instrument count of each pie."""
+    pies = []
+    for pie in pies_info or []:
+        detailed = pie.get("detailed") or {}
+        result = pie.get("result") or {}
+        pies.append({
+            "name": (detailed.get("settings") or {}).get("name") or f"Pie {pie.get('id', '')}",
+            "invested": _float(result.get("priceAvgInvestedValue")),
+            "value": _float(result.get("priceAvgValue")),
+            "return_pct": _float(result.get("priceAvgResultCoef")) * 100,
+            "cash": _float(pie.get("cash")),
+            "instruments": [
+                {"ticker": i.get("ticker", ""), "weight": _float(i.get("currentShare")) * 100}
+                for i in detailed.get("instruments") or []
+            ],
+        })
+    return pies
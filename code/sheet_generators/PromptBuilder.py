@@ -0,0 +1,185 @@
+import os
+import re
+import math
+from sheet_generators.PortfolioStats import (
+    TRADE_ACTIONS, allocation, fee_totals, win_loss, hold_times, hold_time_summary,
+    trade_activity, pie_summaries,
+)
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "3000"))
+
+INSTRUCTIONS = """You are a professional portfolio analyst with 20+ years of experience. Below is a precomputed summary of a Trading212 account (amounts in account currency unless a position lists its own). Provide comprehensive, detailed feedback covering:
+
+1. CASH ALLOCATION & LIQUIDITY: current cash level, cash-to-investment ratio, deployment opportunities, emergency fund adequacy.
+2. CONCENTRATION & DIVERSIFICATION: position concentration, single-stock risk, sector/geographic spread, specific improvements.
+3. TRADING PATTERNS & PERFORMANCE: frequency and timing, win/loss ratio and profitability, fee impact, behavioural patterns.
+4. PORTFOLIO HEALTH & STRATEGY: overall performance, risk-adjusted returns, allocation recommendations, concrete action items.
+5. DETAILED OBSERVATIONS: notable holdings, timing insights from the history, tax implications, long-term recommendations.
+
+Be SPECIFIC with numbers, percentages and concrete recommendations, referencing the positions, amounts and dates given. Aim for 600-800 words."""
+
+# Detail levels from richest to most summarised. Rows past a limit are folded
+# into an "other" line so totals stay complete at every level.
+DETAIL_LEVELS = [
+    {"positions": 25, "pies": 10, "pie_instruments": 5, "recent_trades": 15, "longest_holds": 5, "actions": True},
+    {"positions": 10, "pies": 5, "pie_instruments": 3, "recent_trades": 5, "longest_holds": 3, "actions": True},
+    {"positions": 5, "pies": 3, "pie_instruments": 0, "recent_trades": 0, "longest_holds": 1, "actions": False},
+    {"positions": 0, "pies": 0, "pie_instruments": 0, "recent_trades": 0, "longest_holds": 0, "actions": False},
+]
+
+_encoders = {}
+
+
+def count_tokens(text, model=None):
+    """Prompt tokens for `model`, using tiktoken when it is installed.
+
+    Without tiktoken this falls back to an estimate that errs high: the larger
+    of one token per four characters and one per word or symbol.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return max(math.ceil(len(text) / 4), len(re.findall(r"\w+|[^\w\s]", text)))
+
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except (KeyError, ValueError):
+            _encoders[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encoders[model].encode(text))
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def _pct(value):
+    return f"{value:.1f}%"
+
+
+class PromptBuilder:
+    """Builds the AI analysis prompt from aggregates instead of raw API dumps.
+
+    `build` renders the richest detail level whose prompt fits `budget`
+    tokens, summarising further at each level rather than cutting text off.
+    """
+
+    def __init__(self, budget=None, model=None):
+        self.budget = budget or DEFAULT_TOKEN_BUDGET
+        self.model = model
+
+    def aggregates(self, raw_data):
+        rows = raw_data.get("trading_history") or []
+        avg_hold_days, longest_holds = hold_time_summary(hold_times(rows), top=DETAIL_LEVELS[0]["longest_holds"])
+        trades = [row for row in rows if row.get("Action", "").lower() in TRADE_ACTIONS]
+        return {
+            "cash": raw_data.get("cash_info") or {},
+            "allocation": allocation(raw_data.get("positions"), raw_data.get("cash_info"),
+                                     raw_data.get("instruments"), rows),
+            "pies": sorted(pie_summaries(raw_data.get("pies_info")), key=lambda p: p["value"], reverse=True),
+            "fees": fee_totals(rows),
+            "win_loss": win_loss(rows),
+            "avg_hold_days": avg_hold_days,
+            "longest_holds": longest_holds,
+            "activity": trade_activity(rows),
+            "recent_trades": sorted(trades, key=lambda r: r.get("Time", ""), reverse=True),
+        }
+
+    def render(self, aggregates, level, period_summaries=None):
+        detail = DETAIL_LEVELS[level]
+        cash = aggregates["cash"]
+        alloc = aggregates["allocation"]
+        lines = [INSTRUCTIONS, "", "ACCOUNT SUMMARY"]
+
+        lines.append(
+            f"Cash: total {_money(cash.get('total') or 0)}, free {_money(cash.get('free') or 0)} "
+            f"({_pct(alloc['cash_pct'])} of account), invested {_money(cash.get('invested') or 0)}, "
+            f"unrealised P/L {_money(cash.get('ppl') or 0)}, realised result {_money(cash.get('result') or 0)}, "
+            f"in pies {_money(cash.get('pieCash') or 0)}"
+        )
+
+        lines.append(
+            f"Positions: {alloc['count']} open; largest {_pct(alloc['top1_pct'])}, top 5 {_pct(alloc['top5_pct'])} "
+            f"of invested value; HHI {alloc['hhi']:.3f}"
+        )
+        shown = alloc["holdings"][:detail["positions"]]
+        if shown:
+            lines.append("ticker | weight | return | P/L")
+            for holding in shown:
+                lines.append(
+                    f"{holding['ticker']} | {_pct(holding['weight'])} | {_pct(holding['return_pct'])} | {_money(holding['ppl'])}"
+                )
+        others = alloc["holdings"][len(shown):]
+        if others and shown:
+            lines.append(
+                f"{len(others)} others | {_pct(sum(h['weight'] for h in others))} | - | {_money(sum(h['ppl'] for h in others))}"
+            )
+
+        pies = aggregates["pies"]
+        if pies:
+            lines.append(
+                f"Pies: {len(pies)}, value {_money(sum(p['value'] for p in pies))}, "
+                f"invested {_money(sum(p['invested'] for p in pies))}"
+            )
+            for pie in pies[:detail["pies"]]:
+                line = f"- {pie['name']}: value {_money(pie['value'])}, return {_pct(pie['return_pct'])}, {len(pie['instruments'])} holdings"
+                top_instruments = sorted(pie["instruments"], key=lambda i: i["weight"], reverse=True)[:detail["pie_instruments"]]
+                if top_instruments:
+                    line += " (" + ", ".join(f"{i['ticker']} {_pct(i['weight'])}" for i in top_instruments) + ")"
+                lines.append(line)
+            if len(pies) > detail["pies"] and detail["pies"]:
+                rest = pies[detail["pies"]:]
+                lines.append(f"- {len(rest)} other pies: value {_money(sum(p['value'] for p in rest))}")
+
+        wl = aggregates["win_loss"]
+        activity = aggregates["activity"]
+        lines.append(
+            f"Trading: {activity['trades']} trades from {activity['first_trade'] or '-'} to {activity['last_trade'] or '-'} "
+            f"({activity['trades_per_month']:.1f}/month); closed {wl['total_trades']}, win rate {_pct(wl['win_rate'])}, "
+            f"total P/L {_money(wl['total_pnl'])}, average {_money(wl['avg_pnl'])}; dividends {_money(activity['dividends'])}"
+        )
+        if detail["actions"] and activity["actions"]:
+            lines.append("Actions: " + ", ".join(f"{action or 'Unknown'} {count}" for action, count in sorted(activity["actions"].items())))
+
+        hold_line = f"Hold time: average {aggregates['avg_hold_days']:.1f} days"
+        longest = aggregates["longest_holds"][:detail["longest_holds"]]
+        if longest:
+            hold_line += "; longest " + ", ".join(f"{h['ticker']} {h['days']}d" for h in longest)
+        lines.append(hold_line)
+
+        fees = aggregates["fees"]
+        lines.append(
+            f"Fees: total {_money(sum(fees.values()))}"
+            + ("" if not fees else " (" + ", ".join(f"{name} {_money(amount)}" for name, amount in sorted(fees.items())) + ")")
+        )
+
+        recent = aggregates["recent_trades"][:detail["recent_trades"]]
+        if recent:
+            lines.append("Recent trades (date | action | ticker | shares | price | currency | result):")
+            for row in recent:
+                lines.append(" | ".join([
+                    row.get("Time", "")[:10], row.get("Action", ""), row.get("Ticker", ""),
+                    row.get("No. of shares", ""), row.get("Price / share", ""),
+                    row.get("Currency (Price / share)", ""), row.get("Result", "") or "-",
+                ]))
+
+        if period_summaries:
+            lines.append("History by period (oldest first, summarised from the full history):")
+            lines.extend(f"- {summary}" for summary in period_summaries)
+
+        return "\n".join(lines)
+
+    def build(self, raw_data, period_summaries=None):
+        """Return (prompt, token count, detail level used).
+
+        `period_summaries` are appended as is; callers keep them within budget.
+        """
+        aggregates = self.aggregates(raw_data)
+        for level in range(len(DETAIL_LEVELS)):
+            prompt = self.render(aggregates, level, period_summaries)
+            tokens = count_tokens(prompt, self.model)
+            if tokens <= self.budget:
+                return prompt, tokens, level
+
+        print(f"⚠️ AI prompt is {tokens} tokens even fully summarised (budget {self.budget})")
+        return prompt, tokens, level
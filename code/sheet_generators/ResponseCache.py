@@ -0,0 +1,85 @@
+import os
+import time
+from sheet_generators.WorkbookState import fingerprint
+from CacheStore import read_json, write_json, CacheCorrupt
+from RunMetrics import count
+from Paths import CACHE_DIR
+
+RESPONSE_CACHE_DIR = os.path.join(CACHE_DIR, "ai_responses")
+DEFAULT_TTL_HOURS = float(os.getenv("AI_CACHE_TTL_HOURS", "24"))
+DEFAULT_MAX_MB = float(os.getenv("AI_CACHE_MAX_MB", "5"))
+
+
+class ResponseCache:
+    """Completed AI responses on disk, keyed by a hash of the prompt and model settings.
+
+    Entries created more than `ttl_hours` ago are ignored and removed. When
+    the folder grows past `max_mb` the least recently used entries are
+    evicted; a hit counts as a use, recorded in the file's mtime, so eviction
+    only lists the folder. A TTL of 0 disables the cache.
+    """
+
+    def __init__(self, cache_dir=RESPONSE_CACHE_DIR, ttl_hours=None, max_mb=None):
+        self.cache_dir = cache_dir
+        self.ttl = (DEFAULT_TTL_HOURS if ttl_hours is None else ttl_hours) * 3600
+        self.max_bytes = (DEFAULT_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+
+    def key(self, prompt, model, **settings):
+        return fingerprint(prompt, model, settings)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Cached response text for `key`, or None if missing or expired."""
+        if self.ttl <= 0:
+            return None
+        path = self._path(key)
+        try:
+            entry = read_json(path)
+        except (OSError, ValueError, CacheCorrupt):
+            count("ai_cache_miss")
+            return None
+
+        if self.expired(entry):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            count("ai_cache_miss")
+            return None
+
+        os.utime(path)
+        count("ai_cache_hit")
+        return entry.get("content")
+
+    def expired(self, entry):
+        return time.time() - entry.get("created", 0) > self.ttl
+
+    def put(self, key, content, **metadata):
+        if self.ttl <= 0:
+            return
+        write_json(self._path(key), {"created": time.time(), "content": content, **metadata})
+        self.evict()
+
+    def evict(self):
+        """Drop entries unused for longer than the TTL, then the least recently used ones while over the size limit."""
+        try:
+            with os.scandir(self.cache_dir) as scan:
+                entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                           for entry in scan if entry.name.endswith(".json")]
+        except OSError:
+            return
+
+        # mtime is the creation or the last hit, never earlier than "created",
+        # so these are expired without reading them; get() catches the rest
+        cutoff = time.time() - self.ttl
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
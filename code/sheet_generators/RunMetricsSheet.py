@@ -0,0 +1,104 @@
+from openpyxl.styles import Font
+
+SHEET_NAME = "Run Metrics"
+
+HEADERS = ["Step", "Category", "Calls", "Wall ms", "CPU ms", "Peak KB", "HTTP calls", "KB transferred",
+           "Cache hits", "Cache misses", "Prev wall ms", "Change %"]
+
+# Slower than the previous run by more than this share is highlighted red, faster green
+CHANGE_THRESHOLD = 0.2
+
+
+class RunMetricsSheet:
+    def __init__(self, wb, styles, apply_border_func):
+        self.wb = wb
+        self.styles = styles
+        self.apply_table_border = apply_border_func
+
+    def _cache_counts(self, counters):
+        hits = sum(v for k, v in counters.items() if k.endswith("_hit") or k == "section_reused")
+        misses = sum(v for k, v in counters.items() if k.endswith("_miss"))
+        return hits, misses
+
+    def _title(self, ws, row, text, last_col):
+        ws.merge_cells(start_row=row, start_column=2, end_row=row, end_column=last_col)
+        cell = ws.cell(row=row, column=2, value=text)
+        cell.font = Font(bold=True, size=12)
+        cell.fill = self.styles["dark_grey"]
+        for col in range(2, last_col + 1):
+            ws.cell(row=row, column=col).border = self.styles["title_border"]
+
+    def _headers(self, ws, row, headers):
+        for col_offset, header in enumerate(headers):
+            cell = ws.cell(row=row, column=2 + col_offset, value=header)
+            cell.fill = self.styles["grey"]
+            cell.border = self.styles["table_border"]
+            cell.font = Font(bold=True)
+
+    def steps_table(self, ws, summary, previous, start_row=2):
+        last_col = 1 + len(HEADERS)
+        self._title(ws, start_row, f"Run Metrics ({summary['started']}, {summary['total_seconds']:.1f}s total)", last_col)
+        self._headers(ws, start_row + 1, HEADERS)
+
+        previous_wall = {}
+        for step in (previous or {}).get("steps", []):
+            previous_wall[(step["category"], step["name"])] = step["wall_ms"]
+
+        row = start_row + 2
+        for step in summary["steps"]:
+            counters = step["counters"]
+            hits, misses = self._cache_counts(counters)
+            before = previous_wall.get((step["category"], step["name"]))
+            change = (step["wall_ms"] - before) / before if before else None
+            values = [
+                step["name"], step["category"], step["calls"], step["wall_ms"], step["cpu_ms"], step["peak_kb"],
+                counters.get("http_calls", 0), round(counters.get("http_bytes", 0) / 1024, 1),
+                hits, misses, before, round(change * 100, 1) if change is not None else None,
+            ]
+            for col_offset, value in enumerate(values):
+                cell = ws.cell(row=row, column=2 + col_offset, value=value)
+                cell.border = self.styles["table_border"]
+                if col_offset == 0:
+                    cell.fill = self.styles["grey"]
+            if change is not None and abs(change) > CHANGE_THRESHOLD and before >= 1:
+                ws.cell(row=row, column=last_col).fill = self.styles["red" if change > 0 else "green"]
+            row += 1
+
+        self.apply_table_border(ws, start_row, row - 1, 2, last_col)
+        return row
+
+    def totals_table(self, ws, summary, start_row):
+        self._title(ws, start_row, "Run Totals", 3)
+        self._headers(ws, start_row + 1, ["Counter", "Value"])
+        totals = dict(summary["counters"])
+        if "http_bytes" in totals:
+            totals["KB transferred"] = round(totals.pop("http_bytes") / 1024, 1)
+        if summary["peak_memory_mb"] is not None:
+            totals["peak memory MB"] = summary["peak_memory_mb"]
+
+        row = start_row + 2
+        for name, value in sorted(totals.items()):
+            for col_offset, val in enumerate([name, value]):
+                cell = ws.cell(row=row, column=2 + col_offset, value=val)
+                cell.border = self.styles["table_border"]
+                if col_offset == 0:
+                    cell.fill = self.styles["grey"]
+            row += 1
+        self.apply_table_border(ws, start_row, row - 1, 2, 3)
+        return row
+
+    def generate_sheet(self, summary, previous=None):
+        """Write this run's metrics, compared step by step with `previous` (a saved summary)."""
+        if SHEET_NAME in self.wb.sheetnames:
+            self.wb.remove(self.wb[SHEET_NAME])
+        ws = self.wb.create_sheet(SHEET_NAME)
+
+        row = self.steps_table(ws, summary, previous)
+        self.totals_table(ws, summary, row + 1)
+
+        ws.column_dimensions["A"].width = 3
+        ws.column_dimensions["B"].width = 28
+        ws.column_dimensions["C"].width = 12
+        for col in "DEFGHIJKLM":
+            ws.column_dimensions[col].width = 13
+        ws.freeze_panes = "C4"
@@ -0,0 +1,106 @@
+# Which data each sheet needs, so a run can fetch, parse and enrich only that.
+#
+# Datasets are files in the cache folder, filled by CacheAPIValues. Enrichments
+# are extra network lookups made while a sheet is generated: "yfinance" to tell
+# whether a UK listing is quoted in pence when the instrument metadata cannot,
+# and "llm" for the OpenAI analysis.
+
+DATASET_FILES = {
+    "cash": "cash_info.json",
+    "positions": "open_positions.json",
+    "pies": "pies_info.json",
+    "history": "trading212_history.csv",
+    "instruments": "instruments.json",
+}
+
+# Bump a sheet's version whenever its generator's output changes, so workbooks
+# built by the previous version are not reused. Sections are tables that can be
+# selected on their own; a sheet without sections is always built whole.
+SHEET_REGISTRY = {
+    "Account Summary": {
+        "key": "summary",
+        "version": 2,
+        "sections": {
+            "cash": {"datasets": ["cash"], "enrichments": []},
+            "positions": {"datasets": ["positions", "instruments"], "enrichments": []},
+            "transactions": {"datasets": ["history"], "enrichments": []},
+            "pies": {"datasets": ["pies"], "enrichments": []},
+        },
+    },
+    "Advanced Account Info": {
+        "key": "advanced",
+        "version": 4,
+        # Cash feeds the snapshots behind the account value chart
+        "datasets": ["history", "instruments", "cash"],
+        "enrichments": ["yfinance"],
+    },
+    "AI Analysis": {
+        "key": "ai",
+        "version": 4,
+        # Instruments give each position's quote currency for the allocation weights
+        "datasets": ["cash", "positions", "pies", "history", "instruments"],
+        "enrichments": ["llm"],
+    },
+}
+
+SHEET_NAMES = list(SHEET_REGISTRY)
+
+
+def selection_keys():
+    keys = []
+    for spec in SHEET_REGISTRY.values():
+        keys.append(spec["key"])
+        keys.extend(spec.get("sections", {}))
+    return keys
+
+
+def resolve_selection(keys=None):
+    """Map CLI keys (sheet keys or section names) to {sheet name: [sections] or None}.
+
+    None means the whole sheet. No keys selects every sheet.
+    """
+    if not keys:
+        return {name: None for name in SHEET_NAMES}
+
+    selection = {}
+    for key in keys:
+        for name, spec in SHEET_REGISTRY.items():
+            if key == spec["key"]:
+                selection[name] = None
+                break
+            if key in spec.get("sections", {}):
+                if name not in selection:
+                    selection[name] = []
+                if selection[name] is not None and key not in selection[name]:
+                    selection[name].append(key)
+                break
+        else:
+            raise ValueError(f"Unknown sheet '{key}', expected one of: {', '.join(selection_keys())}")
+
+    # Keep registry order so the workbook layout does not depend on CLI order
+    return {name: selection[name] for name in SHEET_NAMES if name in selection}
+
+
+def _requirements(sheet_name, sections, field):
+    spec = SHEET_REGISTRY[sheet_name]
+    if "sections" not in spec:
+        return set(spec[field])
+    chosen = sections if sections is not None else list(spec["sections"])
+    needed = set()
+    for section in chosen:
+        needed.update(spec["sections"][section][field])
+    return needed
+
+
+def required_datasets(selection):
+    needed = set()
+    for name, sections in selection.items():
+        needed |= _requirements(name, sections, "datasets")
+    return needed
+
+
+def required_enrichments(selection):
+    needed = set()
+    for name, sections in selection.items():
+        needed |= _requirements(name, sections, "enrichments")
+    return needed
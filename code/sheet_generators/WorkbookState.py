@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+from RunMetrics import count
+from CacheStore import atomic_write
+from Paths import CACHE_DIR
+
+STATE_PATH = os.path.join(CACHE_DIR, "workbook_state.json")
+
+
+def fingerprint(*parts):
+    """Stable hash of JSON-serialisable table inputs."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clear_region(ws, min_row, min_col, max_row, max_col):
+    """Blank a rectangular block (values, styles and merges) so a table can be rewritten in place."""
+    from openpyxl.styles import Font, PatternFill, Border
+    
+    for merged in list(ws.merged_cells.ranges):
+        if (merged.min_row >= min_row and merged.max_row <= max_row and
+                merged.min_col >= min_col and merged.max_col <= max_col):
+            ws.unmerge_cells(str(merged))
+
+    if max_row < min_row:
+        return
+    for row in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+        for cell in row:
+            cell.value = None
+            cell.font = Font()
+            cell.fill = PatternFill()
+            cell.border = Border()
+
+
+class WorkbookState:
+    """Input fingerprints for the last written workbook.
+
+    Tracks a fingerprint for the whole build, each sheet and each table. When
+    `incremental` is set the sheet being generated was loaded from disk, and
+    generators use `is_current` to skip tables whose inputs are unchanged,
+    appending rows where the table allows it.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.incremental = False
+        self.dirty = False
+        self.data = {"sections": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.data.setdefault("sections", {})
+        self.data.setdefault("files", {})
+
+    def output_matches(self, output_path):
+        """True if the workbook on disk is the one this state describes."""
+        recorded = self.data.get("output")
+        if not recorded or not os.path.exists(output_path):
+            return False
+        stat = os.stat(output_path)
+        return recorded == {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def reset(self):
+        self.incremental = False
+        self.data = {"sections": {}, "files": self.data.get("files", {})}
+
+    def file_digest(self, path):
+        """Content hash of an input file, memoised on size and mtime so unchanged files are not re-read."""
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        memo = self.data["files"].get(path)
+        if memo and memo["size"] == stat.st_size and memo["mtime_ns"] == stat.st_mtime_ns:
+            return memo["sha256"]
+        digest = file_fingerprint(path)
+        self.data["files"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def add_image(self, ws, source, anchor, width=None, height=None):
+        """Embed a PNG (path or buffer) at `anchor`, replacing any image a loaded workbook already has there."""
+        from openpyxl.drawing.image import Image
+        from openpyxl.utils import get_column_letter
+        
+        def anchor_cell(image):
+            if isinstance(image.anchor, str):
+                return image.anchor
+            marker = image.anchor._from
+            return f"{get_column_letter(marker.col + 1)}{marker.row + 1}"
+        
+        ws._images = [image for image in ws._images if anchor_cell(image) != anchor]
+        
+        img = Image(source)
+        if width and height:
+            img.width = width
+            img.height = height
+        ws.add_image(img, anchor)
+
+    def section(self, name):
+        return self.data["sections"].get(name, {})
+
+    def is_current(self, name, section_fingerprint):
+        current = self.incremental and self.section(name).get("fingerprint") == section_fingerprint
+        if current:
+            count("section_reused")
+        return current
+
+    def mark(self, name, section_fingerprint, **extra):
+        if self.section(name).get("fingerprint") != section_fingerprint or not self.incremental:
+            self.dirty = True
+        self.data["sections"][name] = {"fingerprint": section_fingerprint, **extra}
+
+    def forget(self, name):
+        """Drop a table's fingerprint so the next build writes it again."""
+        self.data["sections"].pop(name, None)
+        self.dirty = True
+
+    def save(self, output_path):
+        stat = os.stat(output_path)
+        self.data["output"] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        atomic_write(self.path, json.dumps(self.data, indent=2).encode("utf-8"))
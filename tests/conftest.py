@@ -0,0 +1,21 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+# The modules import each other from code/ and read the cache folder at
+# import, so both are set before any test imports them
+CODE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code")
+sys.path.insert(0, CODE_DIR)
+os.environ["T212_CACHE_DIR"] = tempfile.mkdtemp(prefix="t212-tests-")
+
+
+@pytest.fixture
+def cache_dir():
+    """The cache folder, emptied before and after the test."""
+    path = os.environ["T212_CACHE_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
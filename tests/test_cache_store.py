@@ -0,0 +1,52 @@
+import os
+import hashlib
+import pytest
+from CacheStore import atomic_write, read_json, write_json, CacheCorrupt, GZIP_MAGIC
+
+
+def test_json_round_trip_with_checksum(tmp_path):
+    path = str(tmp_path / "data.json")
+    checksum = write_json(path, {"free": 1.5, "items": [1, 2]})
+    with open(path, "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest() == checksum
+    assert read_json(path, checksum) == {"free": 1.5, "items": [1, 2]}
+
+
+def test_compressed_files_read_back(tmp_path):
+    path = str(tmp_path / "data.json")
+    checksum = write_json(path, [{"ticker": "AAPL_US_EQ"}] * 50, compress=True)
+    with open(path, "rb") as f:
+        assert f.read(2) == GZIP_MAGIC
+    assert read_json(path, checksum) == [{"ticker": "AAPL_US_EQ"}] * 50
+
+
+def test_same_data_gives_the_same_checksum(tmp_path):
+    first = write_json(str(tmp_path / "a.json"), {"a": 1}, compress=True)
+    second = write_json(str(tmp_path / "b.json"), {"a": 1}, compress=True)
+    assert first == second
+
+
+def test_changed_file_is_reported_corrupt(tmp_path):
+    path = str(tmp_path / "data.json")
+    checksum = write_json(path, {"free": 1})
+    with open(path, "wb") as f:
+        f.write(b'{"free":2}')
+    with pytest.raises(CacheCorrupt):
+        read_json(path, checksum)
+
+
+def test_unreadable_file_is_reported_corrupt(tmp_path):
+    path = str(tmp_path / "data.json")
+    with open(path, "wb") as f:
+        f.write(b'{"free":')
+    with pytest.raises(CacheCorrupt):
+        read_json(path)
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    write_json(path, {"free": 1})
+    with pytest.raises(TypeError):
+        atomic_write(path, "not bytes")
+    assert read_json(path) == {"free": 1}
+    assert os.listdir(tmp_path) == ["data.json"]
@@ -0,0 +1,22 @@
+from sheet_generators import ChartRenderer
+from sheet_generators.ChartRenderer import chart_key
+
+SERIES = {"labels": ["2024-01", "2024-02"], "values": [1.5, -2.0]}
+
+
+def test_key_is_stable_for_the_same_chart():
+    assert chart_key("bar", SERIES, {"title": "Gains"}, 300) == chart_key("bar", dict(SERIES), {"title": "Gains"}, 300)
+
+
+def test_key_changes_with_anything_drawn():
+    key = chart_key("bar", SERIES, {"title": "Gains"}, 300)
+    assert chart_key("line", SERIES, {"title": "Gains"}, 300) != key
+    assert chart_key("bar", {**SERIES, "values": [1.5, -2.5]}, {"title": "Gains"}, 300) != key
+    assert chart_key("bar", SERIES, {"title": "Dividends"}, 300) != key
+    assert chart_key("bar", SERIES, {"title": "Gains"}, 150) != key
+
+
+def test_key_changes_with_the_renderer_version(monkeypatch):
+    key = chart_key("bar", SERIES, {}, 300)
+    monkeypatch.setattr(ChartRenderer, "RENDERER_VERSION", ChartRenderer.RENDERER_VERSION + 1)
+    assert chart_key("bar", SERIES, {}, 300) != key
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from sheet_generators.FxRates import RateTable, build_rate_table, account_amounts, account_currency
+from sheet_generators.PortfolioStats import read_history
+
+
+def _days(*days):
+    return np.array(days, dtype="U10")
+
+
+def test_amounts_use_the_last_rate_known_on_their_day():
+    table = RateTable("EUR", {"USD": [(_days("2024-01-01", "2024-02-01"), np.array([1.1, 1.2]))]})
+    converted = table.convert(np.array([11.0, 12.0, 11.0, 5.0]), np.array(["USD", "USD", "USD", "EUR"]),
+                              _days("2024-01-15", "2024-02-15", "2023-06-01", "2024-01-15"))
+    assert np.allclose(converted, [10.0, 10.0, 10.0, 5.0])
+
+
+def test_pence_follow_from_the_pound_rate():
+    table = RateTable("EUR", {"GBP": [(_days("2024-01-01"), np.array([0.86]))]})
+    converted = table.convert(np.array([86.0, 0.86]), np.array(["GBX", "GBP"]), _days("2024-01-02", "2024-01-02"))
+    assert np.allclose(converted, [1.0, 1.0])
+
+
+def test_pence_in_a_pound_account():
+    table = RateTable("GBP", {})
+    assert np.allclose(table.convert(np.array([250.0]), np.array(["GBX"]), _days("2024-01-02")), [2.5])
+
+
+def test_currencies_without_rates_are_kept_as_they_are():
+    table = RateTable("EUR", {})
+    assert np.allclose(table.convert(np.array([7.0]), np.array(["JPY"]), _days("2024-01-02")), [7.0])
+    assert table.missing == {"JPY"}
+
+
+def test_history_rates_convert_its_amounts():
+    rows = [
+        {"Time": "2024-01-02 10:00:00", "Action": "Market buy", "Total": "-10", "Currency (Total)": "EUR",
+         "Currency (Price / share)": "GBX", "Exchange rate": "86", "Result": "", "Currency (Result)": ""},
+        {"Time": "2024-01-03 10:00:00", "Action": "Dividend (Ordinary)", "Total": "1.1",
+         "Currency (Total)": "USD", "Currency (Price / share)": "USD", "Exchange rate": "1.1",
+         "Result": "", "Currency (Result)": ""},
+        {"Time": "2024-01-04 10:00:00", "Action": "Market sell", "Total": "20", "Currency (Total)": "EUR",
+         "Currency (Price / share)": "GBX", "Exchange rate": "0.86", "Result": "172",
+         "Currency (Result)": "GBX"},
+    ]
+    table = build_rate_table(rows)
+    assert table.account_currency == "EUR"
+    assert np.allclose(account_amounts(rows, "Total", "Currency (Total)"), [-10.0, 1.0, 20.0])
+    # The pound's rate given for a pence price is scaled to pence
+    assert np.allclose(account_amounts(rows, "Result", "Currency (Result)"), [0.0, 0.0, 2.0])
+
+
+def test_a_rewritten_history_is_converted_afresh(cache_dir):
+    path = os.path.join(cache_dir, "history.csv")
+    for currency in ("EUR", "GBP"):
+        with open(path, "w") as f:
+            f.write(f"Action,Time,Total,Currency (Total)\nDeposit,2024-01-02 10:00:00,10,{currency}\n")
+        assert account_currency(read_history(path)) == currency
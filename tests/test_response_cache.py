@@ -0,0 +1,50 @@
+import os
+import time
+from CacheStore import write_json
+from sheet_generators.ResponseCache import ResponseCache
+
+
+def test_put_then_get(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_hours=1, max_mb=1)
+    key = cache.key("prompt", "gpt", max_tokens=10)
+    assert cache.get(key) is None
+    cache.put(key, "analysis")
+    assert cache.get(key) == "analysis"
+
+
+def test_key_depends_on_prompt_model_and_settings(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = cache.key("prompt", "gpt", max_tokens=10)
+    assert cache.key("prompt 2", "gpt", max_tokens=10) != key
+    assert cache.key("prompt", "gpt-4", max_tokens=10) != key
+    assert cache.key("prompt", "gpt", max_tokens=20) != key
+
+
+def test_entries_expire_by_creation_time_even_when_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_hours=1, max_mb=1)
+    key = cache.key("prompt", "gpt")
+    write_json(os.path.join(str(tmp_path), f"{key}.json"), {"created": time.time() - 7200, "content": "old"})
+    assert cache.get(key) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_zero_ttl_disables_the_cache(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_hours=0)
+    key = cache.key("prompt", "gpt")
+    cache.put(key, "analysis")
+    assert cache.get(key) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_hours=1, max_mb=3500 / (1024 * 1024))
+    keys = [cache.key(f"prompt {i}", "gpt") for i in range(3)]
+    now = time.time()
+    for age, key in zip((30, 20, 10), keys):
+        cache.put(key, "x" * 1000)
+        os.utime(os.path.join(str(tmp_path), f"{key}.json"), (now - age, now - age))
+    # The oldest entry was used last, so the second one goes
+    os.utime(os.path.join(str(tmp_path), f"{keys[0]}.json"))
+    cache.put(cache.key("prompt 3", "gpt"), "x" * 1000)
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
@@ -0,0 +1,43 @@
+import os
+import json
+import SnapshotStore
+from SnapshotStore import diff, patch, record_snapshot, read_snapshots
+
+OLD = {"cash": {"free": 10, "total": 100}, "positions": {"AAPL": {"quantity": 1}, "MSFT": {"quantity": 2}}}
+NEW = {"cash": {"free": 5, "total": 100}, "positions": {"AAPL": {"quantity": 1.5}}, "pies": {}}
+
+
+def test_patch_applies_a_diff():
+    assert patch(OLD, diff(OLD, NEW)) == NEW
+    assert patch(NEW, diff(NEW, OLD)) == OLD
+
+
+def test_diff_holds_only_the_changes():
+    delta = diff(OLD, NEW)
+    assert delta["d"]["positions"]["r"] == ["MSFT"]
+    assert delta["d"]["cash"] == {"s": {"free": 5}}
+    assert "AAPL" not in json.dumps(diff(OLD, {**OLD, "cash": {"free": 0, "total": 100}}))
+
+
+def _write_cache(cache_dir, free, quantity):
+    with open(os.path.join(cache_dir, "cash_info.json"), "w") as f:
+        json.dump({"free": free, "total": 100}, f)
+    with open(os.path.join(cache_dir, "open_positions.json"), "w") as f:
+        json.dump([{"ticker": "AAPL_US_EQ", "quantity": quantity}], f)
+
+
+def test_snapshots_read_back_as_recorded(cache_dir, monkeypatch):
+    monkeypatch.setattr(SnapshotStore, "KEYFRAME_EVERY", 2)
+    ts = 1704196800.0  # 2024-01-02
+    recorded = []
+    for i in range(5):
+        _write_cache(cache_dir, free=10 + i, quantity=1 + i % 2)
+        assert record_snapshot(ts + i * 60)
+        recorded.append((ts + i * 60, SnapshotStore.current_snapshot()))
+    assert not record_snapshot(ts + 600)
+
+    assert list(read_snapshots()) == recorded
+    assert list(read_snapshots(start=ts + 150, end=ts + 200)) == recorded[3:4]
+    with open(SnapshotStore.segment_path(ts)) as f:
+        kinds = [line.split("\t")[1] for line in f]
+    assert kinds == ["K", "D", "D", "K", "D"]
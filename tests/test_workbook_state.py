@@ -0,0 +1,89 @@
+import os
+from sheet_generators.WorkbookState import WorkbookState, fingerprint
+
+
+def test_sections_are_only_current_in_an_incremental_build(tmp_path):
+    state = WorkbookState(str(tmp_path / "state.json"))
+    state.mark("positions", fingerprint([1, 2]))
+    assert not state.is_current("positions", fingerprint([1, 2]))
+    state.incremental = True
+    assert state.is_current("positions", fingerprint([1, 2]))
+    assert not state.is_current("positions", fingerprint([1, 2, 3]))
+
+
+def test_marking_an_unchanged_section_keeps_the_state_clean(tmp_path):
+    state = WorkbookState(str(tmp_path / "state.json"))
+    state.incremental = True
+    state.mark("cash", "a")
+    state.dirty = False
+    state.mark("cash", "a")
+    assert not state.dirty
+    state.mark("cash", "b")
+    assert state.dirty
+
+
+def test_a_forgotten_section_is_written_again(tmp_path):
+    state = WorkbookState(str(tmp_path / "state.json"))
+    state.incremental = True
+    state.mark("ai_analysis", "a")
+    state.forget("ai_analysis")
+    assert not state.is_current("ai_analysis", "a")
+
+
+def test_state_describes_only_the_workbook_it_was_saved_with(tmp_path):
+    output = str(tmp_path / "out.xlsx")
+    with open(output, "wb") as f:
+        f.write(b"workbook")
+    state = WorkbookState(str(tmp_path / "state.json"))
+    state.mark("cash", "a")
+    state.save(output)
+
+    reloaded = WorkbookState(str(tmp_path / "state.json"))
+    assert reloaded.output_matches(output)
+    assert reloaded.section("cash")["fingerprint"] == "a"
+    with open(output, "ab") as f:
+        f.write(b" edited")
+    assert not reloaded.output_matches(output)
+
+
+def test_file_digest_follows_the_file(tmp_path):
+    path = str(tmp_path / "cash_info.json")
+    state = WorkbookState(str(tmp_path / "state.json"))
+    assert state.file_digest(path) is None
+    with open(path, "w") as f:
+        f.write('{"free":1}')
+    first = state.file_digest(path)
+    assert state.file_digest(path) == first
+    with open(path, "w") as f:
+        f.write('{"free":2.5}')
+    assert state.file_digest(path) != first
+
+
+def test_sheets_are_rebuilt_only_when_their_inputs_change(cache_dir):
+    from sheet_generators.ExcelGenerator import sheet_fingerprints
+    from sheet_generators.SheetRegistry import resolve_selection
+
+    selection = resolve_selection(["summary", "advanced"])
+    state = WorkbookState(os.path.join(cache_dir, "state.json"))
+    before = sheet_fingerprints(state, selection)
+    assert sheet_fingerprints(state, selection) == before
+
+    with open(os.path.join(cache_dir, "trading212_history.csv"), "w") as f:
+        f.write("Action,Time,Total\nDeposit,2024-01-02 10:00:00,100\n")
+    after = sheet_fingerprints(state, selection)
+    assert after["Advanced Account Info"] != before["Advanced Account Info"]
+    assert after["Account Summary"] != before["Account Summary"]
+
+
+def test_sheets_not_reading_a_dataset_are_kept(cache_dir):
+    from sheet_generators.ExcelGenerator import sheet_fingerprints
+    from sheet_generators.SheetRegistry import resolve_selection
+
+    selection = resolve_selection(["summary", "advanced"])
+    state = WorkbookState(os.path.join(cache_dir, "state.json"))
+    before = sheet_fingerprints(state, selection)
+    with open(os.path.join(cache_dir, "pies_info.json"), "w") as f:
+        f.write('[{"id":1}]')
+    after = sheet_fingerprints(state, selection)
+    assert after["Account Summary"] != before["Account Summary"]
+    assert after["Advanced Account Info"] == before["Advanced Account Info"]